@@ -0,0 +1,486 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+try:
+    import resource
+except ImportError:  # Windows, no peak RSS
+    resource = None
+from diff_analyzer import calculate_and_collect_diff, DiffRecordConsumer
+from effort_collector import collect_developers_effort, EffortConsumer
+from bug_miner import mine_bug_fixing_commits_api, BugFixConsumer
+from refactoring_miner import analyze_and_zip_output, RefactoringCandidateConsumer
+from commit_walker import walk_commits
+from github_client import GitHubClient
+from jira_harvester import harvest_jira_issues
+from http_client import HttpClient
+from link_machine import validate_links
+
+# No client-side limit for the local fake server, only the rate limit headers it sends count
+LOCAL_RATE_LIMITS = {"127.0.0.1": (1e6, 1e6)}
+REFACTORING_TYPES = ["Extract Method", "Rename Variable", "Move Class", "Inline Method", "Rename Method"]
+
+
+def time_call(function, *args, **kwargs):
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+def count_commits(repository_path):
+    result = subprocess.run(['git', 'rev-list', '--count', 'HEAD'], cwd=repository_path, capture_output=True, text=True, check=True)
+    return int(result.stdout)
+
+def benchmark_diff_backends(repository_path, repeat=1):
+    """
+    Time calculate_and_collect_diff with the pydriller and the numstat backend on one repository.
+
+    Parameters:
+    - repository_path (str): Path to a local Git repository (or mirror)
+    - repeat (int): Number of runs per backend, the fastest run is reported
+
+    Returns:
+    - dict: Per backend the best time in seconds, commits per second and output size in bytes
+    """
+    commits = count_commits(repository_path)
+    results = {"repository": repository_path, "commits": commits}
+    for backend in ("pydriller", "numstat"):
+        timings = []
+        with tempfile.TemporaryDirectory(prefix="bench_diff_") as output_dir:
+            for _ in range(repeat):
+                timings.append(time_call(calculate_and_collect_diff, repository_path, output_dir,
+                                         output_format="jsonl", backend=backend))
+            output_size = os.path.getsize(os.path.join(output_dir, "diff_analysis.jsonl"))
+        best = min(timings)
+        results[backend] = {"seconds": best, "commits_per_second": commits / best if best else None, "output_bytes": output_size}
+
+    results["speedup"] = results["pydriller"]["seconds"] / results["numstat"]["seconds"]
+    return results
+
+def generate_repository(path, commits=1000, files=100, churn=5, authors=10, lines=50, issues=200, seed=0):
+    """
+    Generate a reproducible Git repository with `git fast-import`.
+
+    The first commit adds all files, every later commit edits `churn` random files (replaced,
+    inserted and deleted lines). Authors, dates and messages are drawn from a seeded random
+    generator: about a fifth of the messages fix a GitHub issue ("#12"), a tenth a Jira issue
+    ("SYN-12"), with issue numbers below `issues`. The same arguments always give the same
+    commit hashes.
+
+    Parameters:
+    - path (str): Directory to create the repository in
+    - commits (int): Number of commits
+    - files (int): Number of Java files
+    - churn (int): Files changed per commit
+    - authors (int): Number of distinct authors
+    - lines (int): Initial lines per file
+    - issues (int): Highest issue number referenced by commit messages
+    - seed (int): Random seed
+
+    Returns:
+    - str: The path of the repository
+    """
+    rng = random.Random(seed)
+    subprocess.run(['git', 'init', '-q', path], check=True)
+    process = subprocess.Popen(['git', 'fast-import', '--quiet'], cwd=path, stdin=subprocess.PIPE)
+    names = [f"src/main/java/org/synthetic/module{i % 10}/Class{i}.java" for i in range(files)]
+    contents = {}
+
+    def data(text):
+        raw = text.encode('utf-8')
+        return b"data %d\n" % len(raw) + raw + b"\n"
+
+    for i in range(commits):
+        author = rng.randrange(authors)
+        signature = f"Developer {author} <developer{author}@example.com> {1600000000 + i * 3600} +0000"
+        random_value = rng.random()
+        if random_value < 0.2:
+            message = f"Fix bug #{rng.randint(1, issues)} in module {i % 10}"
+        elif random_value < 0.3:
+            message = f"SYN-{rng.randint(1, issues)}: fix error handling"
+        else:
+            message = f"Update module {i % 10} ({i})"
+
+        changed = names if i == 0 else rng.sample(names, min(churn, files))
+        commands = [f"commit refs/heads/main\nmark :{i + 1}\nauthor {signature}\ncommitter {signature}\n".encode(), data(message)]
+        if i:
+            commands.append(f"from :{i}\n".encode())
+        for name in changed:
+            body = contents.setdefault(name, [f"    int field{k} = {k};" for k in range(lines)])
+            if i:
+                for _ in range(rng.randint(1, 5)):
+                    position = rng.randrange(len(body))
+                    operation = rng.random()
+                    if operation < 0.5:
+                        body[position] = f"    int field{position} = {rng.randrange(10 ** 6)};"
+                    elif operation < 0.8 or len(body) < 2:
+                        body.insert(position, f"    void method{rng.randrange(10 ** 6)}() {{ }}")
+                    else:
+                        del body[position]
+            class_name = name.rsplit('/', 1)[-1][:-len(".java")]
+            text = f"package org.synthetic;\n\npublic class {class_name} {{\n" + "\n".join(body) + "\n}\n"
+            commands.append(f"M 100644 inline {name}\n".encode() + data(text))
+        process.stdin.write(b"".join(commands) + b"\n")
+
+    process.stdin.close()
+    if process.wait() != 0:
+        raise RuntimeError("git fast-import failed")
+    subprocess.run(['git', 'symbolic-ref', 'HEAD', 'refs/heads/main'], cwd=path, check=True)
+    return path
+
+def generate_rminer_output(repository_path, json_output, seed=0):
+    """
+    Write a RefactoringMiner-like output with random refactorings for every commit of a repository.
+    """
+    rng = random.Random(seed)
+    hashes = subprocess.run(['git', 'rev-list', 'HEAD'], cwd=repository_path, capture_output=True, text=True,
+                            check=True).stdout.split()
+    with open(json_output, 'w') as f:
+        f.write('{"commits": [')
+        for i, commit_hash in enumerate(hashes):
+            refactorings = [{"type": rng.choice(REFACTORING_TYPES), "description": "x" * rng.randint(20, 200),
+                             "leftSideLocations": [], "rightSideLocations": []}
+                            for _ in range(rng.choice([0, 0, 0, 1, 2, 5]))]
+            commit = {"repository": repository_path, "sha1": commit_hash, "url": "", "refactorings": refactorings}
+            f.write(("," if i else "") + json.dumps(commit, indent=2))
+        f.write(']}\n')
+
+def start_fake_server(latency=0.0, rate_limit=None, window=60.0, github_issues=200, jira_issues=500, jira_fail_once=()):
+    """
+    Start a local HTTP server standing in for GitHub and Jira.
+
+    - GET /repos/<owner>/<repo>/issues: `github_issues` issues with page/per_page and Link pagination,
+      an ETag per page and 304 Not Modified for a matching If-None-Match
+    - GET /rest/api/2/search: `jira_issues` issues with startAt/maxResults (at most 100). Issue n
+      has n % 4 changelog histories, with expand=changelog at most 2 of them come inline
+    - GET /rest/api/2/issue/<key>/changelog: the full changelog of an issue, paginated
+    - HEAD on any path: link check, paths ending in "-missing" answer 404
+
+    Every request waits `latency` seconds. With rate_limit, at most that many requests are
+    answered per window of `window` seconds; the answers carry GitHub's X-RateLimit-* headers
+    and requests over the limit get GitHub's 403 (Jira paths: 429 with Retry-After). Search
+    pages whose startAt is in jira_fail_once are answered with 503 the first time.
+
+    Returns:
+    - ThreadingHTTPServer: The running server, stop it with shutdown(). server.stats counts
+      the requests answered, refused and answered with 304.
+    """
+    def fake_histories(key):
+        number = int(key.rsplit("-", 1)[1])
+        return [{"id": f"{number}-{i}", "author": {"displayName": f"Developer {i}"}, "created": "2024-01-01T00:00:00.000+0000",
+                 "items": [{"field": "status", "fromString": "Open", "toString": f"Step {i}"}]}
+                for i in range(number % 4)]
+
+    lock = threading.Lock()
+    limit_state = {"window_start": time.time(), "count": 0}
+    failures_left = set(jira_fail_once)
+    stats = {"requests": 0, "refused": 0, "not_modified": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are written separately, with Nagle's algorithm every answer on a
+        # kept-alive connection would wait for the client's delayed ACK (40 ms)
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def send(self, status, body=b"", headers=None):
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+
+        def rate_limit_headers(self):
+            if rate_limit is None:
+                return {}, True
+            with lock:
+                now = time.time()
+                if now - limit_state["window_start"] >= window:
+                    limit_state.update(window_start=now, count=0)
+                limit_state["count"] += 1
+                remaining = rate_limit - limit_state["count"]
+                reset = limit_state["window_start"] + window
+            headers = {"X-RateLimit-Limit": str(rate_limit), "X-RateLimit-Remaining": str(max(remaining, 0)),
+                       "X-RateLimit-Reset": str(int(reset + 0.999))}
+            return headers, remaining >= 0
+
+        def do_HEAD(self):
+            self.do_GET()
+
+        def do_GET(self):
+            time.sleep(latency)
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            headers, allowed = self.rate_limit_headers()
+            with lock:
+                stats["requests" if allowed else "refused"] += 1
+            if not allowed:
+                if url.path.startswith("/rest/api"):
+                    self.send(429, b"{}", {"Retry-After": str(max(1, int(float(headers["X-RateLimit-Reset"]) - time.time())))})
+                else:
+                    self.send(403, b'{"message": "API rate limit exceeded"}', headers)
+                return
+
+            if self.command == "HEAD":
+                self.send(404 if url.path.endswith("-missing") else 200, headers=headers)
+            elif url.path.endswith("/issues"):
+                page = int(query.get("page", ["1"])[0])
+                per_page = min(int(query.get("per_page", ["30"])[0]), 100)
+                first = (page - 1) * per_page + 1
+                items = [{"number": number, "title": f"Issue {number}", "body": "Something is broken",
+                          "state": "closed" if number % 3 else "open"}
+                         for number in range(first, min(first + per_page, github_issues + 1))]
+                if first + per_page <= github_issues:
+                    host = self.headers.get("Host")
+                    headers["Link"] = f'<http://{host}{url.path}?page={page + 1}&per_page={per_page}>; rel="next"'
+                body = json.dumps(items).encode()
+                headers["ETag"] = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+                if self.headers.get("If-None-Match") == headers["ETag"]:
+                    with lock:
+                        stats["not_modified"] += 1
+                    self.send(304, headers=headers)
+                else:
+                    self.send(200, body, headers)
+            elif url.path.endswith("/search"):
+                start_at = int(query.get("startAt", ["0"])[0])
+                max_results = min(int(query.get("maxResults", ["50"])[0]), 100)
+                with lock:
+                    fail = start_at in failures_left
+                    failures_left.discard(start_at)
+                if fail:
+                    self.send(503, b"{}", headers)
+                    return
+                issues = [{"id": str(number), "key": f"SYN-{number}",
+                           "fields": {"summary": f"Issue {number}", "description": "Something is broken",
+                                      "status": {"name": "Closed"}}}
+                          for number in range(start_at + 1, min(start_at + max_results, jira_issues) + 1)]
+                if "changelog" in query.get("expand", [""])[0]:
+                    for issue in issues:
+                        histories = fake_histories(issue["key"])
+                        issue["changelog"] = {"startAt": 0, "maxResults": 2, "total": len(histories),
+                                              "histories": histories[:2]}
+                page = {"startAt": start_at, "maxResults": max_results, "total": jira_issues, "issues": issues}
+                self.send(200, json.dumps(page).encode(), headers)
+            elif url.path.endswith("/changelog"):
+                histories = fake_histories(url.path.split("/")[-2])
+                start_at = int(query.get("startAt", ["0"])[0])
+                max_results = int(query.get("maxResults", ["100"])[0])
+                values = histories[start_at:start_at + max_results]
+                page = {"startAt": start_at, "maxResults": max_results, "total": len(histories),
+                        "isLast": start_at + len(values) >= len(histories), "values": values}
+                self.send(200, json.dumps(page).encode(), headers)
+            else:
+                self.send(404, b"{}", headers)
+
+    class Server(ThreadingHTTPServer):
+        # With the default listen backlog of 5, connections of larger worker pools are dropped
+        # and only get through with the TCP retry a second later
+        request_queue_size = 128
+        daemon_threads = True
+
+    server = Server(("127.0.0.1", 0), Handler)
+    server.stats = stats
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def benchmark_link_validation(links=200, latency=0.05, worker_counts=(1, 4, 16), rate_limit=None):
+    """
+    Time link_machine.validate_links against a local server with a fixed latency per request.
+
+    Parameters:
+    - links (int): Number of links checked per run, every tenth one is missing
+    - latency (float): Seconds the server takes per request
+    - worker_counts (tuple): Pool sizes to compare
+    - rate_limit (float, optional): Requests per second to the server, like link_machine's
+      limit for github.com. Unlimited by default, so only the pool size bounds the throughput
+
+    Returns:
+    - dict: Per pool size the time in seconds and links per second
+    """
+    server = start_fake_server(latency)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    urls = [f"{base_url}/apache/project{i}" + ("-missing" if i % 10 == 0 else "") for i in range(links)]
+    results = {"links": links, "latency": latency, "rate_limit": rate_limit}
+    try:
+        for workers in worker_counts:
+            rate_limits = {"127.0.0.1": (rate_limit, workers)} if rate_limit else LOCAL_RATE_LIMITS
+            client = HttpClient(rate_limits=rate_limits)
+            start = time.perf_counter()
+            checked = list(validate_links(urls, workers, client))
+            seconds = time.perf_counter() - start
+            assert len(checked) == links and sum(ok for _, ok, _ in checked) == links - len(range(0, links, 10))
+            results[f"workers_{workers}"] = {"seconds": seconds, "links_per_second": links / seconds}
+    finally:
+        server.shutdown()
+    return results
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+def measure(function, args):
+    """
+    Run a stage function and measure it. Meant to run in a fresh process, so the peak RSS is
+    the stage's own. CPU time includes the subprocesses the stage waited for (git, scc).
+    """
+    children = resource.getrusage(resource.RUSAGE_CHILDREN) if resource else None
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    result = function(*args) or {}
+    seconds = time.perf_counter() - start
+    cpu_seconds = time.process_time() - cpu_start
+    if resource:
+        children_end = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_seconds += (children_end.ru_utime - children.ru_utime) + (children_end.ru_stime - children.ru_stime)
+    measurement = {"seconds": seconds, "cpu_seconds": cpu_seconds, "peak_rss_mb": peak_rss_mb()}
+    measurement.update(result)
+    for unit in ("commits", "requests", "issues"):
+        if unit in result:
+            measurement[f"{unit}_per_second"] = result[unit] / seconds if seconds else None
+    return measurement
+
+def run_stage(function, *args):
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(measure, function, args).result()
+
+def stage_diff(repository_path, output_dir, backend):
+    calculate_and_collect_diff(repository_path, output_dir, output_format="jsonl", backend=backend)
+    return {"commits": count_commits(repository_path)}
+
+def stage_effort(repository_path, output_dir):
+    collect_developers_effort(repository_path, output_dir)
+    return {"commits": count_commits(repository_path)}
+
+def stage_single_pass(repository_path, output_dir):
+    consumers = [DiffRecordConsumer(output_dir, diff_store=True), EffortConsumer(output_dir), BugFixConsumer(),
+                 RefactoringCandidateConsumer(output_dir)]
+    return {"commits": walk_commits(repository_path, consumers, with_patch=True)}
+
+def stage_bug_fixes(repository_path, output_dir, api_url):
+    client = HttpClient(rate_limits=LOCAL_RATE_LIMITS)
+    github = GitHubClient(cache_dir=None, api_url=api_url, session=client)
+    mine_bug_fixing_commits_api("https://github.com/synthetic/repository", output_dir, client=github,
+                                project_dir=repository_path)
+    return {"commits": count_commits(repository_path), "requests": client.get_stats()["requests"]}
+
+def stage_jira(output_dir, base_url):
+    client = HttpClient(rate_limits=LOCAL_RATE_LIMITS)
+    issues = harvest_jira_issues(base_url, "project = SYN", os.path.join(output_dir, "jira_issues.jsonl"), session=client)
+    return {"issues": issues, "requests": client.get_stats()["requests"]}
+
+def stage_refactorings(json_output, output_dir):
+    counts = analyze_and_zip_output(json_output, os.path.join(output_dir, "rminer_output.zip"))
+    return {"commits": counts["commits"]}
+
+def stage_links(base_url, links, workers):
+    client = HttpClient(rate_limits=LOCAL_RATE_LIMITS)
+    urls = [f"{base_url}/apache/project{i}" + ("-missing" if i % 10 == 0 else "") for i in range(links)]
+    list(validate_links(urls, workers, client))
+    return {"requests": client.get_stats()["requests"]}
+
+def benchmark_suite(commits=1000, files=100, churn=5, authors=10, latency=0.02, rate_limit=None, window=1.0,
+                    github_issues=300, jira_issues=1000, links=200, pydriller=False, seed=0):
+    """
+    Generate a synthetic repository and a fake GitHub/Jira server, then time every stage of
+    the pipeline on them, each stage in a fresh process.
+
+    Parameters:
+    - commits, files, churn, authors (int): Shape of the repository, see generate_repository
+    - latency (float): Seconds the fake server takes per request
+    - rate_limit (int, optional): Requests the fake server answers per window
+    - window (float): Length of the rate limit window in seconds
+    - github_issues, jira_issues (int): Issues served by the fake server
+    - links (int): Links checked by the link validation stage
+    - pydriller (bool): Also time the (slow) pydriller diff backend
+    - seed (int): Random seed of the repository
+
+    Returns:
+    - dict: The configuration and, per stage, seconds, CPU seconds, peak RSS in MB and the
+      throughput (commits, requests or issues per second)
+    """
+    config = {"commits": commits, "files": files, "churn": churn, "authors": authors, "latency": latency,
+              "rate_limit": rate_limit, "window": window, "github_issues": github_issues,
+              "jira_issues": jira_issues, "links": links, "seed": seed}
+    results = {"config": config, "stages": {}}
+    server = start_fake_server(latency, rate_limit, window, github_issues, jira_issues)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench_suite_") as work_dir:
+            repository_path = os.path.join(work_dir, "repository")
+            start = time.perf_counter()
+            generate_repository(repository_path, commits, files, churn, authors, issues=github_issues, seed=seed)
+            results["generate_seconds"] = time.perf_counter() - start
+
+            def output_dir(stage):
+                path = os.path.join(work_dir, stage)
+                os.makedirs(path, exist_ok=True)
+                return path
+
+            stages = results["stages"]
+            if pydriller:
+                stages["diff_pydriller"] = run_stage(stage_diff, repository_path, output_dir("diff_pydriller"), "pydriller")
+            stages["diff_numstat"] = run_stage(stage_diff, repository_path, output_dir("diff_numstat"), "numstat")
+            stages["effort"] = run_stage(stage_effort, repository_path, output_dir("effort"))
+            stages["single_pass"] = run_stage(stage_single_pass, repository_path, output_dir("single_pass"))
+            stages["bug_fixes"] = run_stage(stage_bug_fixes, repository_path, output_dir("bug_fixes"), base_url)
+            stages["jira"] = run_stage(stage_jira, output_dir("jira"), base_url)
+            json_output = os.path.join(output_dir("refactorings"), "rminer_output.json")
+            generate_rminer_output(repository_path, json_output, seed)
+            stages["refactorings"] = run_stage(stage_refactorings, json_output, output_dir("refactorings"))
+            stages["links"] = run_stage(stage_links, base_url, links, 16)
+    finally:
+        server.shutdown()
+    results["server"] = dict(server.stats)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the diff_analyzer backends on a local repository, "
+                                                 "the link validation against a local HTTP server, or (--suite) "
+                                                 "every stage on a synthetic repository and a fake GitHub/Jira server.")
+    parser.add_argument("repository", nargs="?", help="Path to a local Git repository")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per backend, the fastest is reported")
+    parser.add_argument("--links", type=int, help="Benchmark link validation with this many links instead")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per request of the local server")
+    parser.add_argument("--link-rate-limit", type=float, default=None,
+                        help="Requests per second of the link checks, e.g. link_machine.LINK_RATE_LIMIT")
+    parser.add_argument("--suite", action="store_true", help="Run the synthetic benchmark suite")
+    parser.add_argument("--commits", type=int, default=1000, help="Suite: commits of the synthetic repository")
+    parser.add_argument("--files", type=int, default=100, help="Suite: files of the synthetic repository")
+    parser.add_argument("--churn", type=int, default=5, help="Suite: files changed per commit")
+    parser.add_argument("--authors", type=int, default=10, help="Suite: distinct authors")
+    parser.add_argument("--rate-limit", type=int, default=None, help="Suite: requests the fake server answers per window")
+    parser.add_argument("--window", type=float, default=1.0, help="Suite: rate limit window in seconds")
+    parser.add_argument("--pydriller", action="store_true", help="Suite: also time the pydriller diff backend")
+    parser.add_argument("--seed", type=int, default=0, help="Suite: random seed of the repository")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+    if args.suite:
+        results = benchmark_suite(args.commits, args.files, args.churn, args.authors, args.latency, args.rate_limit,
+                                  args.window, links=args.links or 200, pydriller=args.pydriller, seed=args.seed)
+    elif args.links:
+        results = benchmark_link_validation(args.links, args.latency, rate_limit=args.link_rate_limit)
+    elif args.repository:
+        results = benchmark_diff_backends(args.repository, args.repeat)
+    else:
+        parser.error("either a repository, --links or --suite is required")
+    print(json.dumps(results, indent=4))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
@@ -1,70 +1,176 @@
 import json
 import os
+import re
 import requests
-from time import sleep
+from github_client import GitHubClient
+from commit_walker import walk_commits
+from jira_harvester import APACHE_JIRA_URL, iter_jira_issues
+from record_index import build_index
 
 # GitHub and Jira API URLs
 jira_projects_url = "https://issues.apache.org/jira/rest/api/2/project"
 jira_issues_url = "https://issues.apache.org/jira/rest/api/2/search"
-# GITHUB_TOKEN = "YOUR GITHUB TOKEN HERE"
+jira_base_url = APACHE_JIRA_URL
+# The GitHub token is read from the GITHUB_TOKEN environment variable by GitHubClient
 
-def mine_bug_fixing_commits_api(project_url, output_dir):
+BUG_FIX_KEYWORDS = ("fix", "bug", "error")
+# "#123" for GitHub issues (not part of a URL fragment or word), "KEY-123" for Jira issues
+GITHUB_ISSUE_PATTERN = re.compile(r'(?<![\w/&])#(\d+)\b')
+JIRA_ISSUE_PATTERN = re.compile(r'\b([A-Z][A-Z0-9_]+-\d+)\b')
+
+def is_bug_fixing_message(commit_message):
+    """
+    Keyword classification of a commit message as bug-fixing.
+    """
+    commit_message = commit_message.lower()
+    return any(keyword in commit_message for keyword in BUG_FIX_KEYWORDS)
+
+
+class BugFixConsumer:
+    """
+    Consumer for commit_walker.walk_commits that keeps the bug-fixing commits of the shared
+    history pass, to be passed to mine_bug_fixing_commits_api instead of fetching commits
+    from the GitHub API.
+    """
+
+    def __init__(self):
+        self.commits = []
+
+    def consume(self, commit):
+        if is_bug_fixing_message(commit["message"]):
+            self.commits.append({"sha": commit["hash"], "message": commit["message"]})
+
+    def finish(self):
+        pass
+
+
+def get_local_bug_fixing_commits(project_dir):
+    """
+    Classify the commits of a local clone (or mirror) by streaming its `git log`, without
+    computing any diffs. Covers the full history and needs no network access.
+
+    Returns:
+    - list: Dicts with the "sha" and "message" of the bug-fixing commits
+    """
+    consumer = BugFixConsumer()
+    walk_commits(project_dir, [consumer], with_files=False)
+    return consumer.commits
+
+
+def mine_bug_fixing_commits_api(project_url, output_dir, commits=None, client=None, project_dir=None):
     """
     Attempt to mine bug-fixing commits from GitHub. If issues are not found, fall back to Jira.
+
+    The commits are classified from the local clone when project_dir is given, or taken from
+    commits (dicts with "sha" and "message", e.g. from BugFixConsumer) if given. Only without
+    either are they fetched from the GitHub API. The network is otherwise only used for the
+    issues, all pages of which are fetched through the caching GitHubClient.
     """
     print(f"Mining bug-fixing commits for {project_url} via GitHub API...")
+    client = client or GitHubClient()
+    if commits is None and project_dir is not None:
+        commits = get_local_bug_fixing_commits(project_dir)
 
     # Extract owner and repo name from project URL
     owner_repo = project_url.rstrip('/').split('/')[-2:]
     repo_owner, repo_name = owner_repo[0], owner_repo[1]
 
-    headers = {
-        "Authorization": f"token {GITHUB_TOKEN}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-
     # GitHub Issues
-    issues_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/issues"
-    response = requests.get(issues_url, headers=headers, params={"state": "all"})
+    try:
+        issues = list(client.get_paginated(f"repos/{repo_owner}/{repo_name}/issues", {"state": "all"}))
+    except requests.HTTPError as e:
+        print(f"Could not fetch GitHub issues for {repo_name}: {e}")
+        issues = []
     
-    if response.status_code == 200 and response.json():
-        issues = response.json()
-        bug_fixing_commits = fetch_commits_from_github(repo_owner, repo_name, headers, issues)
+    if issues:
+        if commits is not None:
+            bug_fixing_commits = classify_bug_fixing_commits(commits, issues)
+        else:
+            bug_fixing_commits = fetch_commits_from_github(repo_owner, repo_name, client, issues)
         save_bug_data(output_dir, repo_name, True, bug_fixing_commits, issues)
     else:
         print(f"No GitHub issues found for {repo_name}. Attempting to fetch Jira issues.")
-        fetch_issues_from_jira(project_url,output_dir)
+        fetch_issues_from_jira(project_url, output_dir, commits)
 
 
-def fetch_commits_from_github(repo_owner, repo_name, headers, issues):
+def fetch_commits_from_github(repo_owner, repo_name, client, issues):
     """
     Helper function to fetch commits from GitHub based on keywords.
     """
-    commits_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/commits"
-    response = requests.get(commits_url, headers=headers)
-    commits = response.json()
+    commits = ({"sha": commit['sha'], "message": commit['commit']['message']}
+               for commit in client.get_paginated(f"repos/{repo_owner}/{repo_name}/commits"))
+    return classify_bug_fixing_commits(commits, issues)
+
+
+def extract_issue_references(commit_message):
+    """
+    Find the issues a commit message refers to, in order of appearance and without duplicates.
+    GitHub references ("#12") are returned as ints, Jira references ("DAFFODIL-12") as strings.
+    Whole numbers are matched, so "#123" never counts as a reference to issue 12.
+    """
+    references = [int(number) for number in GITHUB_ISSUE_PATTERN.findall(commit_message)]
+    references += JIRA_ISSUE_PATTERN.findall(commit_message)
+    return list(dict.fromkeys(references))
+
+def build_issue_index(issues):
+    """
+    Index issues by reference: GitHub issues by "number", Jira issues by "key" (or "issue_key").
+    """
+    index = {}
+    for issue in issues:
+        if "number" in issue:
+            index[issue["number"]] = issue
+        key = issue.get("key") or issue.get("issue_key")
+        if key:
+            index[key] = issue
+    return index
+
+def link_commit_to_issues(commit_message, issue_index):
+    """
+    Resolve the issue references of a commit message through an index from build_issue_index.
+
+    Returns:
+    - list: The references that point to a known issue
+    """
+    return [reference for reference in extract_issue_references(commit_message) if reference in issue_index]
+
+
+def classify_bug_fixing_commits(commits, issues):
+    """
+    Keep the bug-fixing commits and link them to the issues they mention.
+
+    Every message is scanned once and its references are looked up in a hash index of the
+    issues, so this is linear in the number of commits plus issues. "associated_issue" is the
+    first linked issue, "associated_issues" all of them.
+
+    Parameters:
+    - commits (iterable): Dicts with the commit "sha" and "message"
+    - issues (list): GitHub (or Jira) issues
+    """
+    issue_index = build_issue_index(issues)
     bug_fixing_commits = []
 
     for commit in commits:
-        commit_message = commit['commit']['message'].lower()
-        if "fix" in commit_message or "bug" in commit_message or "error" in commit_message:
-            associated_issue = next((issue['number'] for issue in issues if f"#{issue['number']}" in commit_message), None)
+        if is_bug_fixing_message(commit['message']):
+            associated_issues = link_commit_to_issues(commit['message'], issue_index)
             bug_fixing_commits.append({
                 "commit_hash": commit['sha'],
-                "commit_message": commit['commit']['message'],
-                "associated_issue": associated_issue
+                "commit_message": commit['message'],
+                "associated_issue": associated_issues[0] if associated_issues else None,
+                "associated_issues": associated_issues
             })
     
     return bug_fixing_commits
 
 
-def fetch_issues_from_jira(project_url, output_dir):
+def fetch_issues_from_jira(project_url, output_dir, commits=None):
     """
     Fetch all bug-fixing issues from Jira for a single project URL.
     
     Parameters:
     - project_url (str): The project URL.
     - output_dir (str): Directory where JSON files with issue data will be saved.
+    - commits (list, optional): Local commits ("sha" and "message") to link to the issues by key.
     """
     # Extract the project key (last part of the URL)
     project_key = project_url.rstrip('/').split('/')[-1]
@@ -76,44 +182,35 @@ def fetch_issues_from_jira(project_url, output_dir):
     output_file = os.path.join(project_folder, "bug_fixes.json")
 
     project_data = {"using_github_issues": False, "bug_fixing_commits": [], "issue_data": []}
-    start_at = 0
-    page_size = 50  # Define page size for Jira API pagination
-
-    while True:
-        # Set up parameters for the paginated issue search
-        params = {
-            "jql": f"project = '{project_key}' AND issuetype = Bug AND status in (Closed, Resolved)",
-            "startAt": start_at,
-            "maxResults": page_size
-        }
+    jql = f"project = '{project_key}' AND issuetype = Bug AND status in (Closed, Resolved)"
 
-        response = requests.get(jira_issues_url, params=params)
-        if response.status_code == 200:
-            issues = response.json().get("issues", [])
-            for issue in issues:
+    # The result pages are fetched concurrently and the raw issues are streamed to disk as they arrive
+    raw_output_file = os.path.join(project_folder, "jira_issues.jsonl")
+    try:
+        with open(raw_output_file, "w") as raw_file:
+            for issue in iter_jira_issues(jira_base_url, jql, expand=None, fields=["summary", "description", "status"]):
+                raw_file.write(json.dumps(issue) + "\n")
                 issue_data = {
                     "project_key": project_key,
                     "issue_number": issue["id"],
+                    "issue_key": issue["key"],
                     "title": issue["fields"]["summary"],
                     "body": issue["fields"].get("description", ""),
                     "state": issue["fields"]["status"]["name"].lower()
                 }
                 project_data["issue_data"].append(issue_data)
+    except requests.HTTPError as e:
+        print(f"Failed to retrieve issues for project {project_key}. Status code: {e.response.status_code}")
 
-            # Update start_at for the next page
-            start_at += page_size
-
-            # Exit loop if no more issues are available
-            if len(issues) < page_size:
-                break
-        else:
-            print(f"Failed to retrieve issues for project {project_key}. Status code: {response.status_code}")
-            break
+    # Link the commits once all issues are known
+    if commits is not None:
+        project_data["bug_fixing_commits"] = classify_bug_fixing_commits(commits, project_data["issue_data"])
 
-        # Write the project data to a JSON file
-        with open(output_file, "w") as f:
-            json.dump(project_data, f, indent=4)
-        print(f"Jira data for project {project_key} written to {output_file}")
+    # Write the project data to a JSON file
+    with open(output_file, "w") as f:
+        json.dump(project_data, f, indent=4)
+    build_index(output_file)
+    print(f"Jira data for project {project_key} written to {output_file}")
 
 
 
@@ -142,6 +239,7 @@ def save_bug_data(output_dir, repo_name, using_github_issues, bug_fixing_commits
 
     with open(output_file, 'w') as f:
         json.dump(bug_data, f, indent=2)
+    build_index(output_file)
     print(f"Bug-fixing data saved to {output_file}")
 
 
@@ -155,7 +253,6 @@ def mine_multiple_projects_from_file(sources_file, output_dir):
     for url in project_urls:
         try:
             mine_bug_fixing_commits_api(url, output_dir)
-            sleep(0.5)  # Respect GitHub API rate limits
         except Exception as exc:
             print(f"Failed processing {url} due to {exc}")
 
@@ -0,0 +1,175 @@
+import io
+import re
+import subprocess
+import threading
+from datetime import datetime
+from itertools import islice
+
+# Start of a commit; the header fields are NUL-terminated. Patch texts hold no NUL, so the
+# marker also ends the patch text of the commit before.
+COMMIT_MARKER = '%x00%x00'
+LOG_FORMAT = COMMIT_MARKER + '%H%x00%P%x00%an%x00%ae%x00%aN%x00%aE%x00%cI%x00%B%x00'
+LOG_HEADER_FIELDS = 8
+
+# An entry of `git log -z --numstat`: added, deleted and the path, which is empty for a rename
+# whose old and new path follow as two more fields. The first entry of a commit starts on a new line.
+NUMSTAT_ENTRY = re.compile(r'\n?(-|\d+)\t(-|\d+)\t(.*)', re.DOTALL)
+
+
+def iter_nul_fields(stream, chunk_size=1 << 16):
+    """
+    Yield the NUL-terminated fields of a binary output stream, decoded as UTF-8.
+    """
+    pending = []
+    for chunk in iter(lambda: stream.read1(chunk_size), b''):
+        fields = chunk.split(b'\x00')
+        if len(fields) == 1:
+            pending.append(chunk)
+            continue
+        pending.append(fields[0])
+        yield b''.join(pending).decode('utf-8', 'replace')
+        for field in fields[1:-1]:
+            yield field.decode('utf-8', 'replace')
+        pending = [fields[-1]]
+    if any(pending):
+        yield b''.join(pending).decode('utf-8', 'replace')
+
+def iter_log_entries(stream, header_fields):
+    """
+    Split the output of `git log -z --numstat [-p]` into commits. The format must start with
+    COMMIT_MARKER followed by header_fields NUL-terminated fields.
+
+    Paths are read verbatim as separate fields, so no quoting or rename notation
+    ("dir/{old => new}/file") has to be parsed.
+
+    Yields:
+    - tuple: (header fields, files, patch text of all files or None without -p), the files are
+      (added_lines, deleted_lines, old_path, new_path) tuples with None lines for binary files
+    """
+    fields = iter_nul_fields(stream)
+    header, files, patch = None, [], None
+    for field in fields:
+        if header is not None:
+            if not field.strip():
+                continue
+            entry = NUMSTAT_ENTRY.fullmatch(field)
+            if entry is not None:
+                added, deleted, path = entry.groups()
+                old_path, new_path = (path, path) if path else (next(fields), next(fields))
+                files.append((None if added == '-' else int(added), None if deleted == '-' else int(deleted),
+                              old_path, new_path))
+                continue
+            if field.startswith('diff --git '):
+                patch = field
+                continue
+            yield header, files, patch
+        elif not field.strip():
+            continue
+        header = [field] + list(islice(fields, header_fields - 1))
+        files, patch = [], None
+    if header is not None:
+        yield header, files, patch
+
+def split_patches(text):
+    """
+    Split the patch text of a commit into the texts of its files, each from the first hunk on
+    like pydriller. Files without hunks (pure renames, mode changes) get an empty text.
+    """
+    patches = []
+    # Only split on "\n" and keep "\r\n" line endings in the patch texts
+    for line in io.StringIO(text, newline='\n'):
+        if line.startswith('diff --git '):
+            patches.append(None)
+        elif patches and patches[-1] is None:
+            # Header of the file patch, the text starts at the first hunk
+            if line.startswith('@@') or line.startswith('Binary files '):
+                patches[-1] = [line]
+        elif patches:
+            patches[-1].append(line)
+    return ["".join(lines or []) for lines in patches]
+
+def parse_header(fields):
+    return {
+        "hash": fields[0],
+        "parents": fields[1].split(),
+        "author": fields[2],
+        "author_email": fields[3],
+        "mailmap_author": fields[4],
+        "mailmap_email": fields[5],
+        "date": datetime.fromisoformat(fields[6]),
+        "message": fields[7].rstrip('\n'),
+        "files": []
+    }
+
+def walk_commits(repository_path, consumers, with_patch=False, with_files=True, commits=None):
+    """
+    Read the history of a repository once and hand every commit to each consumer.
+
+    One `git log -z --reverse --numstat` process is used (plus `-p` if a consumer needs the patch
+    texts). Merge commits are diffed against their first parent. Commits come in the same order
+    as a pydriller traversal, oldest first.
+
+    A consumer is any object with a consume(commit) and a finish() method. The commit is a dict:
+    hash, parents, author, author_email, mailmap_author, mailmap_email, date (committer date),
+    message, and files, a list of dicts with old_path, new_path, added_lines, deleted_lines,
+    binary and, with with_patch, diff (the patch text from the first hunk on, like pydriller).
+
+    Parameters:
+    - repository_path (str): Path to the repository (a bare mirror works)
+    - consumers (list): The consumers
+    - with_patch (bool): Also read the patch text of every file
+    - with_files (bool): Read the changed files at all, consumers that only need the commit
+      metadata and messages skip all diff computation with False
+    - commits (list, optional): Walk only these commits, in this order, instead of the history of HEAD
+
+    Returns:
+    - int: The number of commits walked
+    """
+    command = ['git', 'log', '-z', f'--format={LOG_FORMAT}']
+    if with_files:
+        command += ['--diff-merges=first-parent', '--numstat']
+    if with_files and with_patch:
+        command += ['-p', '--no-color', '--no-ext-diff']
+    if commits is None:
+        command.insert(3, '--reverse')
+    elif commits:
+        command += ['--no-walk=unsorted', '--stdin']
+    else:
+        # git log --stdin without any commit would fall back to HEAD
+        for consumer in consumers:
+            consumer.finish()
+        return 0
+    process = subprocess.Popen(command, cwd=repository_path, stdin=subprocess.PIPE if commits else None,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if commits:
+        # Fed from a thread, writing everything first could fill the output pipe and block
+        def feed_commits():
+            process.stdin.writelines(f"{commit_hash}\n".encode() for commit_hash in commits)
+            process.stdin.close()
+        threading.Thread(target=feed_commits, daemon=True).start()
+
+    count = 0
+    for header, files, patch in iter_log_entries(process.stdout, LOG_HEADER_FIELDS):
+        commit = parse_header(header)
+        for added, deleted, old_path, new_path in files:
+            commit["files"].append({
+                "old_path": old_path,
+                "new_path": new_path,
+                "added_lines": added or 0,
+                "deleted_lines": deleted or 0,
+                "binary": added is None
+            })
+        if patch is not None:
+            for file, text in zip(commit["files"], split_patches(patch)):
+                file["diff"] = text
+        for consumer in consumers:
+            consumer.consume(commit)
+        count += 1
+
+    stderr = process.stderr.read().decode('utf-8', 'replace')
+    if process.wait() != 0:
+        raise RuntimeError(f"Git log command failed: {stderr}")
+
+    for consumer in consumers:
+        consumer.finish()
+    return count
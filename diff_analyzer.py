@@ -1,9 +1,456 @@
 from pydriller.repository import Repository
+from pydriller.git import Git
 import os
+import shutil
+import subprocess
+import multiprocessing
+import threading
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import gzip
 import json
 import requests
+from diff_store import DiffStore, store_record_diffs, load_record_diffs
+from commit_walker import COMMIT_MARKER, iter_log_entries
+from jira_harvester import iter_jira_issues
+from record_index import build_index, IndexWriter
 
-def calculate_and_collect_diff(repository_path, project_output_dir, repo_type="github", jira_base_url=None, project_key=None, auth_token=None):
+DIFF_OUTPUT_FILES = {
+    ("json", False): "diff_analysis.json",
+    ("jsonl", False): "diff_analysis.jsonl",
+    ("jsonl", True): "diff_analysis.jsonl.gz",
+}
+
+def commit_to_record(commit):
+    """
+    Convert a pydriller commit into the record stored in the diff analysis output.
+    """
+    commit_info = {
+        "hash": commit.hash,
+        "author": commit.author.name,
+        "date": commit.committer_date,
+        "modified_files": []
+    }
+
+    for modified_file in commit.modified_files:
+        # Capture file-level changes like lines added and removed
+        file_diff = {
+            "filename": modified_file.filename,
+            "added_lines": modified_file.added_lines,
+            "deleted_lines": modified_file.deleted_lines,
+            "diff": modified_file.diff  # Optional: Full diff string
+        }
+        commit_info["modified_files"].append(file_diff)
+
+    return commit_info
+
+def iter_github_records(repository_path, commits=None, git=None):
+    """
+    Yield one diff record per commit of a Git repository, oldest first.
+    If a list of commit hashes is given, only those commits are yielded, in that order.
+    """
+    if commits is not None:
+        git = git or Git(repository_path)
+        for commit_hash in commits:
+            yield commit_to_record(git.get_commit(commit_hash))
+        return
+
+    # Use pydriller for GitHub repositories
+    for commit in Repository(repository_path).traverse_commits():
+        yield commit_to_record(commit)
+
+def iter_numstat_records(repository_path, commits=None):
+    """
+    Yield one diff record per commit from a single streaming `git log -z --numstat` process.
+
+    The records have the same fields as commit_to_record except the "diff" text, which is
+    what makes this much faster than building full diffs with pydriller. Like pydriller,
+    merge commits have no modified files, binary files count 0 added/deleted lines and
+    renamed files are reported by their new name.
+    If a list of commit hashes is given, only those commits are yielded, in that order.
+    """
+    # git log --stdin without any commit would fall back to HEAD
+    if commits is not None and not commits:
+        return
+    command = ['git', 'log', '-z', '--numstat', f'--format={COMMIT_MARKER}%H%x00%an%x00%cI%x00']
+    if commits is None:
+        command.insert(3, '--reverse')
+    else:
+        command += ['--no-walk=unsorted', '--stdin']
+
+    process = subprocess.Popen(command, cwd=repository_path, stdin=subprocess.PIPE if commits is not None else None,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if commits is not None:
+        # Fed from a thread, writing everything first could fill the output pipe and block
+        def feed_commits():
+            process.stdin.writelines(f"{commit_hash}\n".encode() for commit_hash in commits)
+            process.stdin.close()
+        threading.Thread(target=feed_commits, daemon=True).start()
+
+    for (commit_hash, author, date), files, _ in iter_log_entries(process.stdout, 3):
+        yield {
+            "hash": commit_hash,
+            "author": author,
+            "date": datetime.fromisoformat(date),
+            "modified_files": [{
+                "filename": new_path.rsplit('/', 1)[-1],
+                "added_lines": added or 0,
+                "deleted_lines": deleted or 0
+            } for added, deleted, _, new_path in files]
+        }
+
+    stderr = process.stderr.read().decode('utf-8', 'replace')
+    if process.wait() != 0:
+        raise RuntimeError(f"Git log command failed: {stderr}")
+
+# pydriller Git object of a worker process of iter_github_records_parallel
+worker_git = None
+
+def init_shard_worker(repository_path, lock):
+    global worker_git
+    # Opening a pydriller Git writes to the repository config, which fails if another
+    # process holds the config lock at the same time
+    with lock:
+        worker_git = Git(repository_path)
+
+def write_shard(repository_path, commits, shard_file):
+    """
+    Worker of iter_github_records_parallel: write the records of a range of commits to a shard file.
+    """
+    return write_jsonl_records(iter_github_records(repository_path, commits, worker_git), shard_file)
+
+def iter_github_records_parallel(repository_path, commits, workers, shard_dir, shards_per_worker=4):
+    """
+    Yield the records of the given commits in order, computing them in a pool of processes.
+
+    The commit list is split into consecutive ranges, each worker process opens its own
+    pydriller Git object and writes its range to a shard file. The shards are read back and
+    deleted in history order, so the merged output is the same as a sequential traversal.
+
+    Args:
+        repository_path (str): The local path to the Git repository.
+        commits (list): Commit hashes in traversal order.
+        workers (int): Number of worker processes.
+        shard_dir (str): Directory for the temporary shard files.
+        shards_per_worker (int): Ranges per worker, more ranges balance uneven commits better.
+    """
+    if not commits:
+        return
+    shutil.rmtree(shard_dir, ignore_errors=True)  # Shards of an interrupted run
+    os.makedirs(shard_dir)
+    shard_count = min(len(commits), workers * shards_per_worker)
+    shard_size = -(-len(commits) // shard_count)
+    ranges = [commits[start:start + shard_size] for start in range(0, len(commits), shard_size)]
+
+    lock = multiprocessing.Manager().Lock()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_shard_worker, initargs=(repository_path, lock)) as executor:
+        futures = []
+        for index, commit_range in enumerate(ranges):
+            shard_file = os.path.join(shard_dir, f"shard_{index:05d}.jsonl")
+            futures.append((executor.submit(write_shard, repository_path, commit_range, shard_file), shard_file))
+
+        for future, shard_file in futures:
+            future.result()
+            yield from iter_diff_records(shard_file)
+            os.remove(shard_file)
+
+    shutil.rmtree(shard_dir, ignore_errors=True)
+
+def iter_jira_records(jira_base_url, project_key, auth_token, max_workers=8):
+    """
+    Yield one record per issue of a Jira project, with the status changes of the issue.
+    All result pages are fetched concurrently, with the changelogs inline.
+    """
+    # For Jira repositories, retrieve issue data with Jira API
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    issues = iter_jira_issues(jira_base_url, f"project={project_key}", max_workers=max_workers, expand="changelog",
+                              fields=["summary", "status", "created", "updated"], headers=headers)
+    try:
+        for issue in issues:
+            issue_data = {
+                "key": issue["key"],
+                "summary": issue["fields"]["summary"],
+                "status": issue["fields"]["status"]["name"],
+                "created": issue["fields"]["created"],
+                "updated": issue["fields"]["updated"],
+                "changelog": []  # to store diff-like changes in the issue history
+            }
+            # Add change history for each issue
+            for change in issue.get("changelog", {}).get("histories", []):
+                change_data = {
+                    "author": change["author"]["displayName"],
+                    "date": change["created"],
+                    "items": []
+                }
+                for item in change["items"]:
+                    # Track status changes or other field modifications
+                    if item["field"] == "status":
+                        item_data = {
+                            "field": item["field"],
+                            "from": item["fromString"],
+                            "to": item["toString"]
+                        }
+                        change_data["items"].append(item_data)
+                issue_data["changelog"].append(change_data)
+
+            yield issue_data
+    except requests.HTTPError as e:
+        print("Failed to fetch issues from Jira:", e.response.status_code, e.response.text)
+
+def read_checkpoint(checkpoint_file):
+    """
+    Read the checkpoint of a JSON Lines output, or None if there is no checkpoint.
+
+    The checkpoint holds the hash of the last record written ("last_commit"), the number of
+    records ("records") and the size of the output file after that record ("offset").
+    """
+    if not os.path.exists(checkpoint_file):
+        return None
+    with open(checkpoint_file, 'r') as file:
+        return json.load(file)
+
+def read_resumable_checkpoint(checkpoint_file, output_file, repository_path):
+    """
+    Read the checkpoint of a JSON Lines output to resume it. None if the output cannot be
+    resumed: there is no checkpoint, the output file is missing, or the checkpointed commit is
+    not in the repository any more (e.g. after a force push). A checkpoint that is not resumed
+    is removed, it does not apply to the output written from scratch.
+    """
+    checkpoint = read_checkpoint(checkpoint_file)
+    if checkpoint is not None and (not os.path.exists(output_file) or not checkpoint["last_commit"] or subprocess.run(
+            ['git', 'cat-file', '-e', f'{checkpoint["last_commit"]}^{{commit}}'],
+            cwd=repository_path, capture_output=True).returncode != 0):
+        checkpoint = None
+    if checkpoint is None and os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+    return checkpoint
+
+def write_checkpoint(checkpoint_file, checkpoint):
+    # Written to a temporary file first, so the checkpoint is never half-written
+    with open(checkpoint_file + ".tmp", 'w') as file:
+        json.dump(checkpoint, file)
+    os.replace(checkpoint_file + ".tmp", checkpoint_file)
+
+def write_jsonl_records(records, output_file, compress=False, checkpoint_file=None, checkpoint_every=100, on_checkpoint=None,
+                        index=False):
+    """
+    Write records to a JSON Lines file one at a time, so memory use does not depend on
+    the number of records.
+
+    With a checkpoint file, the output is flushed every checkpoint_every records and its size
+    and last record hash are saved. If a checkpoint already exists, the output is first cut back
+    to the checkpointed size (dropping a partly written tail) and the records are appended.
+    Gzip output is written as one gzip member per checkpoint, so every checkpointed size is a
+    valid end of file.
+
+    Args:
+        records (iterable): The records to write.
+        output_file (str): Path to the output file.
+        compress (bool): Write a gzip-compressed file.
+        checkpoint_file (str, optional): Path to the checkpoint file.
+        checkpoint_every (int): Number of records between checkpoints.
+        on_checkpoint (callable, optional): Called before each checkpoint is saved, e.g. to
+            make data the records refer to durable first.
+        index (bool): Fill the offset index of record_index as the records are written, only
+            the records appended are added to it. Not for compressed output.
+
+    Returns:
+        int: The number of records written.
+    """
+    checkpoint = read_checkpoint(checkpoint_file) if checkpoint_file else None
+    if checkpoint is None:
+        checkpoint = {"last_commit": None, "records": 0, "offset": 0}
+    mode = 'r+b' if checkpoint["offset"] and os.path.exists(output_file) else 'wb'
+
+    count = 0
+    with open(output_file, mode) as raw_file:
+        raw_file.truncate(checkpoint["offset"] if mode == 'r+b' else 0)
+        raw_file.seek(0, os.SEEK_END)
+        file = gzip.GzipFile(fileobj=raw_file, mode='wb') if compress else raw_file
+        index_writer = IndexWriter(output_file, raw_file.tell()) if index and not compress else None
+
+        def save_checkpoint():
+            nonlocal file
+            if on_checkpoint:
+                on_checkpoint()
+            if compress:
+                file.close()  # Ends the gzip member, raw_file stays open
+            raw_file.flush()
+            os.fsync(raw_file.fileno())
+            checkpoint["offset"] = raw_file.tell()
+            if checkpoint_file:
+                write_checkpoint(checkpoint_file, checkpoint)
+            if index_writer:
+                index_writer.flush()
+            if compress:
+                file = gzip.GzipFile(fileobj=raw_file, mode='wb')
+
+        for record in records:
+            line = (json.dumps(record, default=str) + "\n").encode('utf-8')
+            if index_writer and record.get("hash"):
+                index_writer.add(record["hash"], str(record["date"]) if record.get("date") is not None else None,
+                                 raw_file.tell(), len(line))
+            file.write(line)
+            count += 1
+            checkpoint["records"] += 1
+            checkpoint["last_commit"] = record.get("hash", record.get("key"))
+            if checkpoint_file and count % checkpoint_every == 0:
+                save_checkpoint()
+
+        save_checkpoint()
+        if compress:
+            file.close()
+    if index_writer:
+        index_writer.close()
+    return count
+
+def get_unprocessed_commits(repository_path, checkpoint):
+    """
+    List the commits that still have to be written after a checkpoint, in traversal order.
+
+    pydriller traverses `git rev-list --reverse HEAD`, so when the checkpointed commit is still
+    at the checkpointed position, the rest of that list is exactly what is missing. Otherwise
+    (e.g. a rebased branch) every commit that is not an ancestor of the checkpointed commit is
+    returned. pydriller's own from_commit filter is not used because it follows --ancestry-path
+    and would drop commits from branches merged after the checkpoint.
+    """
+    result = subprocess.run(['git', 'rev-list', '--reverse', 'HEAD'], cwd=repository_path, capture_output=True, text=True, check=True)
+    commits = result.stdout.split()
+    position = checkpoint["records"]
+    if 0 < position <= len(commits) and commits[position - 1] == checkpoint["last_commit"]:
+        return commits[position:]
+
+    result = subprocess.run(['git', 'rev-list', '--reverse', 'HEAD', f'^{checkpoint["last_commit"]}'],
+                            cwd=repository_path, capture_output=True, text=True, check=True)
+    return result.stdout.split()
+
+def iter_diff_records(path, diff_store_dir=None):
+    """
+    Lazily iterate over the records of a diff analysis output file.
+
+    JSON Lines files (optionally gzip-compressed) are read one line at a time. A plain
+    diff_analysis.json has to be loaded whole.
+
+    Args:
+        path (str): Path to diff_analysis.json, diff_analysis.jsonl or diff_analysis.jsonl.gz.
+        diff_store_dir (str, optional): Diff store of the output, given to put the patch texts
+            back in place of their "diff_ref" references.
+    """
+    if diff_store_dir is not None:
+        with DiffStore(diff_store_dir, read_only=True) as store:
+            yield from load_record_diffs(iter_diff_records(path), store)
+        return
+
+    if path.endswith(".json"):
+        with open(path, 'r') as file:
+            yield from json.load(file)
+        return
+
+    with (gzip.open(path, 'rt', encoding='utf-8') if path.endswith(".gz") else open(path, 'r', encoding='utf-8')) as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+class DiffRecordConsumer:
+    """
+    Consumer for commit_walker.walk_commits that writes the diff analysis JSON Lines output
+    from the shared history pass, with the same records as the pydriller traversal.
+
+    The uncompressed output is checkpointed like write_jsonl_records does. With resume, an
+    output with a checkpoint is cut back to it and appended to, and pending_commits lists the
+    commits of HEAD that are not in the output yet, in traversal order: walk with
+    commits=pending_commits then, so only those are diffed. A commit written before the
+    crash is never written again, also when it came from a side branch that is no ancestor of
+    the checkpointed commit. pending_commits is None if there is nothing to resume (no
+    checkpoint, or its commit is not in repository_path any more, e.g. after a force push)
+    and the output is rewritten.
+    """
+
+    def __init__(self, project_output_dir, compress=False, diff_store=False, resume=False, repository_path=None,
+                 checkpoint_every=100):
+        output_file = os.path.join(project_output_dir, DIFF_OUTPUT_FILES[("jsonl", compress)])
+        self.output_file = output_file
+        self.checkpoint_file = None if compress else output_file + ".checkpoint.json"
+        self.checkpoint_every = checkpoint_every
+        checkpoint = None
+        # Resuming needs the repository to find the commits that are missing
+        if resume and repository_path is not None and self.checkpoint_file:
+            checkpoint = read_resumable_checkpoint(self.checkpoint_file, output_file, repository_path)
+        # A checkpoint that is not resumed no longer applies to the rewritten output
+        if checkpoint is None and os.path.exists(output_file + ".checkpoint.json"):
+            os.remove(output_file + ".checkpoint.json")
+        self.checkpoint = checkpoint or {"last_commit": None, "records": 0, "offset": 0}
+        self.pending_commits = None
+
+        self.index = None
+        if compress:
+            self.file = gzip.open(output_file, 'wb')
+        else:
+            self.file = open(output_file, 'r+b' if checkpoint else 'wb')
+            self.file.truncate(self.checkpoint["offset"])
+            self.file.seek(0, os.SEEK_END)
+            # The offset index is filled as the lines are written, see record_index
+            self.index = IndexWriter(output_file, self.checkpoint["offset"])
+            if checkpoint:
+                written = self.index.hashes()
+                result = subprocess.run(['git', 'rev-list', '--reverse', 'HEAD'], cwd=repository_path,
+                                        capture_output=True, text=True, check=True)
+                self.pending_commits = [commit_hash for commit_hash in result.stdout.split() if commit_hash not in written]
+        self.store = DiffStore(os.path.join(project_output_dir, "diff_store")) if diff_store else None
+
+    def consume(self, commit):
+        commit_info = {
+            "hash": commit["hash"],
+            "author": commit["author"],
+            "date": commit["date"],
+            "modified_files": []
+        }
+        # Like pydriller, merge commits have no modified files
+        if len(commit["parents"]) <= 1:
+            for modified_file in commit["files"]:
+                file_diff = {
+                    "filename": modified_file["new_path"].rsplit('/', 1)[-1],
+                    "added_lines": modified_file["added_lines"],
+                    "deleted_lines": modified_file["deleted_lines"]
+                }
+                if "diff" in modified_file:
+                    if self.store:
+                        file_diff["diff_ref"] = self.store.put(modified_file["diff"])
+                    else:
+                        file_diff["diff"] = modified_file["diff"]
+                commit_info["modified_files"].append(file_diff)
+        line = (json.dumps(commit_info, default=str) + "\n").encode('utf-8')
+        if self.index:
+            self.index.add(commit["hash"], str(commit["date"]), self.file.tell(), len(line))
+        self.file.write(line)
+        self.checkpoint["records"] += 1
+        self.checkpoint["last_commit"] = commit["hash"]
+        if self.checkpoint_file and self.checkpoint["records"] % self.checkpoint_every == 0:
+            self.save_checkpoint()
+
+    def save_checkpoint(self):
+        # The patches the records refer to are made durable first
+        if self.store:
+            self.store.flush()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.checkpoint["offset"] = self.file.tell()
+        write_checkpoint(self.checkpoint_file, self.checkpoint)
+        self.index.flush()
+
+    def finish(self):
+        if self.checkpoint_file:
+            self.save_checkpoint()
+        self.file.close()
+        if self.index:
+            self.index.close()
+        if self.store:
+            self.store.close()
+        print(f"Diff data saved to {self.output_file}")
+
+def calculate_and_collect_diff(repository_path, project_output_dir, repo_type="github", jira_base_url=None, project_key=None, auth_token=None,
+                               output_format="json", compress=False, resume=False, workers=1, backend="pydriller",
+                               diff_store=False):
     print("Calculating and collecting diff...")
     """
     Analyzes the diff changes between each commit and its previous commit in a Git or Jira repository,
@@ -16,78 +463,72 @@ def calculate_and_collect_diff(repository_path, project_output_dir, repo_type="g
         jira_base_url (str, optional): Base URL of the Jira instance (required for Jira repos).
         project_key (str, optional): Key of the Jira project (required for Jira repos).
         auth_token (str, optional): Authentication token for Jira API (required for Jira repos).
+        output_format (str): 'json' writes one indented list at the end, 'jsonl' streams one
+            record per line as the history is traversed.
+        compress (bool): Gzip the 'jsonl' output (diff_analysis.jsonl.gz).
+        resume (bool): Continue a 'jsonl' output from its checkpoint, only traversing the
+            commits that were not written yet (after a crash, or new commits since the last run).
+        workers (int): Number of processes computing the diffs of a Git repository in parallel.
+        backend (str): 'pydriller' records the full diff of every file, 'numstat' only records the
+            added/deleted line counts from one `git log --numstat` process (no "diff" field).
+        diff_store (bool): Store every distinct patch text once, compressed, in the diff_store
+            directory of the output and only keep its "diff_ref" in the records.
     """
-    diffs = []
+    if backend not in ("pydriller", "numstat"):
+        raise ValueError(f"Unknown diff backend: {backend}")
+    if (output_format, compress) not in DIFF_OUTPUT_FILES:
+        raise ValueError(f"Unsupported diff output: format={output_format}, compress={compress}")
 
-    if repo_type.lower() == "github":
-        # Use pydriller for GitHub repositories
-        for commit in Repository(repository_path).traverse_commits():
-            commit_info = {
-                "hash": commit.hash,
-                "author": commit.author.name,
-                "date": commit.committer_date,
-                "modified_files": []
-            }
-            
-            for modified_file in commit.modified_files:
-                # Capture file-level changes like lines added and removed
-                file_diff = {
-                    "filename": modified_file.filename,
-                    "added_lines": modified_file.added_lines,
-                    "deleted_lines": modified_file.deleted_lines,
-                    "diff": modified_file.diff  # Optional: Full diff string
-                }
-                commit_info["modified_files"].append(file_diff)
-            
-            diffs.append(commit_info)
+    output_file = os.path.join(project_output_dir, DIFF_OUTPUT_FILES[(output_format, compress)])
+    checkpoint_file = output_file + ".checkpoint.json"
+    checkpoint = None
+    if output_format == "jsonl" and repo_type.lower() == "github":
+        if resume:
+            checkpoint = read_resumable_checkpoint(checkpoint_file, output_file, repository_path)
+        elif os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
 
-    elif repo_type.lower() == "jira" and jira_base_url and project_key and auth_token:
-        # For Jira repositories, retrieve issue data with Jira API
-        url = f"{jira_base_url}/rest/api/2/search"
-        headers = {"Authorization": f"Bearer {auth_token}"}
-        params = {"jql": f"project={project_key}", "maxResults": 1000}  # Adjust as needed
-
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code == 200:
-            issues = response.json().get("issues", [])
-            for issue in issues:
-                issue_data = {
-                    "key": issue["key"],
-                    "summary": issue["fields"]["summary"],
-                    "status": issue["fields"]["status"]["name"],
-                    "created": issue["fields"]["created"],
-                    "updated": issue["fields"]["updated"],
-                    "changelog": []  # to store diff-like changes in the issue history
-                }
-                # Add change history for each issue
-                changelog_url = f"{jira_base_url}/rest/api/2/issue/{issue['key']}/changelog"
-                changelog_response = requests.get(changelog_url, headers=headers)
-                if changelog_response.status_code == 200:
-                    changelogs = changelog_response.json().get("values", [])
-                    for change in changelogs:
-                        change_data = {
-                            "author": change["author"]["displayName"],
-                            "date": change["created"],
-                            "items": []
-                        }
-                        for item in change["items"]:
-                            # Track status changes or other field modifications
-                            if item["field"] == "status":
-                                item_data = {
-                                    "field": item["field"],
-                                    "from": item["fromString"],
-                                    "to": item["toString"]
-                                }
-                                change_data["items"].append(item_data)
-                        issue_data["changelog"].append(change_data)
-
-                diffs.append(issue_data)
+    if repo_type.lower() == "github":
+        commits = None
+        if checkpoint is not None:
+            commits = get_unprocessed_commits(repository_path, checkpoint)
+            print(f"Resuming after {checkpoint['last_commit']}, {len(commits)} new commits")
+        if backend == "numstat":
+            # A single git process is already faster than the workers could merge shards
+            records = iter_numstat_records(repository_path, commits)
+        elif workers > 1:
+            if commits is None:
+                result = subprocess.run(['git', 'rev-list', '--reverse', 'HEAD'], cwd=repository_path, capture_output=True, text=True, check=True)
+                commits = result.stdout.split()
+            shard_dir = os.path.join(project_output_dir, "diff_shards")
+            records = iter_github_records_parallel(repository_path, commits, workers, shard_dir)
         else:
-            print("Failed to fetch issues from Jira:", response.status_code, response.text)
+            records = iter_github_records(repository_path, commits)
+    elif repo_type.lower() == "jira" and jira_base_url and project_key and auth_token:
+        records = iter_jira_records(jira_base_url, project_key, auth_token)
+    else:
+        records = iter(())
+
+    store = None
+    if diff_store:
+        store = DiffStore(os.path.join(project_output_dir, "diff_store"))
+        records = store_record_diffs(records, store)
 
     # Save the collected diffs to the specified output file
-    output_file = os.path.join(project_output_dir, 'diff_analysis.json')
-    with open(output_file, 'w') as file:
-        json.dump(diffs, file, indent=4, default=str)
+    try:
+        if output_format == "jsonl" and repo_type.lower() == "github":
+            write_jsonl_records(records, output_file, compress, checkpoint_file, on_checkpoint=store.flush if store else None,
+                                index=True)
+        elif output_format == "jsonl":
+            write_jsonl_records(records, output_file, compress)
+        else:
+            diffs = list(records)
+            with open(output_file, 'w') as file:
+                json.dump(diffs, file, indent=4, default=str)
+            # Offset index for record_index.RecordReader, the whole list is rewritten anyway
+            if repo_type.lower() == "github":
+                build_index(output_file)
+    finally:
+        if store:
+            store.close()
     print(f"Diff data saved to {output_file}")
-
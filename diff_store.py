@@ -0,0 +1,118 @@
+import hashlib
+import os
+import pathlib
+import sqlite3
+import zlib
+
+
+class DiffStore:
+    """
+    Content-addressed store for patch texts.
+
+    Every distinct patch is zlib-compressed and appended once to patches.pack, and
+    patches.sqlite maps its SHA-256 to the position in the pack. Identical patches from
+    cherry-picks, backports or reverts therefore take space only once, and single patches
+    can be loaded without reading anything else.
+
+    Opened with read_only, the store only loads patches: the pack is neither repaired nor
+    written, so reading while a writer appends patches it has not indexed yet is safe.
+    """
+
+    def __init__(self, store_dir, compression_level=6, read_only=False):
+        self.store_dir = store_dir
+        self.compression_level = compression_level
+        self.read_only = read_only
+        self.pending = {}
+        if read_only:
+            index_uri = pathlib.Path(os.path.abspath(os.path.join(store_dir, "patches.sqlite"))).as_uri()
+            self.connection = sqlite3.connect(f"{index_uri}?mode=ro", uri=True, timeout=60)
+            self.pack = open(os.path.join(store_dir, "patches.pack"), 'rb')
+            return
+        os.makedirs(store_dir, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(store_dir, "patches.sqlite"), timeout=60)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS patches (hash TEXT PRIMARY KEY, offset INTEGER NOT NULL, length INTEGER NOT NULL) WITHOUT ROWID")
+        self.connection.commit()
+        # Bytes after the last indexed patch belong to an interrupted run and are overwritten
+        end = self.connection.execute("SELECT MAX(offset + length) FROM patches").fetchone()[0] or 0
+        self.pack = open(os.path.join(store_dir, "patches.pack"), 'a+b')
+        self.pack.truncate(end)
+        self.pack.seek(0, os.SEEK_END)
+
+    def put(self, text):
+        """
+        Store a patch text if it is not stored yet and return its reference (SHA-256 hex digest).
+        """
+        if self.read_only:
+            raise ValueError(f"The diff store {self.store_dir} is opened read-only")
+        data = text.encode('utf-8', 'surrogatepass')
+        ref = hashlib.sha256(data).hexdigest()
+        if ref in self.pending or self.connection.execute("SELECT 1 FROM patches WHERE hash = ?", (ref,)).fetchone():
+            return ref
+        compressed = zlib.compress(data, self.compression_level)
+        self.pending[ref] = (self.pack.tell(), len(compressed))
+        self.pack.write(compressed)
+        return ref
+
+    def get(self, ref):
+        """
+        Load one patch text by its reference.
+        """
+        if ref in self.pending:
+            self.pack.flush()
+            offset, length = self.pending[ref]
+        else:
+            row = self.connection.execute("SELECT offset, length FROM patches WHERE hash = ?", (ref,)).fetchone()
+            if row is None:
+                raise KeyError(ref)
+            offset, length = row
+        if self.read_only:
+            self.pack.seek(offset)
+            return zlib.decompress(self.pack.read(length)).decode('utf-8', 'surrogatepass')
+        with open(os.path.join(self.store_dir, "patches.pack"), 'rb') as pack:
+            pack.seek(offset)
+            return zlib.decompress(pack.read(length)).decode('utf-8', 'surrogatepass')
+
+    def flush(self):
+        """
+        Make the patches stored so far durable, the pack is synced before the index refers to it.
+        """
+        self.pack.flush()
+        os.fsync(self.pack.fileno())
+        self.connection.executemany("INSERT OR IGNORE INTO patches (hash, offset, length) VALUES (?, ?, ?)",
+                                    [(ref, offset, length) for ref, (offset, length) in self.pending.items()])
+        self.connection.commit()
+        self.pending.clear()
+
+    def close(self):
+        if not self.read_only:
+            self.flush()
+        self.pack.close()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def store_record_diffs(records, store):
+    """
+    Replace the "diff" text of every modified file by a "diff_ref" into the store.
+    """
+    for record in records:
+        for modified_file in record.get("modified_files", []):
+            if "diff" in modified_file:
+                modified_file["diff_ref"] = store.put(modified_file.pop("diff"))
+        yield record
+
+def load_record_diffs(records, store):
+    """
+    Inverse of store_record_diffs: put the patch text back into every modified file.
+    """
+    for record in records:
+        for modified_file in record.get("modified_files", []):
+            if "diff_ref" in modified_file:
+                modified_file["diff"] = store.get(modified_file.pop("diff_ref"))
+        yield record
@@ -1,84 +1,350 @@
 import csv
 import os
+import re
 import subprocess
- 
-def get_loc_by_commit(commit_hash, project_dir):
+from loc_cache import open_loc_cache, get_blob_counts
+from commit_walker import COMMIT_MARKER, iter_log_entries, walk_commits
+from refactoring_miner import load_refactoring_types
+from instrumentation import report_progress
+
+# Fallback for when scc is not installed: a subset of the extensions (and well-known file
+# names) scc recognises. Files of languages missing here are left out of the LOC totals, so
+# the totals can be lower than scc's; with scc installed its own list is used instead.
+LANGUAGE_EXTENSIONS = {
+    ".java": "Java", ".kt": "Kotlin", ".kts": "Kotlin", ".scala": "Scala", ".groovy": "Groovy",
+    ".gradle": "Gradle", ".clj": "Clojure", ".c": "C", ".h": "C Header", ".cc": "C++",
+    ".cpp": "C++", ".cxx": "C++", ".hh": "C++ Header", ".hpp": "C++ Header", ".hxx": "C++ Header",
+    ".cs": "C#", ".go": "Go", ".rs": "Rust", ".py": "Python", ".rb": "Ruby", ".php": "PHP",
+    ".pl": "Perl", ".pm": "Perl", ".lua": "Lua", ".r": "R", ".swift": "Swift", ".m": "Objective C",
+    ".js": "JavaScript", ".jsx": "JSX", ".mjs": "JavaScript", ".ts": "TypeScript", ".tsx": "TypeScript",
+    ".vue": "Vue", ".html": "HTML", ".htm": "HTML", ".jsp": "JSP", ".css": "CSS", ".scss": "Sass",
+    ".less": "LESS", ".xml": "XML", ".xsd": "XML Schema", ".xsl": "XSLT", ".xslt": "XSLT",
+    ".json": "JSON", ".yml": "YAML", ".yaml": "YAML", ".toml": "TOML", ".properties": "Properties File",
+    ".ini": "INI", ".sql": "SQL", ".sh": "Shell", ".bash": "BASH", ".bat": "Batch", ".cmd": "Batch",
+    ".ps1": "Powershell", ".md": "Markdown", ".rst": "ReStructuredText", ".txt": "Plain Text",
+    ".tex": "TeX", ".proto": "Protocol Buffers", ".thrift": "Thrift", ".cmake": "CMake",
+    ".mk": "Makefile", ".dtd": "DTD", ".svg": "SVG", ".erl": "Erlang", ".ex": "Elixir", ".hs": "Haskell",
+    ".ml": "OCaml", ".fs": "F#", ".dart": "Dart", ".d": "D", ".pas": "Pascal", ".f90": "FORTRAN Modern",
+}
+LANGUAGE_FILENAMES = {
+    "Makefile": "Makefile", "makefile": "Makefile", "CMakeLists.txt": "CMake",
+    "Dockerfile": "Dockerfile", "Jenkinsfile": "Jenkins Buildfile", "Gemfile": "Ruby", "Rakefile": "Rakefile",
+}
+
+SCC_LANGUAGE_LINE = re.compile(r'^(.+) \(([^()]*)\)$')
+
+# Extension or file name (lowercase) -> language, from `scc --languages`, loaded once per process
+scc_languages = None
+
+
+def parse_scc_languages(output):
+    """
+    Parse the output of `scc --languages`, one "Name (ext1,ext2,filename,...)" line per language.
+
+    Returns:
+    - dict: Lowercase extension or file name -> language name. An extension of several
+      languages maps to the first one listed; scc would tell them apart by content, but only
+      whether a file counts at all matters for the totals.
+    """
+    languages = {}
+    for line in output.splitlines():
+        match = SCC_LANGUAGE_LINE.match(line.strip())
+        if not match:
+            continue
+        name, entries = match.groups()
+        for entry in entries.split(','):
+            if entry.strip():
+                languages.setdefault(entry.strip().lower(), name)
+    return languages
+
+def load_scc_languages():
+    """
+    The language list of the installed scc, or an empty dict if scc is not installed.
+    """
+    global scc_languages
+    if scc_languages is None:
+        try:
+            result = subprocess.run(['scc', '--languages'], capture_output=True, text=True)
+            scc_languages = parse_scc_languages(result.stdout) if result.returncode == 0 else {}
+        except FileNotFoundError:
+            scc_languages = {}
+        if not scc_languages:
+            print("scc not found, counting only the languages of effort_collector.LANGUAGE_EXTENSIONS")
+    return scc_languages
+
+def get_language(file_path):
+    """
+    Map a file path to the language scc would count it as.
+
+    Like scc, the lowercase file name is looked up first and then its extensions, the longest
+    first ("a.d.ts" tries "d.ts" before "ts"). Without scc the smaller built-in list is used.
+
+    Parameters:
+    - file_path (str): Path of the file inside the repository
+
+    Returns:
+    - str or None: The language name, or None if the file is not counted
+    """
+    filename = file_path.rsplit('/', 1)[-1]
+    languages = load_scc_languages()
+    if languages:
+        name = filename.lower()
+        if name in languages:
+            return languages[name]
+        parts = name.split('.')
+        for i in range(1, len(parts)):
+            language = languages.get('.'.join(parts[i:]))
+            if language is not None:
+                return language
+        return None
+    if filename in LANGUAGE_FILENAMES:
+        return LANGUAGE_FILENAMES[filename]
+    return LANGUAGE_EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+
+def get_loc_by_commit(commit_hash, project_dir, cache=None):
     """
     Get the total LOC for a specific commit using the scc tool, filtering by programming languages.
- 
+
+    The tree of the commit is listed with `git ls-tree`, so nothing is checked out, and only
+    blobs missing from the LOC cache are counted by scc.
+
     Parameters:
     - commit_hash (str): The commit hash to analyze
     - project_dir (str): Path to the project directory
-    - languages (list): List of programming languages to include in the analysis
- 
+    - cache (sqlite3.Connection, optional): Open LOC cache, a default one is opened if not given
+
     Returns:
     - int: The total LOC for the commit
     """
-    # Checkout the commit
-    subprocess.run(['git', 'checkout', commit_hash], cwd=project_dir, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    # git checkout commit_hash
- 
-    # Run the scc tool
-    result = subprocess.run(['scc', '--no-cocomo', '--no-complexity'], cwd=project_dir, capture_output=True, text=True)
-   
+    result = subprocess.run(['git', 'ls-tree', '-r', '-z', commit_hash], cwd=project_dir, capture_output=True, text=True)
     if result.returncode != 0:
-        raise RuntimeError(f"scc tool failed: {result.stderr}")
- 
-    # Parse the LOC data
-    loc_total = 0
-    for line in result.stdout.splitlines():
-        parts = line.split()
-        if len(parts) != 6:
+        raise RuntimeError(f"Git ls-tree command failed: {result.stderr}")
+
+    blobs = {}
+    for entry in result.stdout.split('\0'):
+        if not entry:
             continue
-       
-        if parts[0] == "Total":
-            loc_total += int(parts[2])
-            break
- 
-    return loc_total
- 
-def collect_developers_effort(project_dir, output_dir):
+        info, file_path = entry.split('\t', 1)
+        _, object_type, blob_sha = info.split()
+        language = get_language(file_path)
+        if object_type == 'blob' and language is not None:
+            blobs[(blob_sha, language)] = file_path
+
+    connection = cache if cache is not None else open_loc_cache()
+    try:
+        counts = get_blob_counts(connection, project_dir, blobs)
+    finally:
+        if cache is None:
+            connection.close()
+
+    # Same number as the "Lines" column of the scc total: code, comments and blanks
+    return sum(sum(counts[key]) for key in blobs)
+
+def iter_commit_loc_deltas(project_dir):
+    """
+    Stream the LOC change of every commit against its first parent, parents before children.
+
+    A single `git log -z --numstat` process is used, so no commit is checked out and the cost
+    grows with the number of changed lines instead of the size of the tree.
+
+    Parameters:
+    - project_dir (str): Path to the cloned project directory
+
+    Yields:
+    - tuple: (commit_hash, first_parent_hash or None, loc_delta)
+    """
+    command = ['git', 'log', '-z', '--reverse', '--topo-order', '--diff-merges=first-parent', '--no-renames',
+               '--numstat', f'--format={COMMIT_MARKER}%H%x00%P%x00']
+    process = subprocess.Popen(command, cwd=project_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    for (commit_hash, parents), files, _ in iter_log_entries(process.stdout, 2):
+        # Binary files have no line counts
+        loc_delta = sum(added - deleted for added, deleted, _, new_path in files
+                        if added is not None and get_language(new_path) is not None)
+        yield commit_hash, parents.split()[0] if parents else None, loc_delta
+
+    stderr = process.stderr.read().decode('utf-8', 'replace')
+    if process.wait() != 0:
+        raise RuntimeError(f"Git log command failed: {stderr}")
+
+
+def get_loc_by_commits(project_dir):
+    """
+    Get the total LOC of every commit by keeping a running total over the per-commit LOC changes.
+
+    Parameters:
+    - project_dir (str): Path to the cloned project directory
+
+    Returns:
+    - dict: commit hash -> total LOC for the commit
+    """
+    loc_totals = {}
+    for commit_hash, parent_hash, loc_delta in iter_commit_loc_deltas(project_dir):
+        loc_totals[commit_hash] = loc_totals.get(parent_hash, 0) + loc_delta
+    return loc_totals
+
+class EffortConsumer:
+    """
+    Consumer for commit_walker.walk_commits that writes 'developers-effort.csv' from the
+    shared history pass. The walker detects renames, a renamed file is counted under the
+    language of its new name.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.commits = []
+        self.loc_changes = {}
+
+    def consume(self, commit):
+        loc_delta = 0
+        for modified_file in commit["files"]:
+            if not modified_file["binary"] and get_language(modified_file["new_path"]) is not None:
+                loc_delta += modified_file["added_lines"] - modified_file["deleted_lines"]
+        first_parent = commit["parents"][0] if commit["parents"] else None
+        self.commits.append(commit["hash"])
+        self.loc_changes[commit["hash"]] = (first_parent, loc_delta)
+
+    def finish(self):
+        # Commits come in traversal order, not strictly parents first, so the running totals
+        # are resolved along the first-parent chains here
+        loc_totals = {}
+        for commit_hash in self.commits:
+            chain = []
+            while commit_hash is not None and commit_hash not in loc_totals and commit_hash in self.loc_changes:
+                chain.append(commit_hash)
+                commit_hash = self.loc_changes[commit_hash][0]
+            total = loc_totals.get(commit_hash, 0)
+            for chained_hash in reversed(chain):
+                total += self.loc_changes[chained_hash][1]
+                loc_totals[chained_hash] = total
+
+        # `git log` order, newest first, like collect_developers_effort
+        commits = self.commits[::-1]
+        effort_data = [["refactoring_hash", "previous_hash", "TLOC"]]
+        for i in range(1, len(commits)):
+            effort_data.append([commits[i], commits[i - 1], abs(loc_totals[commits[i]] - loc_totals[commits[i - 1]])])
+
+        with open(os.path.join(self.output_dir, 'developers-effort.csv'), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerows(effort_data)
+
+class RefactoringEffortConsumer:
+    """
+    Consumer for commit_walker.walk_commits that joins the walked commits with the refactoring
+    commits of a RefactoringMiner output by hash.
+
+    For every refactoring commit the touched lines of code (added plus deleted lines of source
+    files) are attributed to its author, resolved through .mailmap, and to each refactoring
+    type found in it. Writes:
+    - 'refactoring-commits-effort.csv': one row per refactoring commit, written as it is walked
+    - 'developers-refactoring-effort.csv': per developer and refactoring type the number of
+      refactorings, the number of commits and the touched lines of those commits
+    Memory is bounded by the number of refactoring commits plus developers times types.
+    """
+
+    def __init__(self, output_dir, refactoring_types):
+        self.output_dir = output_dir
+        self.refactoring_types = refactoring_types
+        self.effort = {}
+        self.file = open(os.path.join(output_dir, 'refactoring-commits-effort.csv'), 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(["refactoring_hash", "developer", "email", "refactoring_types", "TLOC"])
+
+    def consume(self, commit):
+        types = self.refactoring_types.get(commit["hash"])
+        if types is None:
+            return
+        tloc = 0
+        for modified_file in commit["files"]:
+            if not modified_file["binary"] and get_language(modified_file["new_path"]) is not None:
+                tloc += modified_file["added_lines"] + modified_file["deleted_lines"]
+        developer = (commit["mailmap_author"], commit["mailmap_email"])
+        self.writer.writerow([commit["hash"], *developer, ";".join(sorted(types)), tloc])
+        for refactoring_type, count in types.items():
+            effort = self.effort.setdefault((developer, refactoring_type), [0, 0, 0])
+            effort[0] += count
+            effort[1] += 1
+            effort[2] += tloc
+
+    def finish(self):
+        self.file.close()
+        with open(os.path.join(self.output_dir, 'developers-refactoring-effort.csv'), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["developer", "email", "refactoring_type", "refactorings", "commits", "TLOC"])
+            for ((name, email), refactoring_type), effort in sorted(self.effort.items()):
+                writer.writerow([name, email, refactoring_type, *effort])
+
+def collect_refactoring_effort(project_dir, output_dir, rminer_output=None):
+    """
+    Collect the touched lines of code (TLOCs) per developer and refactoring type, in one
+    history pass joined with the RefactoringMiner output, see RefactoringEffortConsumer.
+
+    Parameters:
+    - project_dir (str): Path to the repository (a bare mirror works)
+    - output_dir (str): Path to the output directory for this repository
+    - rminer_output (str, optional): The RefactoringMiner output, rminer_output.zip in output_dir by default
+    """
+    refactoring_types = load_refactoring_types(rminer_output or os.path.join(output_dir, "rminer_output.zip"))
+    walk_commits(project_dir, [RefactoringEffortConsumer(output_dir, refactoring_types)])
+
+def collect_developers_effort(project_dir, output_dir, engine="numstat"):
     print("Collecting developers' effort...")
     """
     Collect the total count of touched lines of code (TLOCs) for each refactoring and each developer.
- 
+
     Parameters:
     - project_dir (str): Path to the cloned project directory
     - output_dir (str): Path to the output directory for this repository
- 
+    - engine (str): "numstat" keeps a running LOC total from one `git log --numstat` pass,
+      "scc" counts the full tree of every commit with scc, through the blob LOC cache
+
     Output:
-    - Saves a CSV file named 'developers-effort.csv' in the output directory
+    - Saves a CSV file named 'developers-effort.csv' in the output directory. The effort per
+      developer and refactoring type is collected by collect_refactoring_effort.
     """
-    # TODO: Implement developer effort collection logic
-    # 1. Use subprocess to run scc tool
-    # 2. Calculate TLOCs for each commit
-    # 3. Aggregate data per developer and refactoring type
- 
+
     # Get all commit hashes
     result = subprocess.run(['git', 'log', '--format=%H'], cwd=project_dir, capture_output=True, text=True)
     if result.returncode != 0:
         raise RuntimeError(f"Git log command failed: {result.stderr}")
- 
+
     commits = result.stdout.splitlines()
- 
+
     effort_data = [["refactoring_hash", "previous_hash", "TLOC"]]
- 
-    for i in range(1, len(commits)):
-        # Count progress:
-        print((i / len(commits)) * 100)
-        
-        refactoring_commit = commits[i]
-        previous_commit = commits[i - 1]
- 
-        try:
-            loc_refactoring = get_loc_by_commit(refactoring_commit, project_dir)
-            loc_previous = get_loc_by_commit(previous_commit, project_dir)
-            tloc = abs(loc_refactoring - loc_previous)
- 
+
+    if engine == "numstat":
+        loc_totals = get_loc_by_commits(project_dir)
+        for i in range(1, len(commits)):
+            refactoring_commit = commits[i]
+            previous_commit = commits[i - 1]
+            tloc = abs(loc_totals[refactoring_commit] - loc_totals[previous_commit])
             effort_data.append([refactoring_commit, previous_commit, tloc])
-        except Exception as e:
-            print(f"Error processing commits {refactoring_commit} -> {previous_commit}: {e}")
- 
+
+    elif engine == "scc":
+        cache = open_loc_cache()
+        loc_previous = None
+        for i in range(1, len(commits)):
+            report_progress("Counting LOC", i, len(commits) - 1)
+
+            refactoring_commit = commits[i]
+            previous_commit = commits[i - 1]
+
+            try:
+                if loc_previous is None:
+                    loc_previous = get_loc_by_commit(previous_commit, project_dir, cache)
+                loc_refactoring = get_loc_by_commit(refactoring_commit, project_dir, cache)
+                tloc = abs(loc_refactoring - loc_previous)
+
+                effort_data.append([refactoring_commit, previous_commit, tloc])
+                loc_previous = loc_refactoring
+            except Exception as e:
+                print(f"Error processing commits {refactoring_commit} -> {previous_commit}: {e}")
+                loc_previous = None
+        cache.close()
+
+    else:
+        raise ValueError(f"Unknown effort engine: {engine}")
+
     with open(os.path.join(output_dir, 'developers-effort.csv'), 'w', newline='') as f:
         writer = csv.writer(f)
-        writer.writerows(effort_data) 
+        writer.writerows(effort_data)
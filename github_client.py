@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import requests
+from http_client import get_client
+
+GITHUB_API_URL = "https://api.github.com"
+DEFAULT_CACHE_DIR = "http_cache"
+
+
+class GitHubClient:
+    """
+    GitHub REST client that follows `Link` pagination and caches responses on disk.
+
+    Every response is stored under a key derived from its URL, together with its ETag and
+    Last-Modified headers. Later requests for the same URL are sent as conditional requests
+    (If-None-Match / If-Modified-Since), a 304 answer is served from the cache and does not
+    count against the rate limit. Requests go through the shared HttpClient, which paces them
+    by the X-RateLimit-* headers and retries refused or failed ones.
+    """
+
+    def __init__(self, token=None, cache_dir=DEFAULT_CACHE_DIR, api_url=GITHUB_API_URL, session=None, timeout=30):
+        self.api_url = api_url.rstrip('/')
+        self.cache_dir = cache_dir
+        self.session = session or get_client()
+        self.timeout = timeout
+        self.headers = {"Accept": "application/vnd.github.v3+json"}
+        token = token or os.environ.get("GITHUB_TOKEN")
+        if token:
+            self.headers["Authorization"] = f"token {token}"
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def cache_path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode('utf-8')).hexdigest() + ".json")
+
+    def read_cache(self, url):
+        if not self.cache_dir or not os.path.exists(self.cache_path(url)):
+            return None
+        with open(self.cache_path(url), 'r') as f:
+            return json.load(f)
+
+    def write_cache(self, url, entry):
+        if not self.cache_dir:
+            return
+        path = self.cache_path(url)
+        with open(path + ".tmp", 'w') as f:
+            json.dump(entry, f)
+        os.replace(path + ".tmp", path)
+
+    def get(self, url, params=None):
+        """
+        GET one URL (absolute, or relative to the API root) through the cache.
+
+        Returns:
+        - tuple: (decoded JSON body, link header dict as in requests' Response.links)
+
+        Raises:
+        - requests.HTTPError: For error responses
+        """
+        if not url.startswith("http"):
+            url = f"{self.api_url}/{url.lstrip('/')}"
+        if params:
+            url = requests.Request('GET', url, params=params).prepare().url
+
+        cached = self.read_cache(url)
+        headers = dict(self.headers)
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+
+        if response.status_code == 304 and cached:
+            return cached["body"], cached["links"]
+        response.raise_for_status()
+
+        body = response.json()
+        self.write_cache(url, {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "links": response.links,
+            "body": body
+        })
+        return body, response.links
+
+    def get_paginated(self, url, params=None, per_page=100):
+        """
+        Yield the items of every page of a list endpoint, following the `Link: rel="next"` header.
+        """
+        params = dict(params or {})
+        params.setdefault("per_page", per_page)
+        body, links = self.get(url, params)
+        while True:
+            yield from body
+            next_url = links.get("next", {}).get("url")
+            if not next_url:
+                break
+            body, links = self.get(next_url)
@@ -0,0 +1,193 @@
+import random
+import threading
+import time
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+import instrumentation
+
+# Requests per second and burst size per host, before the servers tell us otherwise.
+# github.com (the web pages link_machine checks) publishes no limit and sends no rate limit
+# headers, 5/s is a polite default for crawlers sharing this client; link_machine sets its
+# own rate with --rate-limit.
+DEFAULT_RATE_LIMITS = {
+    "api.github.com": (10.0, 10),
+    "github.com": (5.0, 5),
+    "issues.apache.org": (8.0, 8),
+}
+DEFAULT_RATE_LIMIT = (10.0, 10)
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Token bucket limiting the request rate to one host. Thread-safe.
+
+    The rate follows the X-RateLimit-* headers of the host: once less than a fifth of the
+    quota is left, the remaining requests are spread evenly until the reset time, and when
+    nothing is left (or the host sends Retry-After) the bucket blocks until then.
+    """
+
+    def __init__(self, rate, capacity):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.paced_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now >= self.paced_until:
+                    self.rate = self.max_rate
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def block_for(self, seconds):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers):
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        remaining = int(remaining)
+        limit = int(headers.get("X-RateLimit-Limit", 0))
+        seconds_to_reset = max(float(reset) - time.time(), 1.0)
+        with self.lock:
+            if remaining <= 0:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + seconds_to_reset + 1)
+                self.rate = self.max_rate
+            elif limit and remaining > limit / 5:
+                self.rate = self.max_rate
+            else:
+                self.rate = min(self.max_rate, remaining / seconds_to_reset)
+                self.paced_until = time.monotonic() + seconds_to_reset
+
+
+class HttpClient:
+    """
+    Shared HTTP client: keep-alive connection pooling, a token bucket per host, exponential
+    backoff with jitter on 429/5xx and connection errors, and request counters.
+    """
+
+    def __init__(self, pool_size=32, max_retries=5, backoff_base=1.0, max_backoff=120.0, rate_limits=None, timeout=30):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = "Mozilla/5.0"
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.rate_limits = dict(DEFAULT_RATE_LIMITS, **(rate_limits or {}))
+        self.timeout = timeout
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "errors": 0, "latency_total": 0.0, "latency_max": 0.0,
+                      "by_status": {}, "by_host": {}}
+
+    def get_bucket(self, host):
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(*self.rate_limits.get(host, DEFAULT_RATE_LIMIT))
+            return self.buckets[host]
+
+    def record(self, host, status, latency):
+        instrumentation.count("http_requests")
+        instrumentation.count("http_seconds", latency)
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["latency_total"] += latency
+            self.stats["latency_max"] = max(self.stats["latency_max"], latency)
+            self.stats["by_status"][status] = self.stats["by_status"].get(status, 0) + 1
+            self.stats["by_host"][host] = self.stats["by_host"].get(host, 0) + 1
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats, by_status=dict(self.stats["by_status"]), by_host=dict(self.stats["by_host"]))
+        stats["latency_average"] = stats["latency_total"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+    def backoff_delay(self, attempt, response=None):
+        if response is not None and response.headers.get("Retry-After"):
+            try:
+                return float(response.headers["Retry-After"])
+            except ValueError:
+                pass  # An HTTP date, use the normal backoff
+        return min(self.backoff_base * 2 ** attempt, self.max_backoff) * random.uniform(0.5, 1.0)
+
+    def request(self, method, url, **kwargs):
+        """
+        Send a request through the pool, rate limiter and retry logic.
+        Returns the requests.Response of the last attempt; connection errors are raised after the last retry.
+        """
+        host = urlparse(url).hostname
+        bucket = self.get_bucket(host)
+        kwargs.setdefault("timeout", self.timeout)
+
+        for attempt in range(self.max_retries + 1):
+            bucket.acquire()
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.record(host, "error", time.perf_counter() - start)
+                with self.lock:
+                    self.stats["errors"] += 1
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff_delay(attempt))
+                instrumentation.count("http_retries")
+                with self.lock:
+                    self.stats["retries"] += 1
+                continue
+
+            self.record(host, response.status_code, time.perf_counter() - start)
+            bucket.update_from_headers(response.headers)
+            # GitHub answers 403 instead of 429 when the rate limit is used up
+            rate_limited = response.status_code == 403 and (
+                response.headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in response.headers)
+            if (response.status_code not in RETRY_STATUS_CODES and not rate_limited) or attempt == self.max_retries:
+                return response
+
+            delay = self.backoff_delay(attempt, response)
+            if rate_limited or response.status_code == 429:
+                bucket.block_for(delay)
+            else:
+                time.sleep(delay)
+            instrumentation.count("http_retries")
+            with self.lock:
+                self.stats["retries"] += 1
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+
+default_client = None
+
+def get_client():
+    """
+    The HTTP client shared by all modules of this process.
+    """
+    global default_client
+    if default_client is None:
+        default_client = HttpClient()
+    return default_client
@@ -0,0 +1,173 @@
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+try:
+    import resource
+except ImportError:  # Windows, no CPU time of subprocesses
+    resource = None
+from repo_cache import get_directory_size
+
+METRICS_FILE = "metrics.jsonl"
+# Set to 1 to write a cProfile dump of every measured stage to <output_dir>/profiles
+PROFILE_ENV = "MINER_PROFILE"
+
+lock = threading.Lock()
+active_stages = []
+hook_installed = False
+# Only one cProfile profiler can be enabled at a time, the one of the outermost profiled stage
+profiling = False
+
+
+def count(name, amount=1):
+    """
+    Add to a counter of every stage being measured, e.g. count("http_requests").
+    Does nothing outside a measured stage. Thread-safe.
+    """
+    if not active_stages:
+        return
+    with lock:
+        for entry in active_stages:
+            entry["counters"][name] = entry["counters"].get(name, 0) + amount
+
+def audit_hook(event, args):
+    # Counts every subprocess started by this process, per program (git, scc, RefactoringMiner, ...)
+    if event != "subprocess.Popen" or not active_stages:
+        return
+    try:
+        executable, arguments = args[0], args[1]
+        if isinstance(arguments, (list, tuple)) and arguments:
+            program = arguments[0]
+        elif isinstance(arguments, (str, bytes)):
+            program = arguments.split()[0] if arguments.split() else executable
+        else:
+            program = executable
+        program = os.path.basename(os.fsdecode(program))
+        count("subprocesses")
+        count(f"subprocess.{program}")
+    except Exception:
+        pass  # An audit hook must never break the call it observes
+
+def install_audit_hook():
+    # Audit hooks cannot be removed, so there is one per process and it only counts while a stage is measured
+    global hook_installed
+    with lock:
+        if not hook_installed:
+            sys.addaudithook(audit_hook)
+            hook_installed = True
+
+def reset_peak_rss():
+    # Linux only: resets VmHWM of the process, so the peak of the next stage is its own
+    try:
+        with open("/proc/self/clear_refs", 'w') as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def read_peak_rss_mb():
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    # Peak of the whole process; kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+def children_cpu_seconds():
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def write_metrics(output_dir, entry):
+    with lock:
+        with open(os.path.join(output_dir, METRICS_FILE), 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+
+@contextmanager
+def measure_stage(name, output_dir, repo=None, profile=None):
+    """
+    Measure one stage of the pipeline and append its metrics to <output_dir>/metrics.jsonl.
+
+    Recorded per stage: wall time, CPU time (including the subprocesses waited for), peak
+    RSS, the bytes the output directory grew by, subprocess launches per program and any
+    counters added with count() during the stage (the HTTP client counts its requests and
+    their latency). Stages can be nested; counters and peak RSS then also go to the outer
+    stages. A failing stage is recorded with its error.
+
+    Parameters:
+    - name (str): Name of the stage
+    - output_dir (str): Output directory of the repository
+    - repo (str, optional): Name of the repository, the output directory's name by default
+    - profile (bool, optional): Write a cProfile dump to <output_dir>/profiles/<name>.prof,
+      by default if the MINER_PROFILE environment variable is set to 1. Profilers cannot be
+      nested, so a stage inside a profiled stage is only in the profile of the outer one
+    """
+    global profiling
+    install_audit_hook()
+    if profile is None:
+        profile = os.environ.get(PROFILE_ENV) == "1"
+    entry = {"repo": repo or os.path.basename(os.path.normpath(output_dir)), "stage": name,
+             "started_at": time.time(), "counters": {}}
+    output_size = get_directory_size(output_dir)
+    peak_rss = read_peak_rss_mb()
+    # The peak of the outer stages so far is kept before the process peak is reset
+    for outer in active_stages:
+        outer["peak_rss_mb"] = max(outer["peak_rss_mb"] or 0, peak_rss or 0)
+    reset_peak_rss()
+    entry["peak_rss_mb"] = 0
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    children_start = children_cpu_seconds()
+    profiler = None
+    with lock:
+        active_stages.append(entry)
+        if profile and not profiling:
+            profiler = cProfile.Profile()
+            profiling = True
+    if profiler:
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ refuses a second profiling tool, e.g. when run under python -m cProfile
+            print(f"Not profiling stage {name}, another profiler is active")
+            profiler = None
+            profiling = False
+
+    error = None
+    try:
+        yield entry
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+            profiling = False
+            os.makedirs(os.path.join(output_dir, "profiles"), exist_ok=True)
+            profiler.dump_stats(os.path.join(output_dir, "profiles", f"{name}.prof"))
+        with lock:
+            active_stages.remove(entry)
+        entry["wall_seconds"] = time.perf_counter() - start
+        entry["cpu_seconds"] = time.process_time() - cpu_start + children_cpu_seconds() - children_start
+        entry["peak_rss_mb"] = max(entry["peak_rss_mb"], read_peak_rss_mb() or 0)
+        for outer in active_stages:
+            outer["peak_rss_mb"] = max(outer["peak_rss_mb"] or 0, entry["peak_rss_mb"])
+        entry["output_bytes"] = get_directory_size(output_dir) - output_size
+        entry["error"] = str(error) if error is not None else None
+        write_metrics(output_dir, entry)
+
+def report_progress(label, done, total, step=10):
+    """
+    Print the progress of a loop only when it passes the next `step` percent.
+    """
+    if total and done * 100 // total // step != (done - 1) * 100 // total // step:
+        print(f"{label}: {done * 100 // total}% ({done}/{total})")
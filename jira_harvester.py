@@ -0,0 +1,99 @@
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http_client import get_client
+
+APACHE_JIRA_URL = "https://issues.apache.org/jira"
+
+
+def fetch_search_page(session, base_url, params, headers=None, timeout=60):
+    response = session.get(f"{base_url}/rest/api/2/search", params=params, headers=headers, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+def fetch_full_changelog(session, base_url, issue_key, headers=None, timeout=60):
+    """
+    Fetch all changelog histories of one issue, for the rare issues whose inline changelog was cut off.
+    """
+    histories = []
+    start_at = 0
+    while True:
+        response = session.get(f"{base_url}/rest/api/2/issue/{issue_key}/changelog",
+                               params={"startAt": start_at, "maxResults": 100}, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        page = response.json()
+        values = page.get("values", [])
+        histories.extend(values)
+        start_at += len(values)
+        if not values or page.get("isLast", True) or start_at >= page.get("total", 0):
+            return histories
+
+def iter_jira_issues(base_url, jql, page_size=100, max_workers=8, expand="changelog", fields=None, headers=None, session=None):
+    """
+    Yield every issue matching a JQL query, fetching the search pages concurrently.
+
+    The first page gives the total, the remaining pages are fetched by a thread pool with at
+    most max_workers requests in flight. Pages are yielded in order as soon as they arrive, so
+    the output is deterministic and only a few pages are held in memory. With
+    expand="changelog" the histories come inline with the search results instead of one
+    extra request per issue.
+
+    Parameters:
+    - base_url (str): Base URL of the Jira instance, e.g. https://issues.apache.org/jira
+    - jql (str): The search query
+    - page_size (int): Requested issues per page, Jira may lower it
+    - max_workers (int): Maximum number of concurrent requests
+    - expand (str, optional): Jira expand parameter
+    - fields (list, optional): Issue fields to return, all by default
+    - headers (dict, optional): Extra request headers, e.g. authorization
+    - session (HttpClient or requests.Session, optional): Client to use, the shared HttpClient by default
+    """
+    base_url = base_url.rstrip('/')
+    session = session or get_client()
+    params = {"jql": jql, "startAt": 0, "maxResults": page_size}
+    if expand:
+        params["expand"] = expand
+    if fields:
+        params["fields"] = ",".join(fields)
+
+    def complete(page):
+        for issue in page.get("issues", []):
+            changelog = issue.get("changelog")
+            if changelog and changelog.get("total", 0) > len(changelog.get("histories", [])):
+                changelog["histories"] = fetch_full_changelog(session, base_url, issue["key"], headers)
+        return page
+
+    first_page = complete(fetch_search_page(session, base_url, params, headers))
+    yield from first_page.get("issues", [])
+
+    # The server decides the real page size
+    page_size = first_page.get("maxResults") or page_size
+    total = first_page.get("total", 0)
+    offsets = deque(range(len(first_page.get("issues", [])), total, page_size))
+    if not first_page.get("issues"):
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = deque()
+        while offsets or in_flight:
+            while offsets and len(in_flight) < max_workers:
+                page_params = dict(params, startAt=offsets.popleft(), maxResults=page_size)
+                in_flight.append(executor.submit(lambda p: complete(fetch_search_page(session, base_url, p, headers)), page_params))
+            yield from in_flight.popleft().result().get("issues", [])
+
+def harvest_jira_issues(base_url, jql, output_file, **kwargs):
+    """
+    Write every issue matching a JQL query to a JSON Lines file as the pages arrive.
+    Takes the same keyword arguments as iter_jira_issues.
+
+    Returns:
+    - int: The number of issues written
+    """
+    count = 0
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        for issue in iter_jira_issues(base_url, jql, **kwargs):
+            f.write(json.dumps(issue) + "\n")
+            count += 1
+    return count
@@ -0,0 +1,123 @@
+import codecs
+import json
+import re
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def iter_json_array(f, key, chunk_size=DEFAULT_CHUNK_SIZE, on_chunk=None, offsets=False):
+    """
+    Yield the items of the array stored under a top-level key of a JSON object, or of a
+    top-level array, one at a time.
+
+    The file is read in chunks and every item is decoded with json.JSONDecoder.raw_decode as
+    soon as it is complete, so memory holds one item and one chunk, not the whole document.
+    The other top-level values are decoded and dropped. The whole file is read to the end even
+    if the caller stops early, as long as the generator is exhausted or closed.
+
+    Parameters:
+    - f (file): The JSON file, opened in binary mode
+    - key (str): Top-level key of the array, e.g. "commits", None if the document is the array
+    - chunk_size (int): Bytes read at a time
+    - on_chunk (callable, optional): Called with every raw chunk read, e.g. to compress the
+      file in the same pass
+    - offsets (bool): Yield (item, start, end) with the byte span of every item in the file.
+      The file is then decoded as Latin-1 to keep positions in bytes, so non-ASCII characters
+      of the items come out as their UTF-8 bytes; decode the span again for the exact item
+
+    Raises:
+    - ValueError: If the document is not an object or the JSON is malformed or truncated
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('latin-1' if offsets else 'utf-8')()
+    buffer = ''
+    pos = 0
+    eof = False
+    # Characters dropped from the front of the buffer, and the span of the last value
+    dropped = 0
+    span = None
+
+    def fill():
+        nonlocal buffer, pos, eof, dropped
+        # Read at least as much as is buffered, so an item larger than a chunk is decoded in
+        # a number of attempts logarithmic in its size
+        raw = f.read(max(chunk_size, len(buffer) - pos))
+        if raw and on_chunk is not None:
+            on_chunk(raw)
+        buffer = buffer[pos:] + text_decoder.decode(raw, final=not raw)
+        dropped += pos
+        pos = 0
+        eof = not raw
+
+    def peek():
+        nonlocal pos
+        while True:
+            pos = WHITESPACE.match(buffer, pos).end()
+            if pos < len(buffer):
+                return buffer[pos]
+            if eof:
+                raise ValueError("Unexpected end of JSON document")
+            fill()
+
+    def expect(char):
+        nonlocal pos
+        if peek() != char:
+            raise ValueError(f"Expected {char!r} in JSON document, found {buffer[pos]!r}")
+        pos += 1
+
+    def value():
+        nonlocal pos, span
+        peek()
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(buffer) or eof:
+                    span = (dropped + pos, dropped + end)
+                    pos = end
+                    return item
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError("Malformed or truncated JSON document")
+            fill()
+
+    def items():
+        nonlocal pos
+        expect('[')
+        if peek() == ']':
+            pos += 1
+            return
+        while True:
+            item = value()
+            yield (item, *span) if offsets else item
+            if peek() == ',':
+                pos += 1
+            else:
+                expect(']')
+                return
+
+    try:
+        if key is None:
+            yield from items()
+            return
+        expect('{')
+        if peek() == '}':
+            return
+        while True:
+            name = value()
+            expect(':')
+            if name == key:
+                yield from items()
+            else:
+                value()
+            if peek() == ',':
+                pos += 1
+            else:
+                expect('}')
+                break
+    finally:
+        # Read the rest so on_chunk sees the whole file, also after an error
+        while not eof:
+            fill()
+            buffer, pos = '', 0
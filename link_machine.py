@@ -1,9 +1,26 @@
+import argparse
 import csv
-import urllib.request
-import urllib.error
+import io
+import os
+import re
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 import sys
-from time import sleep
+import requests
+from http_client import HttpClient, get_client
+
+LINK_CACHE_PATH = "link_cache.sqlite"
+LINK_CACHE_TTL = 7 * 24 * 3600  # Seconds a checked link is trusted
+# HEAD requests per second to github.com. It publishes no limit for its web pages, and
+# answers too many requests with 429 and Retry-After, which the client backs off on. At a
+# typical ~0.3 s per check this keeps 16 workers busy, while the shared client's default of
+# 5/s would make more than two workers pointless.
+LINK_RATE_LIMIT = 40.0
+
+CSV_BLOCK_SIZE = 16 * 1024 * 1024
 
 def print_progress(current, total, prefix='Progress:', suffix='Complete', length=50):
     """Simple progress bar"""
@@ -14,102 +31,288 @@ def print_progress(current, total, prefix='Progress:', suffix='Complete', length
     if current == total:
         print()
 
-def process_github_links(input_file: str, chunk_size: int = 1000) -> None:
+def open_link_cache(cache_path: str = LINK_CACHE_PATH) -> sqlite3.Connection:
+    """
+    Open (and create if needed) the cache of link check results.
+    """
+    connection = sqlite3.connect(cache_path, timeout=60)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS links (
+            url TEXT PRIMARY KEY,
+            ok INTEGER NOT NULL,
+            status INTEGER,
+            checked_at REAL NOT NULL
+        ) WITHOUT ROWID
+    """)
+    connection.commit()
+    return connection
+
+def lookup_links(connection: sqlite3.Connection, urls, ttl: float = LINK_CACHE_TTL) -> dict:
+    """
+    Return url -> ok for the urls checked less than ttl seconds ago.
+    """
+    urls = list(urls)
+    found = {}
+    for start in range(0, len(urls), 500):
+        batch = urls[start:start + 500]
+        rows = connection.execute(
+            f"SELECT url, ok FROM links WHERE checked_at >= ? AND url IN ({','.join('?' * len(batch))})",
+            [time.time() - ttl] + batch)
+        found.update((url, bool(ok)) for url, ok in rows)
+    return found
+
+def store_link(connection: sqlite3.Connection, url: str, ok: bool, status) -> None:
+    connection.execute("INSERT OR REPLACE INTO links (url, ok, status, checked_at) VALUES (?, ?, ?, ?)",
+                       (url, int(ok), status, time.time()))
+    connection.commit()
+
+def project_to_github_url(project: str) -> str:
+    # Remove 'apache_' prefix if present and create GitHub URL
+    clean_project = project[7:] if project.startswith('apache_') else project
+    return f"https://github.com/apache/{clean_project}"
+
+def check_link(url: str, client=None, timeout: float = 5) -> tuple:
+    """
+    Send a HEAD request to a URL.
+
+    Returns:
+        (url, ok, status code or None if the server could not be reached)
+    """
+    try:
+        response = (client or get_client()).head(url, timeout=timeout, allow_redirects=True)
+        return url, response.status_code == 200, response.status_code
+    except requests.RequestException:
+        return url, False, None
+
+def validate_links(urls, workers: int = 16, client=None, timeout: float = 5):
+    """
+    Check URLs concurrently and yield (url, ok, status) in the order the checks finish.
+
+    At most `workers` requests are in flight; the shared HTTP client reuses the connections
+    and keeps the request rate per host within its limits. Checks that have not started yet
+    are cancelled when the caller stops iterating.
+    """
+    client = client or get_client()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(check_link, url, client, timeout) for url in urls]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def read_lines(path: Path) -> set:
+    if not path.exists():
+        return set()
+    with open(path, 'r', encoding='utf-8') as f:
+        return {line.strip() for line in f if line.strip()}
+
+def append_line(path: Path, line: str) -> None:
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(line + '\n')
+
+def write_lines(path: Path, lines) -> None:
+    # Replaced atomically, an interrupted run never leaves a truncated list behind
+    with open(str(path) + '.tmp', 'w', encoding='utf-8') as f:
+        f.writelines(line + '\n' for line in sorted(lines))
+    os.replace(str(path) + '.tmp', path)
+
+def print_byte_progress(done: int, total: int) -> None:
+    percent = 100 * done / total if total else 100.0
+    print(f'\rRead {done / 2**20:.0f} of {total / 2**20:.0f} MB ({percent:.1f}%)', end='')
+
+def complete_block_end(block: bytes) -> int:
+    """
+    Position after the last complete CSV record in a block, or -1 if there is none.
+    A newline only ends a record if it is not inside a quoted field.
+    """
+    end = block.rfind(b'\n')
+    if b'"' in block:
+        while end != -1 and block.count(b'"', 0, end) % 2:
+            end = block.rfind(b'\n', 0, end)
+    return end + 1 if end != -1 else -1
+
+def scan_column(block: bytes, column_idx: int) -> set:
+    """
+    Return the distinct raw values of one column in a block of complete CSV records.
+    """
+    if b'"' in block:
+        # Quoted fields may hold commas and newlines, leave those blocks to the csv module
+        rows = csv.reader(io.StringIO(block.decode('utf-8', 'replace'), newline=''))
+        return {row[column_idx].encode('utf-8') for row in rows if len(row) > column_idx}
+    # Skips column_idx fields, then captures the wanted one
+    pattern = re.compile(rb'^(?:[^,\r\n]*,){%d}([^,\r\n]*)' % column_idx, re.MULTILINE)
+    return set(pattern.findall(block))
+
+def iter_csv_blocks(f, block_size: int):
+    """
+    Yield (block, bytes read so far) with blocks of complete CSV records from a binary file.
+    """
+    rest = b''
+    while True:
+        data = f.read(block_size)
+        block = rest + data
+        if not block:
+            return
+        end = complete_block_end(block) if data else len(block)
+        if end == -1:
+            # A record longer than the block, read on
+            rest = block
+            continue
+        block, rest = block[:end], block[end:]
+        yield block, f.tell() - len(rest)
+        if not data:
+            return
+
+def iter_unique_column_values(input_file: str, column: str = 'project', block_size: int = CSV_BLOCK_SIZE,
+                              processes: int = None):
+    """
+    Read one column of a large CSV file in blocks and yield, per block, the set of values
+    (lowercased) that were not seen before.
+    
+    Each block is read as bytes and the column is cut out of all its rows with one regular
+    expression, so no Python code runs per row; only blocks that contain quotes go through
+    the csv module. With more than one process the blocks are scanned in parallel, while
+    the results still come in file order. Values are deduplicated before they are decoded
+    and lowercased. Memory stays at a few blocks plus the distinct values. Progress is
+    reported by bytes read.
+    
+    Args:
+        input_file: Path to the CSV file
+        column: Name of the column in the header row
+        block_size: Bytes read at a time
+        processes: Number of processes scanning blocks, one per CPU by default
+    """
+    total = os.path.getsize(input_file)
+    processes = processes or os.cpu_count() or 1
+    seen_raw = set()
+    seen = set()
+    
+    def new_values(values, done):
+        new_raw = values - seen_raw
+        seen_raw.update(new_raw)
+        new = {value.decode('utf-8', 'replace').lower() for value in new_raw if value} - seen
+        seen.update(new)
+        print_byte_progress(done, total)
+        return new
+    
+    with open(input_file, 'rb') as f:
+        header_line = f.readline()
+        header = next(csv.reader([header_line.decode('utf-8-sig').rstrip('\r\n')]))
+        column_idx = header.index(column)
+        blocks = iter_csv_blocks(f, block_size)
+        
+        if processes == 1:
+            for block, done in blocks:
+                values = new_values(scan_column(block, column_idx), done)
+                if values:
+                    yield values
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                in_flight = deque()
+                for block, done in blocks:
+                    in_flight.append((executor.submit(scan_column, block, column_idx), done))
+                    del block
+                    # Bound the blocks held in memory
+                    if len(in_flight) > processes:
+                        future, done = in_flight.popleft()
+                        values = new_values(future.result(), done)
+                        if values:
+                            yield values
+                while in_flight:
+                    future, done = in_flight.popleft()
+                    values = new_values(future.result(), done)
+                    if values:
+                        yield values
+    print()
+
+def make_link_client(rate_limit: float = LINK_RATE_LIMIT, workers: int = 16) -> HttpClient:
+    """
+    HTTP client for link checks, limited to rate_limit requests per second to github.com with
+    a burst of one request per worker.
+    """
+    return HttpClient(pool_size=max(workers, 1), rate_limits={"github.com": (rate_limit, max(workers, 1))})
+
+def process_github_links(input_file: str, block_size: int = CSV_BLOCK_SIZE, workers: int = 16,
+                         cache_path: str = LINK_CACHE_PATH, ttl: float = LINK_CACHE_TTL, client=None,
+                         rate_limit: float = LINK_RATE_LIMIT) -> None:
     """
     Process CSV file to extract unique project names and convert them to GitHub links.
     
+    The links are checked concurrently. Results are kept in a cache, so a re-run only
+    checks projects that are new or whose result is older than ttl. Every link is appended
+    to sources.txt or failed.txt as soon as its result is known, links already listed
+    there are not written again. A link whose result changed since it was listed (e.g. a
+    failed link that works now) is moved to the other file.
+    
     Args:
         input_file: Path to the input CSV file
-        chunk_size: Number of rows to process at a time
+        block_size: Number of bytes of the CSV file to process at a time
+        workers: Maximum number of link checks in flight
+        cache_path: Path to the SQLite cache of link check results
+        ttl: Seconds a cached result is trusted
+        client: HttpClient to use, by default one from make_link_client
+        rate_limit: Requests per second to github.com, if no client is given
     """
     # Initialize sets to store unique successful and failed links
     successful_links = set()
     failed_links = set()
     processed_projects = set()  # To track unique projects we've already seen
+    new_failures = 0
     
-    # Create output files
+    # Output files, only links not listed yet are appended
     sources_file = Path("sources.txt")
     failed_file = Path("failed.txt")
+    listed = {sources_file: read_lines(sources_file), failed_file: read_lines(failed_file)}
+    # Files a link was moved out of, rewritten after every block
+    changed_files = set()
+    cache = open_link_cache(cache_path)
+    client = client or make_link_client(rate_limit, workers)
+    
+    def record(url, ok):
+        (successful_links if ok else failed_links).add(url)
+        target, other = (sources_file, failed_file) if ok else (failed_file, sources_file)
+        if url in listed[other]:
+            listed[other].discard(url)
+            changed_files.add(other)
+        if url not in listed[target]:
+            append_line(target, url)
+            listed[target].add(url)
+    
+    def rewrite_changed_files():
+        for path in changed_files:
+            write_lines(path, listed[path])
+        changed_files.clear()
     
     print("Starting to process the CSV file...")
     
     try:
-        with open(input_file, 'r', encoding='utf-8') as csvfile:
-            # Get the index of the 'project' column
-            header = next(csv.reader([next(csvfile)]))
-            project_idx = header.index('project')
-            
-            # Reset file pointer to start
-            csvfile.seek(0)
-            reader = csv.reader(csvfile)
-            next(reader)  # Skip header row
+        # Only the new unique projects of each block of the file are processed
+        for unique_projects in iter_unique_column_values(input_file, 'project', block_size):
+            processed_projects.update(unique_projects)
+            urls = sorted({project_to_github_url(project) for project in unique_projects})
+            cached = lookup_links(cache, urls, ttl)
+            for url in urls:
+                if url in cached:
+                    record(url, cached[url])
+            to_check = [url for url in urls if url not in cached]
+            print(f"\nProcessing {len(unique_projects)} new unique projects, {len(to_check)} links to check...")
             
-            while True:
-                # Read chunk_size rows at a time
-                chunk = []
-                for _ in range(chunk_size):
-                    try:
-                        row = next(reader)
-                        chunk.append(row[project_idx].lower())
-                    except StopIteration:
-                        break
+            for i, (url, ok, status) in enumerate(validate_links(to_check, workers, client)):
+                # Show progress
+                print_progress(i + 1, len(to_check))
+                store_link(cache, url, ok, status)
+                record(url, ok)
+                new_failures += not ok
                 
-                if not chunk:
-                    break
-                
-                # Process unique projects in this chunk
-                unique_projects = set(chunk) - processed_projects
-                
-                if unique_projects:
-                    print(f"\nProcessing {len(unique_projects)} new unique projects...")
-                    
-                    for i, project in enumerate(unique_projects):
-                        # Show progress
-                        print_progress(i + 1, len(unique_projects))
-                        
-                        # Skip if we've already processed this project
-                        if project in processed_projects:
-                            continue
-                        
-                        processed_projects.add(project)
-                        
-                        # Remove 'apache_' prefix if present and create GitHub URL
-                        clean_project = project[7:] if project.startswith('apache_') else project
-                        github_url = f"https://github.com/apache/{clean_project}"
-                        
-                        # Test the URL
-                        try:
-                            # Create a request object with a reasonable timeout
-                            req = urllib.request.Request(
-                                github_url,
-                                method='HEAD',  # Only get headers, not full content
-                                headers={'User-Agent': 'Mozilla/5.0'}  # Some servers require this
-                            )
-                            
-                            with urllib.request.urlopen(req, timeout=5) as response:
-                                if response.status == 200:
-                                    successful_links.add(github_url)
-                                else:
-                                    failed_links.add(github_url)
-                        except (urllib.error.URLError, urllib.error.HTTPError, TimeoutError):
-                            failed_links.add(github_url)
-                        
-                        # Add a small delay to avoid overwhelming the GitHub server
-                        sleep(0.1)
-                        
-                        # Check if we've hit over 50 dead links (probably a bug somewhere)
-                        if len(failed_links) > 50:
-                            print("\nWarning: More than 50 links have failed! Stopping processing.")
-                            raise ValueError("Too many failed links")
-                        
-                    # Write results after processing each chunk
-                    with open(sources_file, 'w', encoding='utf-8') as f:
-                        f.write('\n'.join(sorted(successful_links)) + '\n')
-                    
-                    with open(failed_file, 'w', encoding='utf-8') as f:
-                        f.write('\n'.join(sorted(failed_links)) + '\n')
-                    
-                    print(f"\nProgress: {len(successful_links)} successful links, {len(failed_links)} failed links")
+                # Check if we've hit over 50 dead links (probably a bug somewhere)
+                if new_failures > 50:
+                    print("\nWarning: More than 50 links have failed! Stopping processing.")
+                    raise ValueError("Too many failed links")
+            
+            rewrite_changed_files()
+            print(f"\nProgress: {len(successful_links)} successful links, {len(failed_links)} failed links")
     
     except ValueError as e:
         if str(e) == "Too many failed links":
@@ -118,6 +321,9 @@ def process_github_links(input_file: str, chunk_size: int = 1000) -> None:
             print(f"\nAn error occurred: {e}")
     except Exception as e:
         print(f"\nAn unexpected error occurred: {e}")
+    finally:
+        rewrite_changed_files()
+        cache.close()
     
     print("\nFinal results:")
     print(f"Successful links: {len(successful_links)}")
@@ -125,5 +331,10 @@ def process_github_links(input_file: str, chunk_size: int = 1000) -> None:
     print(f"Total unique projects processed: {len(processed_projects)}")
 
 if __name__ == "__main__":
-    input_file = "sonar_measures.csv"
-    process_github_links(input_file)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Check the GitHub links of the projects in a CSV file.")
+    parser.add_argument("input_file", nargs="?", default="sonar_measures.csv", help="CSV file with a 'project' column")
+    parser.add_argument("--workers", type=int, default=16, help="Maximum number of link checks in flight")
+    parser.add_argument("--rate-limit", type=float, default=LINK_RATE_LIMIT,
+                        help="Requests per second to github.com")
+    args = parser.parse_args()
+    process_github_links(args.input_file, workers=args.workers, rate_limit=args.rate_limit)
\ No newline at end of file
@@ -0,0 +1,190 @@
+import json
+import os
+import sqlite3
+import subprocess
+import tempfile
+import threading
+
+# One cache file is shared by every repository and every run, blobs are content addressed
+# so forks and vendored copies of the same file are only counted once.
+DEFAULT_CACHE_PATH = "loc_cache.sqlite"
+# Blobs written to a temporary directory and counted per scc run, bounds the disk space used
+SCC_BATCH_SIZE = 2000
+
+
+def open_loc_cache(cache_path=DEFAULT_CACHE_PATH):
+    """
+    Open (and create if needed) the on-disk LOC cache.
+
+    Parameters:
+    - cache_path (str): Path to the SQLite cache file
+
+    Returns:
+    - sqlite3.Connection: Connection to the cache
+    """
+    connection = sqlite3.connect(cache_path, timeout=60)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS blob_loc (
+            blob_sha TEXT NOT NULL,
+            language TEXT NOT NULL,
+            code INTEGER NOT NULL,
+            comment INTEGER NOT NULL,
+            blank INTEGER NOT NULL,
+            PRIMARY KEY (blob_sha, language)
+        ) WITHOUT ROWID
+    """)
+    connection.commit()
+    return connection
+
+
+def lookup_blob_counts(connection, keys, batch_size=500):
+    """
+    Look up cached counts for (blob_sha, language) pairs.
+
+    Parameters:
+    - connection (sqlite3.Connection): Open LOC cache
+    - keys (iterable): (blob_sha, language) pairs
+    - batch_size (int): Number of pairs per query
+
+    Returns:
+    - dict: (blob_sha, language) -> (code, comment, blank) for the pairs found in the cache
+    """
+    keys = list(keys)
+    found = {}
+    for start in range(0, len(keys), batch_size):
+        batch = keys[start:start + batch_size]
+        shas = list({blob_sha for blob_sha, _ in batch})
+        placeholders = ",".join("?" * len(shas))
+        rows = connection.execute(
+            f"SELECT blob_sha, language, code, comment, blank FROM blob_loc WHERE blob_sha IN ({placeholders})",
+            shas)
+        wanted = set(batch)
+        for blob_sha, language, code, comment, blank in rows:
+            if (blob_sha, language) in wanted:
+                found[(blob_sha, language)] = (code, comment, blank)
+    return found
+
+
+def store_blob_counts(connection, counts):
+    """
+    Store counts in the cache.
+
+    Parameters:
+    - connection (sqlite3.Connection): Open LOC cache
+    - counts (dict): (blob_sha, language) -> (code, comment, blank)
+    """
+    connection.executemany(
+        "INSERT OR REPLACE INTO blob_loc (blob_sha, language, code, comment, blank) VALUES (?, ?, ?, ?, ?)",
+        [(blob_sha, language, *values) for (blob_sha, language), values in counts.items()])
+    connection.commit()
+
+
+def count_blobs_with_scc(project_dir, blobs, batch_size=SCC_BATCH_SIZE):
+    """
+    Count code/comment/blank lines of git blobs with scc, batch_size blobs per scc run.
+
+    The blobs are streamed from `git cat-file --batch` into a temporary directory under their
+    original file name, so scc detects the same language as in the work tree. Memory holds at
+    most one chunk of a blob and the disk one batch of blobs, whatever the number of blobs.
+
+    Parameters:
+    - project_dir (str): Path to the repository the blobs belong to
+    - blobs (dict): (blob_sha, language) -> file path inside the repository
+    - batch_size (int): Blobs written out and counted at a time
+
+    Returns:
+    - dict: (blob_sha, language) -> (code, comment, blank)
+    """
+    counts = {}
+    items = list(blobs.items())
+    for start in range(0, len(items), batch_size):
+        counts.update(count_blob_batch(project_dir, dict(items[start:start + batch_size])))
+    return counts
+
+
+def write_blobs(project_dir, blobs, temp_dir, chunk_size=1024 * 1024):
+    """
+    Stream blobs from `git cat-file --batch` to files in temp_dir.
+
+    Returns:
+    - dict: Path relative to temp_dir -> (blob_sha, language), for the blobs that exist
+    """
+    process = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=project_dir, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    # Fed from a thread, writing every request first could fill the output pipe and block
+    def feed_blobs():
+        process.stdin.writelines(f"{blob_sha}\n".encode() for blob_sha, _ in blobs)
+        process.stdin.close()
+    feeder = threading.Thread(target=feed_blobs, daemon=True)
+    feeder.start()
+
+    locations = {}
+    for key, file_path in blobs.items():
+        header = process.stdout.readline().split()
+        if len(header) != 3:  # "<sha> missing"
+            continue
+        remaining = int(header[2])
+        blob_dir = os.path.join(temp_dir, key[0])
+        os.makedirs(blob_dir, exist_ok=True)
+        blob_path = os.path.join(blob_dir, os.path.basename(file_path))
+        with open(blob_path, 'wb') as f:
+            while remaining:
+                chunk = process.stdout.read(min(remaining, chunk_size))
+                if not chunk:
+                    raise RuntimeError(f"git cat-file ended in the middle of blob {key[0]}")
+                f.write(chunk)
+                remaining -= len(chunk)
+        process.stdout.read(1)  # Newline after the content
+        locations[os.path.normpath(os.path.relpath(blob_path, temp_dir))] = key
+
+    feeder.join()
+    stderr = process.stderr.read().decode('utf-8', 'replace')
+    if process.wait() != 0:
+        raise RuntimeError(f"Git cat-file command failed: {stderr}")
+    return locations
+
+
+def count_blob_batch(project_dir, blobs):
+    if not blobs:
+        return {}
+
+    with tempfile.TemporaryDirectory(prefix="loc_cache_") as temp_dir:
+        locations = write_blobs(project_dir, blobs, temp_dir)
+
+        result = subprocess.run(['scc', '--by-file', '--format', 'json', '--no-cocomo', '--no-complexity', '.'],
+                                cwd=temp_dir, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"scc tool failed: {result.stderr}")
+
+        # Blobs scc does not report (binary or unknown content) are stored as zero, so they
+        # are never sent to scc again.
+        counts = {key: (0, 0, 0) for key in blobs}
+        for language in json.loads(result.stdout or "[]"):
+            for file_stats in language.get("Files") or []:
+                key = locations.get(os.path.normpath(file_stats["Location"]))
+                if key is not None:
+                    counts[key] = (file_stats["Code"], file_stats["Comment"], file_stats["Blank"])
+    return counts
+
+
+def get_blob_counts(connection, project_dir, blobs):
+    """
+    Get counts for blobs, running scc only on the blobs that are not cached yet.
+
+    Parameters:
+    - connection (sqlite3.Connection): Open LOC cache
+    - project_dir (str): Path to the repository the blobs belong to
+    - blobs (dict): (blob_sha, language) -> file path inside the repository
+
+    Returns:
+    - dict: (blob_sha, language) -> (code, comment, blank)
+    """
+    counts = lookup_blob_counts(connection, blobs.keys())
+    missing = {key: file_path for key, file_path in blobs.items() if key not in counts}
+    if missing:
+        new_counts = count_blobs_with_scc(project_dir, missing)
+        store_blob_counts(connection, new_counts)
+        counts.update(new_counts)
+    return counts
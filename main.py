@@ -1,66 +1,228 @@
 
+import sys
 import time
 import os
-import shutil
-import json
-import csv
-import subprocess
-from refactoring_miner import mine_refactoring_activity
-from diff_analyzer import calculate_and_collect_diff
-from effort_collector import collect_developers_effort
-from bug_miner import mine_bug_fixing_commits_api
-
-def clone_repository(repo_url, target_dir):
-    print(f"Cloning repository: {repo_url}")
-    try:
-        subprocess.run(["git", "clone", repo_url, target_dir], check=True, text=True)
-        print(f"Successfully cloned repository to {target_dir}")
-    except subprocess.CalledProcessError as e:
-        print(f"Error cloning repository: {e}")
-        print(f"Git output: {e.output}")
-        raise
-
-def delete_repository(repo_dir):
-    if os.name == 'nt':  # Windows
-        os.system(f'rmdir /S /Q "{repo_dir}"')
-    else:  # Linux and other Unix-like systems
-        os.system(f'rm -rf "{repo_dir}"')
-    print(f"Successfully deleted {repo_dir}")
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from refactoring_miner import mine_refactoring_activity_sharded, load_refactoring_types, RefactoringCandidateConsumer
+from diff_analyzer import calculate_and_collect_diff, DiffRecordConsumer
+from effort_collector import collect_developers_effort, collect_refactoring_effort, EffortConsumer, RefactoringEffortConsumer
+from bug_miner import mine_bug_fixing_commits_api, BugFixConsumer
+from commit_walker import walk_commits
+from instrumentation import measure_stage, PROFILE_ENV
+from manifest import read_manifest, write_manifest, get_head_commit, stage_is_current, run_stages
+from results_db import ingest_outputs
+from repo_cache import MIRROR_DIR, get_repo_name, get_mirror_path, update_mirror, clone_from_mirror, evict_mirrors, get_directory_size
 
 def create_output_directory(repo_name):
     output_dir = os.path.join("Outputs", repo_name)
     os.makedirs(output_dir, exist_ok=True)
     return output_dir
 
-def main():
-    # Read GitHub project URLs from a file
-    with open('sources.txt', 'r') as f:
-        project_urls = f.read().splitlines()
+# Possible output files of every stage, relative to Outputs/<repo>
+def get_stage_outputs(repo_name):
+    return {
+        "diff": ["diff_analysis.jsonl", os.path.join("diff_store", "patches.pack")],
+        "effort": ["developers-effort.csv"],
+        "refactoring_candidates": ["refactoring_candidates.txt"],
+        # GitHub issues, or Jira issues as a fallback
+        "bug_fixes": [os.path.join(repo_name, "bug-fixing-commits.json"), os.path.join(repo_name, "bug_fixes.json")],
+        "refactorings": ["rminer_analysis.csv", "rminer_output.zip"],
+        "refactoring_effort": ["developers-refactoring-effort.csv", "refactoring-commits-effort.csv"],
+    }
 
-    for project_url in project_urls:
-        repo_name = os.path.basename(project_url).replace('.git', '')
-        project_dir = os.path.join("Repos", repo_name)
-        output_dir = create_output_directory(repo_name)
+def process_repository(project_url, mirror_filter=None, single_pass=True, refactoring_workers=0, manifest=None):
+    """
+    Run the analysis stages of one repository that are not current in its manifest.
 
-        try:
-            # Clone the repository
-            clone_repository(project_url, project_dir)
+    A stage is skipped if it finished on the current HEAD of the mirror and its outputs are
+    unchanged, so an interrupted or repeated run only redoes missing, failed or stale stages.
+    """
+    repo_name = get_repo_name(project_url)
+    output_dir = create_output_directory(repo_name)
+    manifest = manifest if manifest is not None else read_manifest(output_dir, project_url)
+    stage_outputs = get_stage_outputs(repo_name)
+
+    # Create or update the local mirror, the analyzers read it without a working tree
+    with measure_stage("mirror", output_dir):
+        project_dir = update_mirror(project_url, filter_spec=mirror_filter)
+    repo_size = get_directory_size(project_dir)
+    head = get_head_commit(project_dir)
+    manifest["head"] = head
+
+    def needed(*stages):
+        return {stage: stage_outputs[stage] for stage in stages if not stage_is_current(output_dir, manifest, stage, head)}
+
+    # Perform analysis tasks
+    refactorings_ran = False
+    if refactoring_workers and needed("refactorings"):
+        refactorings_ran = True
+        # RefactoringMiner needs a working tree, the shared clone is removed afterwards
+        with run_stages(output_dir, manifest, head, needed("refactorings")), \
+                tempfile.TemporaryDirectory(prefix="rminer_") as work_dir:
+            work_tree = clone_from_mirror(project_dir, os.path.join(work_dir, repo_name))
+            mine_refactoring_activity_sharded(work_tree, output_dir, workers=refactoring_workers)
+    # The effort per developer and refactoring type is joined with the RefactoringMiner output once there is one
+    refactoring_effort_stage = {}
+    if manifest["stages"].get("refactorings", {}).get("status") == "done":
+        refactoring_effort_stage = {"refactoring_effort": stage_outputs["refactoring_effort"]} if refactorings_ran \
+            else needed("refactoring_effort")
+    if single_pass:
+        # Read the history once and feed every analyzer that still has to run from it
+        walk_stages = dict(needed("diff", "effort", "refactoring_candidates"), **refactoring_effort_stage)
+        bug_fix_stage = needed("bug_fixes")
+        consumers = []
+        diff_consumer = None
+        if "diff" in walk_stages:
+            diff_consumer = DiffRecordConsumer(output_dir, diff_store=True, resume=True, repository_path=project_dir)
+            consumers.append(diff_consumer)
+        if "effort" in walk_stages:
+            consumers.append(EffortConsumer(output_dir))
+        if "refactoring_candidates" in walk_stages:
+            consumers.append(RefactoringCandidateConsumer(output_dir))
+        if "refactoring_effort" in walk_stages:
+            refactoring_types = load_refactoring_types(os.path.join(output_dir, "rminer_output.zip"))
+            consumers.append(RefactoringEffortConsumer(output_dir, refactoring_types))
+        bug_fix_consumer = BugFixConsumer()
+        if bug_fix_stage:
+            consumers.append(bug_fix_consumer)
+        if consumers:
+            with run_stages(output_dir, manifest, head, walk_stages, name="walk"):
+                full_walk_stages = set(walk_stages)
+                if diff_consumer is not None and diff_consumer.pending_commits is not None:
+                    # The diff output is appended to from its checkpoint, only the missing commits need their patches
+                    consumers.remove(diff_consumer)
+                    full_walk_stages.discard("diff")
+                    walk_commits(project_dir, [diff_consumer], with_patch=True, commits=diff_consumer.pending_commits)
+                if consumers:
+                    walk_commits(project_dir, consumers, with_patch="diff" in full_walk_stages,
+                                 with_files=bool(full_walk_stages))
+        if bug_fix_stage:
+            with run_stages(output_dir, manifest, head, bug_fix_stage):
+                mine_bug_fixing_commits_api(project_url, output_dir, commits=bug_fix_consumer.commits)
+    else:
+        if needed("diff"):
+            with run_stages(output_dir, manifest, head, needed("diff")):
+                calculate_and_collect_diff(project_dir, output_dir, output_format="jsonl", resume=True, diff_store=True)
+        if needed("effort"):
+            with run_stages(output_dir, manifest, head, needed("effort")):
+                collect_developers_effort(project_dir, output_dir)
+        if needed("bug_fixes"):
+            with run_stages(output_dir, manifest, head, needed("bug_fixes")):
+                mine_bug_fixing_commits_api(project_url, output_dir, project_dir=project_dir)
+        if refactoring_effort_stage:
+            with run_stages(output_dir, manifest, head, refactoring_effort_stage):
+                collect_refactoring_effort(project_dir, output_dir)
 
-            # Perform analysis tasks
-            #mine_refactoring_activity(project_dir, output_dir)
-            calculate_and_collect_diff(project_dir, output_dir)
-            collect_developers_effort(project_dir, output_dir)
-            mine_bug_fixing_commits_api(project_url, output_dir)
+    return repo_size
 
+def run_repository(project_url, retries=1, mirror_filter=None, single_pass=True, refactoring_workers=0):
+    """
+    Process one repository in a worker process, retrying failed attempts.
+
+    The state of every attempt is written to the manifest in Outputs/<repo>/manifest.json, so a
+    failing repository is recorded and skipped without stopping the rest of the batch, and the
+    stages it finished are not repeated by the next attempt or run.
+    """
+    repo_name = get_repo_name(project_url)
+    output_dir = create_output_directory(repo_name)
+    status = read_manifest(output_dir, project_url)
+    status.update(state="running", attempts=0, error=None, started_at=time.time(), finished_at=None, duration=None)
+
+    for attempt in range(1, retries + 2):
+        status["attempts"] = attempt
+        status["state"] = "running"
+        write_manifest(output_dir, status)
+        try:
+            with measure_stage("repository", output_dir):
+                status["repo_size"] = process_repository(project_url, mirror_filter, single_pass, refactoring_workers, status)
+            status["state"] = "done"
+            status["error"] = None
+            break
         except Exception as e:
-            print(f"An error occurred while processing {repo_name}: {str(e)}")
+            print(f"An error occurred while processing {repo_name} (attempt {attempt}): {str(e)}")
+            status["state"] = "failed"
+            status["error"] = str(e)
 
-        finally:
-            time.sleep(2)
-            # Delete the repository to save space
-            if os.path.exists(project_dir):
-                delete_repository(project_dir)
+    status["finished_at"] = time.time()
+    status["duration"] = status["finished_at"] - status["started_at"]
+    write_manifest(output_dir, status)
+    return status
 
-if __name__ == "__main__":
-    main()
+def main(sources_file='sources.txt', workers=os.cpu_count(), disk_budget_gb=50.0, retries=1, mirror_filter=None, single_pass=True,
+         refactoring_workers=0, results_db=None):
+    """
+    Process the repositories listed in sources_file with a pool of worker processes.
 
+    The mirrors in Repos are kept between runs. Before a new repository is started, the least
+    recently used mirrors that are not in use are evicted until the cache plus the average
+    mirror size seen so far fit in disk_budget_gb. At least one repository always runs.
+    If results_db is given, all outputs are loaded into that SQLite database at the end.
+    """
+    # Read GitHub project URLs from a file
+    with open(sources_file, 'r') as f:
+        project_urls = [line.strip() for line in f if line.strip()]
+
+    os.makedirs(MIRROR_DIR, exist_ok=True)
+    disk_budget = disk_budget_gb * 1024 ** 3
+    pending = list(reversed(project_urls))
+    running = {}
+    repo_sizes = []
+    failed = []
+
+    # One process per repository, so a leaking or crashing analysis cannot affect the next one.
+    # max_tasks_per_child needs Python 3.11, older versions reuse the worker processes
+    pool_options = {"max_tasks_per_child": 1} if sys.version_info >= (3, 11) else {}
+    with ProcessPoolExecutor(max_workers=workers, **pool_options) as executor:
+        while pending or running:
+            while pending and len(running) < workers:
+                estimate = sum(repo_sizes) / len(repo_sizes) if repo_sizes else 0
+                in_use = [get_mirror_path(url) for url in running.values()] + [get_mirror_path(pending[-1])]
+                cache_size = evict_mirrors(disk_budget - estimate, keep=in_use)
+                if running and cache_size + estimate > disk_budget:
+                    break
+                project_url = pending.pop()
+                running[executor.submit(run_repository, project_url, retries, mirror_filter, single_pass, refactoring_workers)] = project_url
+
+            done, _ = wait(running, timeout=30, return_when=FIRST_COMPLETED)
+            for future in done:
+                project_url = running.pop(future)
+                try:
+                    status = future.result()
+                except Exception as e:
+                    # The worker process itself died, the manifest still says "running"
+                    status = {"url": project_url, "state": "failed", "error": str(e), "repo_size": 0}
+                if status["repo_size"]:
+                    repo_sizes.append(status["repo_size"])
+                if status["state"] != "done":
+                    failed.append(project_url)
+                print(f"{project_url}: {status['state']} ({len(pending)} pending, {len(running)} running)")
+
+    print(f"Processed {len(project_urls)} repositories, {len(failed)} failed")
+    for project_url in failed:
+        print(f"Failed: {project_url}")
+
+    if results_db:
+        ingest_outputs("Outputs", results_db)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mine the repositories listed in a sources file.")
+    parser.add_argument("--sources", default="sources.txt", help="File with one repository URL per line")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Repositories processed at once")
+    parser.add_argument("--disk-budget-gb", type=float, default=50.0, help="Maximum total size of the mirror cache")
+    parser.add_argument("--retries", type=int, default=1, help="Retries per failed repository")
+    parser.add_argument("--mirror-filter", default=None, help="Partial clone filter for new mirrors, e.g. blob:limit=1m")
+    parser.add_argument("--separate-passes", action="store_true", help="Let every analyzer read the history on its own")
+    parser.add_argument("--refactoring-workers", type=int, default=0,
+                        help="Mine refactorings with this many RefactoringMiner instances over commit ranges, 0 to skip")
+    parser.add_argument("--profile", action="store_true",
+                        help="Write a cProfile dump of every stage to Outputs/<repo>/profiles")
+    parser.add_argument("--results-db", default=None,
+                        help="Load all outputs into this SQLite database at the end, see results_db.py")
+    args = parser.parse_args()
+    if args.profile:
+        # Inherited by the worker processes
+        os.environ[PROFILE_ENV] = "1"
+    main(args.sources, args.workers, args.disk_budget_gb, args.retries, args.mirror_filter, not args.separate_passes,
+         args.refactoring_workers, args.results_db)
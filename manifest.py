@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import subprocess
+import time
+from contextlib import contextmanager
+from instrumentation import measure_stage
+
+MANIFEST_FILE = "manifest.json"
+
+
+def new_manifest(project_url=None):
+    return {"url": project_url, "state": None, "attempts": 0, "error": None, "started_at": None,
+            "finished_at": None, "duration": None, "repo_size": 0, "head": None, "stages": {}}
+
+def read_manifest(output_dir, project_url=None):
+    """
+    Read the manifest of a repository output directory, or a new empty one if there is none.
+
+    The manifest holds the state of the last run (url, state, attempts, error, timestamps,
+    repo_size, head) and per stage its status, the commit it was computed from, its duration
+    and the size and SHA-256 of every output file.
+    """
+    manifest_file = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_file):
+        return new_manifest(project_url)
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+    if project_url:
+        manifest["url"] = project_url
+    return manifest
+
+def write_manifest(output_dir, manifest):
+    # Written to a temporary file first so a crash never leaves a half-written manifest behind
+    manifest_file = os.path.join(output_dir, MANIFEST_FILE)
+    with open(manifest_file + ".tmp", 'w') as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(manifest_file + ".tmp", manifest_file)
+
+def file_checksum(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def get_head_commit(project_dir):
+    return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=project_dir, capture_output=True, text=True,
+                          check=True).stdout.strip()
+
+def stage_is_current(output_dir, manifest, stage, head):
+    """
+    Whether a stage finished on the given commit and all its outputs are still there unchanged
+    in size. Missing, failed or stale stages (older commit) have to run again.
+    """
+    entry = manifest["stages"].get(stage)
+    if not entry or entry["status"] != "done" or entry["commit"] != head:
+        return False
+    for relative_path, output in entry["outputs"].items():
+        path = os.path.join(output_dir, relative_path)
+        if not os.path.exists(path) or os.path.getsize(path) != output["size"]:
+            return False
+    return True
+
+@contextmanager
+def run_stages(output_dir, manifest, head, stage_outputs, name=None):
+    """
+    Record one or more stages that are computed together (e.g. by one history walk).
+
+    The stages are marked running when the block starts. When it ends they are marked done
+    with the size and checksum of their outputs, or failed with the error. A stage that wrote
+    none of its possible outputs counts as failed. The manifest is written after every change.
+    The block is measured as one stage of metrics.jsonl, see instrumentation.measure_stage.
+
+    Parameters:
+    - output_dir (str): The repository output directory
+    - manifest (dict): The manifest, updated in place
+    - head (str): The commit the stages are computed from
+    - stage_outputs (dict): Stage name -> possible output paths, relative to output_dir
+    - name (str, optional): Name in the metrics, the stage names joined by "+" by default
+    """
+    with measure_stage(name or "+".join(stage_outputs), output_dir):
+        start = time.time()
+        for stage in stage_outputs:
+            manifest["stages"][stage] = {"status": "running", "commit": head, "started_at": start,
+                                         "duration": None, "outputs": {}, "error": None}
+        write_manifest(output_dir, manifest)
+        try:
+            yield
+        except Exception as e:
+            for stage in stage_outputs:
+                manifest["stages"][stage].update(status="failed", duration=time.time() - start, error=str(e))
+            write_manifest(output_dir, manifest)
+            raise
+
+        for stage, outputs in stage_outputs.items():
+            entry = manifest["stages"][stage]
+            for relative_path in outputs:
+                path = os.path.join(output_dir, relative_path)
+                if os.path.isfile(path):
+                    entry["outputs"][relative_path] = {"size": os.path.getsize(path), "sha256": file_checksum(path)}
+            entry["duration"] = time.time() - start
+            if entry["outputs"]:
+                entry["status"] = "done"
+            else:
+                entry["status"] = "failed"
+                entry["error"] = "No output written"
+        write_manifest(output_dir, manifest)
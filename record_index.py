@@ -0,0 +1,271 @@
+import json
+import mmap
+import os
+import sqlite3
+from datetime import datetime
+from json_stream import iter_json_array
+
+INDEX_SUFFIX = ".idx.sqlite"
+
+# File name -> (top-level key of the record array, hash field, date field). JSON Lines files
+# hold one record per line and have no key.
+RECORD_LAYOUTS = {
+    "diff_analysis.jsonl": (None, "hash", "date"),
+    "diff_analysis.json": (None, "hash", "date"),
+    "bug-fixing-commits.json": ("bug_fixing_commits", "commit_hash", None),
+    "bug_fixes.json": ("bug_fixing_commits", "commit_hash", None),
+}
+
+
+def get_index_path(path):
+    return path + INDEX_SUFFIX
+
+def to_timestamp(date):
+    if date is None:
+        return None
+    try:
+        return datetime.fromisoformat(str(date)).timestamp()
+    except ValueError:
+        return None
+
+def iter_record_spans(path, key, hash_field, date_field):
+    """
+    Yield (hash, date, offset, length) for every record of a JSON Lines or JSON output file,
+    reading it once from start to end. Jira issue records (repo_type="jira") have no hash and
+    are indexed by their issue key, records with neither are skipped.
+    """
+    def spans():
+        with open(path, 'rb') as f:
+            if path.endswith(".jsonl"):
+                offset = 0
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line), offset, len(line)
+                    offset += len(line)
+                return
+            # Hashes and dates are ASCII, so the Latin-1 decoded items hold them unchanged
+            for record, start, end in iter_json_array(f, key, offsets=True):
+                yield record, start, end - start
+
+    for record, offset, length in spans():
+        record_hash = record.get(hash_field, record.get("key"))
+        if record_hash is not None:
+            yield record_hash, record.get(date_field) if date_field else None, offset, length
+
+def build_index(path, layout=None):
+    """
+    Write the sidecar index <path>.idx.sqlite of an output file: for every record its commit
+    hash, byte offset and length, position in the file and date (if the records have one).
+
+    The index is built in one streaming pass and replaced atomically. It stores the size and
+    modification time of the file it was built from, so a rewritten file is detected.
+
+    Parameters:
+    - path (str): diff_analysis.jsonl, diff_analysis.json, bug-fixing-commits.json or bug_fixes.json
+    - layout (tuple, optional): (key, hash field, date field), by default from RECORD_LAYOUTS
+
+    Raises:
+    - ValueError: If no layout is given and the file name is not in RECORD_LAYOUTS
+    """
+    layout = layout or RECORD_LAYOUTS.get(os.path.basename(path))
+    if layout is None:
+        raise ValueError(f"Unknown record layout of {path}, pass (key, hash field, date field)")
+    key, hash_field, date_field = layout
+    index_path = get_index_path(path)
+    stat = os.stat(path)
+    if os.path.exists(index_path + ".tmp"):
+        os.remove(index_path + ".tmp")
+    connection = sqlite3.connect(index_path + ".tmp")
+    try:
+        create_index_tables(connection)
+        connection.executemany(
+            "INSERT INTO records (hash, offset, length, date, timestamp) VALUES (?, ?, ?, ?, ?)",
+            ((commit_hash, offset, length, date, to_timestamp(date))
+             for commit_hash, date, offset, length in iter_record_spans(path, key, hash_field, date_field)))
+        connection.execute("INSERT INTO meta (size, mtime_ns) VALUES (?, ?)", (stat.st_size, stat.st_mtime_ns))
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(index_path + ".tmp", index_path)
+
+def create_index_tables(connection):
+    connection.execute("CREATE TABLE IF NOT EXISTS meta (size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL)")
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS records (
+            position INTEGER PRIMARY KEY,
+            hash TEXT NOT NULL,
+            offset INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            date TEXT,
+            timestamp REAL
+        )
+    """)
+    connection.execute("CREATE INDEX IF NOT EXISTS records_hash ON records (hash)")
+    connection.execute("CREATE INDEX IF NOT EXISTS records_timestamp ON records (timestamp)")
+
+def index_is_current(path):
+    index_path = get_index_path(path)
+    if not os.path.exists(index_path):
+        return False
+    stat = os.stat(path)
+    connection = sqlite3.connect(index_path)
+    try:
+        meta = connection.execute("SELECT size, mtime_ns FROM meta").fetchone()
+    except sqlite3.DatabaseError:
+        return False
+    finally:
+        connection.close()
+    return meta == (stat.st_size, stat.st_mtime_ns)
+
+class IndexWriter:
+    """
+    Index of a JSON Lines output that is filled while the output is written, so the file never
+    has to be read again to index it.
+
+    Opened on an output that was cut back to `offset` bytes to be appended to (a resumed
+    run), the rows of the records before the offset are kept and the rest are deleted. Only
+    if the existing index does not end exactly at the offset (missing, or from another run)
+    is it rebuilt from the file. close() must be called after the output file is closed, it
+    stores the size and modification time the reader checks.
+
+    Parameters:
+    - path (str): The JSON Lines output file
+    - offset (int): Size of the output before the first record added
+    """
+
+    def __init__(self, path, offset=0):
+        self.path = path
+        index_path = get_index_path(path)
+        if offset == 0 and os.path.exists(index_path):
+            os.remove(index_path)
+        self.connection = sqlite3.connect(index_path)
+        try:
+            create_index_tables(self.connection)
+            self.connection.execute("DELETE FROM records WHERE offset >= ?", (offset,))
+            end = self.connection.execute("SELECT MAX(offset + length) FROM records").fetchone()[0] or 0
+        except sqlite3.DatabaseError:
+            end = None
+        if end != offset:
+            self.connection.close()
+            build_index(path)
+            self.connection = sqlite3.connect(index_path)
+        # The meta row is only written again by close(), until then a reader rebuilds the index
+        self.connection.execute("DELETE FROM meta")
+        self.connection.commit()
+
+    def add(self, commit_hash, date, offset, length):
+        self.connection.execute("INSERT INTO records (hash, offset, length, date, timestamp) VALUES (?, ?, ?, ?, ?)",
+                                (commit_hash, offset, length, date, to_timestamp(date)))
+
+    def hashes(self):
+        # The commits of the records the output already holds
+        return {row[0] for row in self.connection.execute("SELECT hash FROM records")}
+
+    def flush(self):
+        self.connection.commit()
+
+    def close(self):
+        stat = os.stat(self.path)
+        self.connection.execute("INSERT INTO meta (size, mtime_ns) VALUES (?, ?)", (stat.st_size, stat.st_mtime_ns))
+        self.connection.commit()
+        self.connection.close()
+
+class RecordReader:
+    """
+    Random access to the records of a large output file through its sidecar index.
+
+    The file is memory-mapped and only the requested records are decoded, so a lookup by
+    commit hash reads one record and needs neither the whole file in memory nor a scan. The
+    index is built first if it is missing or older than the file.
+
+    Usage:
+        with RecordReader("Outputs/repo/diff_analysis.jsonl") as records:
+            record = records.get("3f2a9c")
+            for record in records.iter_dates(since="2020-01-01", until="2021-01-01"):
+                ...
+    """
+
+    def __init__(self, path, layout=None):
+        if not index_is_current(path):
+            build_index(path, layout)
+        self.path = path
+        self.connection = sqlite3.connect(get_index_path(path))
+        self.file = open(path, 'rb')
+        # mmap cannot map an empty file
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b''
+
+    def read(self, offset, length):
+        return json.loads(self.data[offset:offset + length])
+
+    def get(self, commit_hash):
+        """
+        Load the record of a commit, by full hash or unique abbreviation.
+
+        Raises:
+        - KeyError: If no record or more than one matches the hash
+        """
+        rows = self.connection.execute(
+            "SELECT offset, length FROM records WHERE hash >= ? AND hash < ? LIMIT 2",
+            (commit_hash, commit_hash + "\uffff")).fetchall()
+        if len(rows) != 1:
+            raise KeyError(commit_hash if not rows else f"Ambiguous commit hash: {commit_hash}")
+        return self.read(*rows[0])
+
+    def __contains__(self, commit_hash):
+        return self.connection.execute("SELECT 1 FROM records WHERE hash = ?", (commit_hash,)).fetchone() is not None
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def __iter__(self):
+        return self.iter_range()
+
+    def iter_range(self, start=None, end=None):
+        """
+        Yield the records from commit start to commit end (both included) in file order, from
+        the first or to the last record if not given.
+        """
+        first = self.position(start) if start else 0
+        last = self.position(end) if end else None
+        query = "SELECT offset, length FROM records WHERE position >= ?"
+        parameters = [first]
+        if last is not None:
+            query += " AND position <= ?"
+            parameters.append(last)
+        for offset, length in self.connection.execute(query + " ORDER BY position", parameters):
+            yield self.read(offset, length)
+
+    def iter_dates(self, since=None, until=None):
+        """
+        Yield the records dated from since (included) to until (excluded) in file order.
+        Dates are datetimes or ISO 8601 strings, timezone-naive ones are taken as local time.
+        Files without dates (bug-fixing commits) yield nothing.
+        """
+        query = "SELECT offset, length FROM records WHERE timestamp IS NOT NULL"
+        parameters = []
+        if since is not None:
+            query += " AND timestamp >= ?"
+            parameters.append(to_timestamp(since))
+        if until is not None:
+            query += " AND timestamp < ?"
+            parameters.append(to_timestamp(until))
+        for offset, length in self.connection.execute(query + " ORDER BY position", parameters):
+            yield self.read(offset, length)
+
+    def position(self, commit_hash):
+        row = self.connection.execute("SELECT MIN(position) FROM records WHERE hash = ?", (commit_hash,)).fetchone()
+        if row[0] is None:
+            raise KeyError(commit_hash)
+        return row[0]
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,8 +1,11 @@
 import csv
 import json
 import os
+import shutil
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from zipfile import ZipFile, ZIP_DEFLATED
+from json_stream import iter_json_array
 
 
 # For Linux project root installation of RefactoringMiner
@@ -10,13 +13,104 @@ miner_dir = os.path.join("RefactoringMiner-3.0.9", "bin", "RefactoringMiner")
 
 
 
-def mine_refactoring_activity(project_dir, output_dir):
+class RefactoringCandidateConsumer:
+    """
+    Consumer for commit_walker.walk_commits that lists the commits RefactoringMiner can find
+    refactorings in: non-merge commits that change or rename existing Java files.
+    The hashes are written to 'refactoring_candidates.txt', oldest first.
+    """
+
+    def __init__(self, output_dir):
+        self.output_file = os.path.join(output_dir, "refactoring_candidates.txt")
+        self.file = open(self.output_file, 'w')
+
+    def consume(self, commit):
+        if len(commit["parents"]) != 1:
+            return
+        for modified_file in commit["files"]:
+            java_file = modified_file["new_path"].endswith(".java") or modified_file["old_path"].endswith(".java")
+            if java_file and (modified_file["deleted_lines"] or modified_file["old_path"] != modified_file["new_path"]):
+                self.file.write(commit["hash"] + "\n")
+                return
+
+    def finish(self):
+        self.file.close()
+
+
+def count_refactorings(commits):
+    """
+    Count commits and refactorings per type over RefactoringMiner's commits[] entries.
+
+    Returns:
+    - dict: "commits", "refactoring_commits" and "types" (type -> count, in order of first
+      appearance). Counts of several runs are combined with merge_refactoring_counts.
+    """
+    counts = {"commits": 0, "refactoring_commits": 0, "types": {}}
+    for commit in commits:
+        counts["commits"] += 1
+        if commit['refactorings']:
+            counts["refactoring_commits"] += 1
+            for refactor in commit['refactorings']:
+                counts["types"][refactor['type']] = counts["types"].get(refactor['type'], 0) + 1
+    return counts
 
-    # Setting up the refactoring data
+
+def merge_refactoring_counts(counts_list):
+    merged = {"commits": 0, "refactoring_commits": 0, "types": {}}
+    for counts in counts_list:
+        merged["commits"] += counts["commits"]
+        merged["refactoring_commits"] += counts["refactoring_commits"]
+        for refactoring_type, count in counts["types"].items():
+            merged["types"][refactoring_type] = merged["types"].get(refactoring_type, 0) + count
+    return merged
+
+
+def summarize_refactoring_counts(counts):
+    """
+    Turn refactoring counts into the statistics written to rminer_analysis.csv.
+    """
     refactoring_data = {"Total Refactorings":0, "Average Number of Commits Between Refactorings":0, "Average Refactors per Refactoring Commit":0}
-    commits_all = 0
-    commits_refactoring = 0
-    
+    refactoring_data.update(counts["types"])
+    refactoring_data['Total Refactorings'] = sum(counts["types"].values())
+
+    commits_refactoring = counts["refactoring_commits"]
+    if commits_refactoring != 0:
+        refactoring_data['Average Number of Commits Between Refactorings'] = counts["commits"] / commits_refactoring
+        refactoring_data['Average Refactors per Refactoring Commit'] = refactoring_data['Total Refactorings'] / commits_refactoring
+    return refactoring_data
+
+
+def write_refactoring_statistics(csv_output, refactoring_data):
+    with open(csv_output, 'w', newline='') as output:
+        csvwriter = csv.writer(output)
+
+        for key in refactoring_data:
+            csvwriter.writerow([key, refactoring_data[key]])
+
+
+def analyze_and_zip_output(json_output, zip_output, entry_name="rminer_output.json"):
+    """
+    Count the refactorings of a RefactoringMiner output while compressing it into the zip, in
+    one streaming pass: memory holds one commit at a time and the file is read only once.
+    The .json is deleted afterwards, also when it cannot be parsed.
+
+    Returns:
+    - dict: The counts, see count_refactorings
+
+    Raises:
+    - ValueError: If the JSON is malformed or truncated, the zip is complete nonetheless
+    """
+    try:
+        # force_zip64, the output may be larger than 2 GiB
+        with open(json_output, 'rb') as json_data, ZipFile(zip_output, 'w', ZIP_DEFLATED) as zip, \
+                zip.open(entry_name, 'w', force_zip64=True) as entry:
+            return count_refactorings(iter_json_array(json_data, "commits", on_chunk=entry.write))
+    finally:
+        if os.path.exists(json_output):
+            os.remove(json_output)
+
+
+def mine_refactoring_activity(project_dir, output_dir):
 
     # Setting up the output file path variables
     json_output = os.path.join(output_dir, "rminer_output.json")
@@ -39,44 +133,185 @@ def mine_refactoring_activity(project_dir, output_dir):
         raise
     
     
-    # Opening the mined data
+    # Streaming the mined data into the statistics and the zip at once
     try:
-        with open(json_output, 'r') as json_data:
-            miner_output = json.load(json_data)
+        refactoring_data = summarize_refactoring_counts(analyze_and_zip_output(json_output, zip_output))
     except:
-        print(f"Error while opening the json file.")
+        print(f"Error while reading the json file.")
         with open(error_output, 'w') as file:
             file.write("The JSON file cannot be read.")
-        create_zip(zip_output, json_output) # Zipping the output to save space even though the file has issues
         raise
 
 
-    # Calculating statistics from the data
-    for commit in miner_output['commits']:
-        commits_all += 1
-        if commit['refactorings']:
-            commits_refactoring += 1
-            for refactor in commit['refactorings']:
-                if refactor['type'] not in refactoring_data:
-                    refactoring_data[refactor['type']] = 1
-                else:
-                    refactoring_data[refactor['type']] += 1
-                refactoring_data['Total Refactorings'] += 1
+    # Saving the statistics to a .csv file
+    write_refactoring_statistics(csv_output, refactoring_data)
     
-    if commits_refactoring != 0:
-        refactoring_data['Average Number of Commits Between Refactorings'] = commits_all / commits_refactoring
-        refactoring_data['Average Refactors per Refactoring Commit'] = refactoring_data['Total Refactorings'] / commits_refactoring
 
+def load_refactoring_types(rminer_output):
+    """
+    Read the refactoring types of every refactoring commit from a RefactoringMiner output,
+    streaming it one commit at a time. Commits without refactorings are left out, so memory
+    is bounded by the number of refactoring commits.
 
-    # Saving the statistics to a .csv file
-    with open(csv_output, 'w', newline='') as output:
-        csvwriter = csv.writer(output)
+    Parameters:
+    - rminer_output (str): rminer_output.zip (as written by mine_refactoring_activity) or a plain .json
 
-        for key in refactoring_data:
-            csvwriter.writerow([key, refactoring_data[key]])
+    Returns:
+    - dict: commit hash -> {refactoring type: count}
+    """
+    refactoring_types = {}
+
+    def collect(json_data):
+        for commit in iter_json_array(json_data, "commits"):
+            if commit['refactorings']:
+                types = refactoring_types.setdefault(commit['sha1'], {})
+                for refactor in commit['refactorings']:
+                    types[refactor['type']] = types.get(refactor['type'], 0) + 1
+
+    if rminer_output.endswith(".zip"):
+        with ZipFile(rminer_output) as zip, zip.open("rminer_output.json") as json_data:
+            collect(json_data)
+    else:
+        with open(rminer_output, 'rb') as json_data:
+            collect(json_data)
+    return refactoring_types
+
+
+def run_miner(arguments, log_file):
+    """
+    Run RefactoringMiner with the given arguments, its output goes to log_file.
+    Returns the exit code.
+    """
+    with open(log_file, 'w') as log:
+        if os.name == 'nt':  # Windows, attempting to guarantee the code working
+            return subprocess.run(["RefactoringMiner"] + arguments, shell=True, stdout=log, stderr=subprocess.STDOUT).returncode
+        return subprocess.run([miner_dir] + arguments, stdout=log, stderr=subprocess.STDOUT).returncode
+
+
+def get_shard_ranges(project_dir, shards):
+    """
+    Split the history of HEAD into commit ranges for RefactoringMiner's between-commits mode.
+
+    The range boundaries are commits on the first-parent chain, evenly spaced along it. A range
+    (start, end] holds the commits reachable from end but not from start, so the ranges cover
+    every commit except the root exactly once, merged side branches included.
+
+    Returns:
+    - list: (start, end) commit hash pairs, oldest first
+    """
+    chain = subprocess.run(['git', 'rev-list', '--first-parent', '--reverse', 'HEAD'], cwd=project_dir,
+                           capture_output=True, text=True, check=True).stdout.split()
+    if len(chain) < 2:
+        return []
+    shards = max(1, min(shards, len(chain) - 1))
+    boundaries = sorted({round(k * (len(chain) - 1) / shards) for k in range(shards + 1)})
+    return [(chain[start], chain[end]) for start, end in zip(boundaries, boundaries[1:])]
+
+
+def mine_refactoring_shard(project_dir, shard_dir, index, start, end, retries=1):
+    """
+    Mine one commit range, retrying failed attempts. The output is zipped and its counts are
+    written to shard_<index>.counts.json, which marks the shard as done.
+
+    Returns:
+    - dict: The counts, see count_refactorings
+    """
+    name = f"shard_{index:04d}"
+    json_output = os.path.join(shard_dir, name + ".json")
+    counts_file = os.path.join(shard_dir, name + ".counts.json")
+    if os.path.exists(counts_file):
+        with open(counts_file, 'r') as f:
+            return json.load(f)
+
+    for attempt in range(retries + 1):
+        returncode = run_miner(["-bc", project_dir, start, end, "-json", json_output], os.path.join(shard_dir, name + ".log"))
+        try:
+            if returncode != 0:
+                raise RuntimeError(f"RefactoringMiner exited with code {returncode}")
+            counts = analyze_and_zip_output(json_output, os.path.join(shard_dir, name + ".zip"))
+            break
+        except (RuntimeError, ValueError, OSError) as e:
+            print(f"Refactoring shard {index} ({start[:10]}..{end[:10]}) failed, attempt {attempt + 1}: {e}")
+            if attempt == retries:
+                raise
+
+    with open(counts_file + ".tmp", 'w') as f:
+        json.dump(counts, f)
+    os.replace(counts_file + ".tmp", counts_file)
+    return counts
+
+
+def merge_shard_outputs(shard_zips, zip_output):
+    """
+    Combine the zipped outputs of all shards into one rminer_output.json with a single
+    commits[] array, streaming one commit at a time.
+    """
+    with ZipFile(zip_output, 'w', ZIP_DEFLATED) as zip, zip.open("rminer_output.json", 'w', force_zip64=True) as entry:
+        entry.write(b'{"commits": [')
+        first = True
+        for shard_zip in shard_zips:
+            with ZipFile(shard_zip) as shard, shard.open("rminer_output.json") as shard_json:
+                for commit in iter_json_array(shard_json, "commits"):
+                    entry.write((b'' if first else b',') + json.dumps(commit).encode('utf-8'))
+                    first = False
+        entry.write(b']}')
+
+
+def mine_refactoring_activity_sharded(project_dir, output_dir, workers=4, shards=None, retries=1):
+    """
+    Mine refactorings with several RefactoringMiner instances, each over its own commit range.
+
+    Produces the same rminer_analysis.csv and rminer_output.zip as mine_refactoring_activity.
+    The shard plan and the finished shards are kept in <output_dir>/rminer_shards until all
+    shards succeeded, so after a failure a new run only mines the missing shards. The plan is
+    only reused while HEAD is unchanged.
+
+    Parameters:
+    - project_dir (str): Path to the working tree of the repository
+    - output_dir (str): Directory for the outputs
+    - workers (int): Number of miner instances running at once
+    - shards (int, optional): Number of commit ranges, four per worker by default
+    - retries (int): Retries per failed shard
+    """
+    csv_output = os.path.join(output_dir, "rminer_analysis.csv")
+    zip_output = os.path.join(output_dir, "rminer_output.zip")
+    error_output = os.path.join(output_dir, "error_output.txt")
+    shard_dir = os.path.join(output_dir, "rminer_shards")
+    plan_file = os.path.join(shard_dir, "shards.json")
+    project_dir = os.path.abspath(project_dir)
+
+    head = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=project_dir, capture_output=True, text=True, check=True).stdout.strip()
+    plan = None
+    if os.path.exists(plan_file):
+        with open(plan_file, 'r') as f:
+            plan = json.load(f)
+        if plan["head"] != head:
+            shutil.rmtree(shard_dir)
+            plan = None
+    if plan is None:
+        os.makedirs(shard_dir, exist_ok=True)
+        plan = {"head": head, "ranges": get_shard_ranges(project_dir, shards or workers * 4)}
+        with open(plan_file, 'w') as f:
+            json.dump(plan, f, indent=4)
+
+    print(f"Mining {project_dir} in {len(plan['ranges'])} shards with {workers} workers")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(mine_refactoring_shard, project_dir, shard_dir, index, start, end, retries)
+                   for index, (start, end) in enumerate(plan["ranges"])]
+    failed = [index for index, future in enumerate(futures) if future.exception() is not None]
+    if failed:
+        with open(error_output, 'w') as file:
+            file.write(f"The mining process failed for shards {failed}.")
+        raise RuntimeError(f"{len(failed)} of {len(futures)} RefactoringMiner shards failed, run again to retry them")
+
+    # RefactoringMiner lists commits newest first, merging the shards newest first keeps its order
+    counts = merge_refactoring_counts(future.result() for future in reversed(futures))
+    write_refactoring_statistics(csv_output, summarize_refactoring_counts(counts))
+    merge_shard_outputs([os.path.join(shard_dir, f"shard_{index:04d}.zip") for index in reversed(range(len(futures)))], zip_output)
+    shutil.rmtree(shard_dir)
+    if os.path.exists(error_output):
+        os.remove(error_output)
 
-    create_zip(zip_output, json_output)
-    
 
 # Compressing the RMiner output .json and deleting the .json to save space
 def create_zip(zip_output, json_output):
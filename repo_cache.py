@@ -0,0 +1,123 @@
+import os
+import shutil
+import subprocess
+import time
+
+# Bare mirrors are kept here between runs, later runs only fetch the new objects
+MIRROR_DIR = "Repos"
+# Only branches and tags are mirrored. A full mirror would also fetch GitHub's refs/pull/*,
+# often thousands of refs whose objects are in no branch
+MIRROR_REFSPECS = ["+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*"]
+
+
+def get_repo_name(repo_url):
+    return os.path.basename(repo_url.rstrip('/')).replace('.git', '')
+
+def get_mirror_path(repo_url, cache_dir=MIRROR_DIR):
+    return os.path.join(cache_dir, get_repo_name(repo_url) + ".git")
+
+def update_mirror(repo_url, cache_dir=MIRROR_DIR, filter_spec=None):
+    """
+    Create or refresh the bare mirror of a repository.
+
+    The first call makes a `git clone --bare` of the branches and tags, later calls only run
+    `git fetch --prune` for them. The analyzers read the mirror directly, no working tree is
+    checked out.
+
+    Parameters:
+    - repo_url (str): URL of the repository, file:// URLs and local paths work too
+    - cache_dir (str): Directory holding the mirrors
+    - filter_spec (str, optional): Partial clone filter such as "blob:none" or "blob:limit=1m".
+      Only use it for analyses that do not read file contents, missing blobs are fetched one by one on access.
+
+    Returns:
+    - str: Path to the mirror
+    """
+    mirror_path = get_mirror_path(repo_url, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    try:
+        if os.path.exists(os.path.join(mirror_path, "HEAD")):
+            print(f"Fetching new objects into mirror: {mirror_path}")
+            subprocess.run(["git", "--git-dir", mirror_path, "fetch", "--prune", "--quiet", "origin"] + MIRROR_REFSPECS,
+                           check=True, text=True)
+            # Mirrors made by earlier versions with clone --mirror also hold the pull request refs
+            pull_refs = subprocess.run(["git", "--git-dir", mirror_path, "for-each-ref", "--format=%(refname)", "refs/pull/"],
+                                       check=True, capture_output=True, text=True).stdout.split()
+            if pull_refs:
+                subprocess.run(["git", "--git-dir", mirror_path, "update-ref", "--stdin"],
+                               input="".join(f"delete {ref}\n" for ref in pull_refs), check=True, text=True)
+        else:
+            print(f"Mirroring repository: {repo_url}")
+            if os.path.exists(mirror_path):
+                # Left behind by an interrupted clone
+                shutil.rmtree(mirror_path)
+            command = ["git", "clone", "--bare", "--quiet"]
+            if filter_spec:
+                command.append(f"--filter={filter_spec}")
+            subprocess.run(command + [repo_url, mirror_path], check=True, text=True)
+            # A bare clone has no fetch refspec, later fetches would only update FETCH_HEAD
+            for option, refspec in zip(["--replace-all", "--add"], MIRROR_REFSPECS):
+                subprocess.run(["git", "--git-dir", mirror_path, "config", option, "remote.origin.fetch", refspec],
+                               check=True, text=True)
+    except subprocess.CalledProcessError as e:
+        print(f"Error updating mirror of {repo_url}: {e}")
+        raise
+
+    # The modification time of the mirror is used as its last-used time for eviction
+    os.utime(mirror_path)
+    return mirror_path
+
+def clone_from_mirror(mirror_path, target_dir):
+    """
+    Check out a working tree from a mirror, for tools that need one (e.g. RefactoringMiner).
+    The clone shares the objects of the mirror, so it only costs the size of the checkout.
+    """
+    subprocess.run(["git", "clone", "--shared", "--quiet", mirror_path, target_dir], check=True, text=True)
+    return target_dir
+
+def get_directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.lstat(os.path.join(root, file)).st_size
+            except OSError:
+                pass  # The file was removed while walking, e.g. a mirror being evicted
+    return total
+
+def get_mirror_sizes(cache_dir=MIRROR_DIR):
+    sizes = {}
+    if not os.path.isdir(cache_dir):
+        return sizes
+    for entry in os.listdir(cache_dir):
+        mirror_path = os.path.join(cache_dir, entry)
+        if os.path.isdir(mirror_path):
+            sizes[mirror_path] = get_directory_size(mirror_path)
+    return sizes
+
+def evict_mirrors(budget_bytes, cache_dir=MIRROR_DIR, keep=()):
+    """
+    Delete the least recently used mirrors until the cache fits in budget_bytes.
+
+    Parameters:
+    - budget_bytes (float): Maximum total size of the cache
+    - cache_dir (str): Directory holding the mirrors
+    - keep (iterable): Mirror paths that are in use and must not be deleted
+
+    Returns:
+    - int: Total size of the cache after eviction
+    """
+    keep = {os.path.normpath(path) for path in keep}
+    sizes = get_mirror_sizes(cache_dir)
+    total = sum(sizes.values())
+    for mirror_path in sorted(sizes, key=lambda path: os.path.getmtime(path)):
+        if total <= budget_bytes:
+            break
+        if os.path.normpath(mirror_path) in keep:
+            continue
+        last_used = time.ctime(os.path.getmtime(mirror_path))
+        shutil.rmtree(mirror_path, ignore_errors=True)
+        total -= sizes[mirror_path]
+        print(f"Evicted mirror {mirror_path}, last used {last_used}")
+    return total
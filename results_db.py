@@ -0,0 +1,382 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+from itertools import islice
+from zipfile import ZipFile
+from diff_analyzer import DIFF_OUTPUT_FILES, iter_diff_records
+from json_stream import iter_json_array
+from manifest import read_manifest
+from repo_cache import get_repo_name
+
+RESULTS_DB_PATH = "results.sqlite"
+BATCH_SIZE = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repositories (
+    repo TEXT PRIMARY KEY,
+    url TEXT,
+    head TEXT,
+    fingerprint TEXT NOT NULL,
+    ingested_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS commits (
+    repo TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    author TEXT,
+    date TEXT,
+    timestamp INTEGER,
+    files INTEGER NOT NULL,
+    added_lines INTEGER NOT NULL,
+    deleted_lines INTEGER NOT NULL,
+    PRIMARY KEY (repo, hash)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS file_changes (
+    repo TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    filename TEXT,
+    added_lines INTEGER,
+    deleted_lines INTEGER,
+    diff_ref TEXT
+);
+CREATE TABLE IF NOT EXISTS effort (
+    repo TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    previous_hash TEXT,
+    tloc INTEGER
+);
+CREATE TABLE IF NOT EXISTS refactorings (
+    repo TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    type TEXT NOT NULL,
+    description TEXT
+);
+CREATE TABLE IF NOT EXISTS refactoring_statistics (
+    repo TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (repo, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS refactoring_effort (
+    repo TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    developer TEXT,
+    email TEXT,
+    refactoring_types TEXT,
+    tloc INTEGER
+);
+CREATE TABLE IF NOT EXISTS developer_refactoring_effort (
+    repo TEXT NOT NULL,
+    developer TEXT,
+    email TEXT,
+    refactoring_type TEXT,
+    refactorings INTEGER,
+    commits INTEGER,
+    tloc INTEGER
+);
+CREATE TABLE IF NOT EXISTS issues (
+    repo TEXT NOT NULL,
+    source TEXT NOT NULL,
+    issue_number INTEGER,
+    issue_key TEXT,
+    title TEXT,
+    body TEXT,
+    state TEXT
+);
+CREATE TABLE IF NOT EXISTS bug_fixing_commits (
+    repo TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    message TEXT,
+    associated_issue TEXT
+);
+CREATE TABLE IF NOT EXISTS commit_issues (
+    repo TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    issue TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS links (
+    url TEXT PRIMARY KEY,
+    repo TEXT NOT NULL,
+    ok INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS commits_author ON commits (author);
+CREATE INDEX IF NOT EXISTS commits_timestamp ON commits (timestamp);
+CREATE INDEX IF NOT EXISTS file_changes_commit ON file_changes (repo, hash);
+CREATE INDEX IF NOT EXISTS file_changes_filename ON file_changes (filename);
+CREATE INDEX IF NOT EXISTS effort_commit ON effort (repo, hash);
+CREATE INDEX IF NOT EXISTS refactorings_commit ON refactorings (repo, hash);
+CREATE INDEX IF NOT EXISTS refactorings_type ON refactorings (type);
+CREATE INDEX IF NOT EXISTS refactoring_effort_commit ON refactoring_effort (repo, hash);
+CREATE INDEX IF NOT EXISTS refactoring_effort_developer ON refactoring_effort (developer);
+CREATE INDEX IF NOT EXISTS developer_refactoring_effort_repo ON developer_refactoring_effort (repo, developer);
+CREATE INDEX IF NOT EXISTS issues_repo ON issues (repo, issue_number);
+CREATE INDEX IF NOT EXISTS issues_key ON issues (issue_key);
+CREATE INDEX IF NOT EXISTS bug_fixing_commits_commit ON bug_fixing_commits (repo, hash);
+CREATE INDEX IF NOT EXISTS commit_issues_commit ON commit_issues (repo, hash);
+CREATE INDEX IF NOT EXISTS commit_issues_issue ON commit_issues (repo, issue);
+CREATE INDEX IF NOT EXISTS links_repo ON links (repo);
+"""
+
+# Tables holding rows of one repository, emptied before the repository is ingested again
+REPO_TABLES = ["commits", "file_changes", "effort", "refactorings", "refactoring_statistics", "refactoring_effort",
+               "developer_refactoring_effort", "issues", "bug_fixing_commits", "commit_issues"]
+
+
+def open_results_db(db_path=RESULTS_DB_PATH):
+    """
+    Open (and create if needed) the results database.
+    """
+    connection = sqlite3.connect(db_path, timeout=60)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # A crash can at most lose the last ingested repository, which is ingested again next time
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    connection.commit()
+    return connection
+
+def insert_batched(connection, table, columns, rows, batch_size=BATCH_SIZE, replace=False):
+    """
+    Insert rows from an iterable with one executemany per batch, so a large output is never
+    held in memory as a whole. With replace, a row with the same primary key as an existing
+    one replaces it instead of failing.
+
+    Returns:
+    - int: The number of rows inserted
+    """
+    statement = (f"INSERT {'OR REPLACE ' if replace else ''}INTO {table} ({', '.join(columns)}) "
+                 f"VALUES ({', '.join('?' * len(columns))})")
+    rows = iter(rows)
+    inserted = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return inserted
+        connection.executemany(statement, batch)
+        inserted += len(batch)
+
+def to_timestamp(date):
+    try:
+        return int(datetime.fromisoformat(str(date)).timestamp())
+    except ValueError:
+        return None
+
+def to_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def read_csv_rows(path, skip_header=True):
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        if skip_header:
+            next(reader, None)
+        yield from reader
+
+def find_output(output_dir, *relative_paths):
+    # The first of the possible paths of an output that exists
+    for relative_path in relative_paths:
+        path = os.path.join(output_dir, relative_path)
+        if os.path.isfile(path):
+            return path
+    return None
+
+def get_input_files(output_dir, repo_name):
+    """
+    The output files of a repository that are ingested, by kind, None if missing.
+    """
+    return {
+        "diff": find_output(output_dir, DIFF_OUTPUT_FILES[("jsonl", False)], DIFF_OUTPUT_FILES[("jsonl", True)],
+                            DIFF_OUTPUT_FILES[("json", False)]),
+        "effort": find_output(output_dir, "developers-effort.csv"),
+        "refactorings": find_output(output_dir, "rminer_output.zip"),
+        "refactoring_statistics": find_output(output_dir, "rminer_analysis.csv"),
+        "refactoring_effort": find_output(output_dir, "refactoring-commits-effort.csv"),
+        "developer_refactoring_effort": find_output(output_dir, "developers-refactoring-effort.csv"),
+        "bug_fixes": find_output(output_dir, os.path.join(repo_name, "bug-fixing-commits.json"),
+                                 os.path.join(repo_name, "bug_fixes.json")),
+    }
+
+def get_fingerprint(input_files):
+    # Changes whenever an output is added, removed or rewritten
+    return json.dumps({kind: [os.path.getsize(path), os.stat(path).st_mtime_ns] if path else None
+                       for kind, path in sorted(input_files.items())})
+
+def iter_commit_rows(repo, records, file_rows):
+    # Yields the commits and collects their file changes into file_rows, so the diff output is read once.
+    # Records without a hash are Jira issues (repo_type="jira"), not commits, and are skipped
+    for record in records:
+        if not record.get("hash"):
+            continue
+        files = record.get("modified_files", [])
+        for modified_file in files:
+            file_rows.append((repo, record["hash"], modified_file.get("filename"), modified_file.get("added_lines"),
+                              modified_file.get("deleted_lines"), modified_file.get("diff_ref")))
+        yield (repo, record["hash"], record.get("author"), str(record.get("date")), to_timestamp(record.get("date")),
+               len(files), sum(f.get("added_lines") or 0 for f in files), sum(f.get("deleted_lines") or 0 for f in files))
+
+def ingest_diff(connection, repo, path):
+    commit_columns = ["repo", "hash", "author", "date", "timestamp", "files", "added_lines", "deleted_lines"]
+    file_columns = ["repo", "hash", "filename", "added_lines", "deleted_lines", "diff_ref"]
+    file_rows = []
+    commits = 0
+    files = 0
+    commit_rows = iter_commit_rows(repo, iter_diff_records(path), file_rows)
+    while True:
+        inserted = insert_batched(connection, "commits", commit_columns, islice(commit_rows, BATCH_SIZE))
+        if not inserted:
+            return commits, files
+        commits += inserted
+        files += insert_batched(connection, "file_changes", file_columns, file_rows)
+        file_rows.clear()
+
+def iter_refactoring_rows(repo, path):
+    with ZipFile(path) as zip, zip.open("rminer_output.json") as json_data:
+        for commit in iter_json_array(json_data, "commits"):
+            for refactor in commit['refactorings']:
+                yield repo, commit['sha1'], refactor['type'], refactor.get('description')
+
+def iter_bug_fix_rows(repo, bug_data, commit_issue_rows):
+    for commit in bug_data["bug_fixing_commits"]:
+        for issue in commit.get("associated_issues", []):
+            commit_issue_rows.append((repo, commit["commit_hash"], str(issue)))
+        associated_issue = commit.get("associated_issue")
+        yield (repo, commit["commit_hash"], commit.get("commit_message"),
+               str(associated_issue) if associated_issue is not None else None)
+
+def ingest_repository(connection, output_dir, force=False):
+    """
+    Load all outputs of one repository into the results database, in one transaction.
+
+    The rows of a repository ingested before are replaced, so ingesting is idempotent. A
+    repository whose output files did not change since the last ingest is skipped, unless
+    force is set. Large outputs (the diff analysis and the RefactoringMiner output) are
+    streamed and inserted in batches.
+
+    Parameters:
+    - connection (sqlite3.Connection): The results database, see open_results_db
+    - output_dir (str): Output directory of the repository, Outputs/<repo>
+    - force (bool): Ingest even if the outputs did not change
+
+    Returns:
+    - dict: Rows inserted per table, None if the repository was skipped
+    """
+    repo = os.path.basename(os.path.normpath(output_dir))
+    manifest = read_manifest(output_dir)
+    input_files = get_input_files(output_dir, repo)
+    fingerprint = get_fingerprint(input_files)
+    row = connection.execute("SELECT fingerprint FROM repositories WHERE repo = ?", (repo,)).fetchone()
+    if row and row[0] == fingerprint and not force:
+        return None
+
+    counts = {}
+    with connection:
+        for table in REPO_TABLES:
+            connection.execute(f"DELETE FROM {table} WHERE repo = ?", (repo,))
+
+        if input_files["diff"]:
+            counts["commits"], counts["file_changes"] = ingest_diff(connection, repo, input_files["diff"])
+        if input_files["effort"]:
+            counts["effort"] = insert_batched(connection, "effort", ["repo", "hash", "previous_hash", "tloc"],
+                                              ((repo, *row[:3]) for row in read_csv_rows(input_files["effort"]) if len(row) >= 3))
+        if input_files["refactorings"]:
+            counts["refactorings"] = insert_batched(connection, "refactorings", ["repo", "hash", "type", "description"],
+                                                    iter_refactoring_rows(repo, input_files["refactorings"]))
+        if input_files["refactoring_statistics"]:
+            # Rows of name, value without header
+            counts["refactoring_statistics"] = insert_batched(
+                connection, "refactoring_statistics", ["repo", "name", "value"],
+                ((repo, row[0], to_number(row[1])) for row in read_csv_rows(input_files["refactoring_statistics"], False) if len(row) >= 2))
+        if input_files["refactoring_effort"]:
+            counts["refactoring_effort"] = insert_batched(
+                connection, "refactoring_effort", ["repo", "hash", "developer", "email", "refactoring_types", "tloc"],
+                ((repo, *row[:5]) for row in read_csv_rows(input_files["refactoring_effort"]) if len(row) >= 5))
+        if input_files["developer_refactoring_effort"]:
+            counts["developer_refactoring_effort"] = insert_batched(
+                connection, "developer_refactoring_effort",
+                ["repo", "developer", "email", "refactoring_type", "refactorings", "commits", "tloc"],
+                ((repo, *row[:6]) for row in read_csv_rows(input_files["developer_refactoring_effort"]) if len(row) >= 6))
+        if input_files["bug_fixes"]:
+            with open(input_files["bug_fixes"], 'r') as f:
+                bug_data = json.load(f)
+            source = "github" if bug_data.get("using_github_issues") else "jira"
+            counts["issues"] = insert_batched(
+                connection, "issues", ["repo", "source", "issue_number", "issue_key", "title", "body", "state"],
+                ((repo, source, issue.get("issue_number"), issue.get("issue_key"), issue.get("title"), issue.get("body"),
+                  issue.get("state")) for issue in bug_data["issue_data"]))
+            commit_issue_rows = []
+            counts["bug_fixing_commits"] = insert_batched(connection, "bug_fixing_commits",
+                                                          ["repo", "hash", "message", "associated_issue"],
+                                                          iter_bug_fix_rows(repo, bug_data, commit_issue_rows))
+            counts["commit_issues"] = insert_batched(connection, "commit_issues", ["repo", "hash", "issue"], commit_issue_rows)
+
+        connection.execute("INSERT OR REPLACE INTO repositories (repo, url, head, fingerprint, ingested_at) VALUES (?, ?, ?, ?, ?)",
+                           (repo, manifest["url"], manifest["head"], fingerprint, time.time()))
+    return counts
+
+def ingest_links(connection, sources_file="sources.txt", failed_file="failed.txt"):
+    """
+    Load the links checked by link_machine (sources.txt working, failed.txt not) into the
+    links table, replacing the links loaded before.
+
+    Returns:
+    - int: The number of distinct links
+    """
+    def iter_link_rows(path, ok):
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield line.strip(), get_repo_name(line.strip()), ok
+
+    with connection:
+        connection.execute("DELETE FROM links")
+        insert_batched(connection, "links", ["url", "repo", "ok"], iter_link_rows(failed_file, 0), replace=True)
+        # A link listed in both files works now, so sources.txt is loaded last and wins
+        insert_batched(connection, "links", ["url", "repo", "ok"], iter_link_rows(sources_file, 1), replace=True)
+    return connection.execute("SELECT COUNT(*) FROM links").fetchone()[0]
+
+def ingest_outputs(outputs_dir="Outputs", db_path=RESULTS_DB_PATH, force=False, sources_file="sources.txt",
+                   failed_file="failed.txt"):
+    """
+    Bulk-load the outputs of every repository in outputs_dir and the checked links into one
+    SQLite database, for queries across repositories. Repositories whose outputs did not
+    change since the last run are skipped.
+
+    Parameters:
+    - outputs_dir (str): Directory with one output directory per repository
+    - db_path (str): Path to the results database
+    - force (bool): Ingest every repository again
+    - sources_file (str), failed_file (str): Link lists written by link_machine
+    """
+    connection = open_results_db(db_path)
+    try:
+        repos = sorted(name for name in os.listdir(outputs_dir) if os.path.isdir(os.path.join(outputs_dir, name)))
+        for i, repo in enumerate(repos):
+            start = time.time()
+            try:
+                counts = ingest_repository(connection, os.path.join(outputs_dir, repo), force)
+            except Exception as e:
+                print(f"[{i + 1}/{len(repos)}] {repo}: failed, {e}")
+                continue
+            if counts is None:
+                print(f"[{i + 1}/{len(repos)}] {repo}: unchanged")
+            else:
+                print(f"[{i + 1}/{len(repos)}] {repo}: {sum(counts.values())} rows in {time.time() - start:.1f}s")
+        print(f"Links: {ingest_links(connection, sources_file, failed_file)}")
+        connection.execute("ANALYZE")
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the outputs of all repositories into one SQLite database.")
+    parser.add_argument("--outputs", default="Outputs", help="Directory with the repository outputs")
+    parser.add_argument("--db", default=RESULTS_DB_PATH, help="Path to the results database")
+    parser.add_argument("--force", action="store_true", help="Ingest repositories even if their outputs did not change")
+    args = parser.parse_args()
+    ingest_outputs(args.outputs, args.db, args.force)
@@ -0,0 +1,28 @@
+import os
+import subprocess
+import pytest
+
+
+def git(repository_path, *args, env=None):
+    return subprocess.run(['git', '-c', 'user.name=Dev', '-c', 'user.email=dev@example.com', *args],
+                          cwd=repository_path, check=True, capture_output=True, text=True,
+                          env=dict(os.environ, **env) if env else None).stdout
+
+
+@pytest.fixture
+def brace_rename_repo(tmp_path):
+    """
+    A repository whose second commit renames a file with braces in its name, which numstat
+    prints as "src/{{x}.java => y.java}", and changes a file with a tab in its name.
+    """
+    git(tmp_path, 'init', '-q')
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "{x}.java").write_text("class X {\n}\n")
+    (tmp_path / "tab\tname.txt").write_text("a\n")
+    git(tmp_path, 'add', '-A')
+    git(tmp_path, 'commit', '-q', '-m', 'add')
+    git(tmp_path, 'mv', 'src/{x}.java', 'src/y.java')
+    (tmp_path / "tab\tname.txt").write_text("a\nb\n")
+    git(tmp_path, 'add', '-A')
+    git(tmp_path, 'commit', '-q', '-m', 'rename')
+    return tmp_path
@@ -0,0 +1,25 @@
+from commit_walker import walk_commits
+
+
+class CollectingConsumer:
+    def __init__(self):
+        self.commits = []
+
+    def consume(self, commit):
+        self.commits.append(commit)
+
+    def finish(self):
+        pass
+
+
+def test_renamed_path_with_braces(brace_rename_repo):
+    for with_patch in (False, True):
+        consumer = CollectingConsumer()
+        assert walk_commits(str(brace_rename_repo), [consumer], with_patch=with_patch) == 2
+        files = {file["new_path"]: file for file in consumer.commits[1]["files"]}
+        assert files["src/y.java"]["old_path"] == "src/{x}.java"
+        assert files["tab\tname.txt"]["old_path"] == "tab\tname.txt"
+        assert files["tab\tname.txt"]["added_lines"] == 1
+        if with_patch:
+            assert files["tab\tname.txt"]["diff"] == "@@ -1 +1,2 @@\n a\n+b\n"
+            assert files["src/y.java"]["diff"] == ""
@@ -0,0 +1,93 @@
+import pytest
+from conftest import git
+from commit_walker import walk_commits
+from diff_analyzer import DiffRecordConsumer, calculate_and_collect_diff, iter_diff_records, iter_numstat_records
+from record_index import RecordReader
+
+
+def test_numstat_records_of_renamed_path_with_braces(brace_rename_repo):
+    records = list(iter_numstat_records(str(brace_rename_repo)))
+    assert [record["hash"] for record in records] == git(brace_rename_repo, 'rev-list', '--reverse', 'HEAD').split()
+    assert sorted((file["filename"], file["added_lines"], file["deleted_lines"])
+                  for file in records[1]["modified_files"]) == [("tab\tname.txt", 1, 0), ("y.java", 0, 0)]
+    assert list(iter_numstat_records(str(brace_rename_repo), [records[1]["hash"]])) == [records[1]]
+
+
+class CrashAfter:
+    def __init__(self, commit_hash):
+        self.commit_hash = commit_hash
+
+    def consume(self, commit):
+        if commit["hash"] == self.commit_hash:
+            raise RuntimeError("crash")
+
+    def finish(self):
+        pass
+
+
+def test_resumed_walk_does_not_repeat_side_branch_commits(tmp_path):
+    # A, B (side branch), C, merge M, D with increasing dates, so the walk order is A B C M D
+    repository = tmp_path / "repo"
+    repository.mkdir()
+    git(repository, 'init', '-q', '-b', 'main')
+    hashes = {}
+    def commit(name, day):
+        (repository / f"{name}.txt").write_text(name + "\n")
+        git(repository, 'add', '-A')
+        git(repository, 'commit', '-q', '-m', name, env={"GIT_COMMITTER_DATE": f"2024-01-0{day}T12:00:00"})
+        hashes[name] = git(repository, 'rev-parse', 'HEAD').strip()
+    commit("A", 1)
+    git(repository, 'checkout', '-q', '-b', 'side')
+    commit("B", 2)
+    git(repository, 'checkout', '-q', 'main')
+    commit("C", 3)
+    git(repository, 'merge', '-q', '--no-ff', 'side', '-m', 'M', env={"GIT_COMMITTER_DATE": "2024-01-04T12:00:00"})
+    hashes["M"] = git(repository, 'rev-parse', 'HEAD').strip()
+    commit("D", 5)
+    order = git(repository, 'rev-list', '--reverse', 'HEAD').split()
+    assert order == [hashes[name] for name in "ABCMD"]
+
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+    consumer = DiffRecordConsumer(str(output_dir), resume=True, repository_path=str(repository), checkpoint_every=1)
+    with pytest.raises(RuntimeError):
+        walk_commits(str(repository), [consumer, CrashAfter(hashes["C"])], with_patch=True)
+    consumer.file.close()
+
+    consumer = DiffRecordConsumer(str(output_dir), resume=True, repository_path=str(repository), checkpoint_every=1)
+    assert consumer.pending_commits == [hashes["M"], hashes["D"]]
+    walk_commits(str(repository), [consumer], with_patch=True, commits=consumer.pending_commits)
+    output_file = str(output_dir / "diff_analysis.jsonl")
+    assert [record["hash"] for record in iter_diff_records(output_file)] == order
+    with RecordReader(output_file) as records:
+        assert [record["hash"] for record in records] == order
+
+    # Nothing is missing any more
+    consumer = DiffRecordConsumer(str(output_dir), resume=True, repository_path=str(repository))
+    assert consumer.pending_commits == []
+    assert walk_commits(str(repository), [consumer], commits=consumer.pending_commits) == 0
+    assert [record["hash"] for record in iter_diff_records(output_file)] == order
+
+
+def test_resume_without_output_or_checkpointed_commit_starts_over(brace_rename_repo, tmp_path):
+    repository = str(brace_rename_repo)
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+    output_file = output_dir / "diff_analysis.jsonl"
+    order = git(brace_rename_repo, 'rev-list', '--reverse', 'HEAD').split()
+    calculate_and_collect_diff(repository, str(output_dir), output_format="jsonl", resume=True, backend="numstat")
+    assert [record["hash"] for record in iter_diff_records(str(output_file))] == order
+
+    # The output is gone but its checkpoint survived
+    output_file.unlink()
+    calculate_and_collect_diff(repository, str(output_dir), output_format="jsonl", resume=True, backend="numstat")
+    assert [record["hash"] for record in iter_diff_records(str(output_file))] == order
+
+    # The checkpointed commit was removed by a force push
+    git(brace_rename_repo, 'reset', '-q', '--hard', 'HEAD~1')
+    git(brace_rename_repo, 'commit', '-q', '--allow-empty', '-m', 'rewritten')
+    git(brace_rename_repo, 'reflog', 'expire', '--expire=now', '--all')
+    git(brace_rename_repo, 'gc', '-q', '--prune=now')
+    order = git(brace_rename_repo, 'rev-list', '--reverse', 'HEAD').split()
+    calculate_and_collect_diff(repository, str(output_dir), output_format="jsonl", resume=True, backend="numstat")
+    assert [record["hash"] for record in iter_diff_records(str(output_file))] == order
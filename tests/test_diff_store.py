@@ -0,0 +1,23 @@
+import os
+from diff_store import DiffStore
+
+
+def test_reader_does_not_cut_off_unindexed_patches(tmp_path):
+    store_dir = str(tmp_path / "diff_store")
+    writer = DiffStore(store_dir)
+    first = writer.put("@@ -1 +1 @@\n-a\n+b\n")
+    writer.flush()
+    # Appended to the pack, not in the index until the next flush
+    second = writer.put("@@ -1 +1 @@\n-c\n+d\n" * 100)
+    writer.pack.flush()
+    pack_size = os.path.getsize(os.path.join(store_dir, "patches.pack"))
+
+    with DiffStore(store_dir, read_only=True) as reader:
+        assert reader.get(first) == "@@ -1 +1 @@\n-a\n+b\n"
+    assert os.path.getsize(os.path.join(store_dir, "patches.pack")) == pack_size
+
+    third = writer.put("@@ -2 +2 @@\n-e\n+f\n")
+    writer.close()
+    with DiffStore(store_dir, read_only=True) as reader:
+        assert reader.get(second) == "@@ -1 +1 @@\n-c\n+d\n" * 100
+        assert reader.get(third) == "@@ -2 +2 @@\n-e\n+f\n"
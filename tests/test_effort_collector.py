@@ -0,0 +1,63 @@
+import json
+import os
+import shutil
+import subprocess
+import pytest
+from conftest import git
+import effort_collector
+from effort_collector import parse_scc_languages, get_language
+
+SCC_LANGUAGES_OUTPUT = """ABAP (abap)
+Java (java)
+JavaScript (js,cjs,mjs)
+Makefile (makefile,mak,mk,bp)
+TypeScript (ts,tsx)
+TypeScript Typings (d.ts)
+Verilog (vg,vh)
+"""
+
+MIXED_TREE = {
+    "src/Main.java": "class Main {\n}\n",
+    "src/app.js": "// app\nconsole.log(1);\n",
+    "src/types.d.ts": "declare const x: number;\n",
+    "Makefile": "all:\n\techo hi\n",
+    "build/rules.mk": "X = 1\n",
+    "README.unknownext": "not code\n",
+    "data.bin": "\x00\x01",
+}
+
+
+def test_get_language_uses_scc_language_list(monkeypatch):
+    monkeypatch.setattr(effort_collector, "scc_languages", parse_scc_languages(SCC_LANGUAGES_OUTPUT))
+    assert get_language("src/Main.java") == "Java"
+    assert get_language("src/App.JS") == "JavaScript"
+    assert get_language("src/types.d.ts") == "TypeScript Typings"
+    assert get_language("src/index.ts") == "TypeScript"
+    assert get_language("Makefile") == "Makefile"
+    assert get_language("README.md") is None
+
+
+@pytest.mark.skipif(shutil.which("scc") is None, reason="scc is not installed")
+def test_get_language_counts_the_same_files_as_scc(tmp_path, monkeypatch):
+    monkeypatch.setattr(effort_collector, "scc_languages", None)
+    for path, content in MIXED_TREE.items():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(content)
+    result = subprocess.run(['scc', '--by-file', '--format', 'json', '--no-cocomo', '--no-complexity', '.'],
+                            cwd=tmp_path, capture_output=True, text=True, check=True)
+    counted_by_scc = {os.path.normpath(file_stats["Location"]) for language in json.loads(result.stdout)
+                      for file_stats in language["Files"]}
+    assert {os.path.normpath(path) for path in MIXED_TREE if get_language(path) is not None} == counted_by_scc
+
+
+def test_loc_deltas_of_file_named_like_a_rename(tmp_path, monkeypatch):
+    monkeypatch.setattr(effort_collector, "scc_languages", parse_scc_languages(SCC_LANGUAGES_OUTPUT))
+    git(tmp_path, 'init', '-q')
+    (tmp_path / "{x} => y.java").write_text("class X {\n}\n")
+    (tmp_path / "notes.txt").write_text("a\n")
+    git(tmp_path, 'add', '-A')
+    git(tmp_path, 'commit', '-q', '-m', 'add')
+    (tmp_path / "{x} => y.java").write_text("class X {\n    int y;\n}\n")
+    git(tmp_path, 'commit', '-q', '-a', '-m', 'change')
+    first, second = git(tmp_path, 'rev-list', '--reverse', 'HEAD').split()
+    assert list(effort_collector.iter_commit_loc_deltas(str(tmp_path))) == [(first, None, 2), (second, first, 1)]
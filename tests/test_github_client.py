@@ -0,0 +1,41 @@
+import requests
+from benchmark import LOCAL_RATE_LIMITS, start_fake_server
+from github_client import GitHubClient
+from http_client import HttpClient
+
+
+def make_client(server, cache_dir):
+    session = HttpClient(rate_limits=LOCAL_RATE_LIMITS, backoff_base=0.1)
+    return GitHubClient(cache_dir=cache_dir, api_url=f"http://127.0.0.1:{server.server_port}", session=session)
+
+
+def test_pagination_and_etag_cache(tmp_path):
+    server = start_fake_server(github_issues=250)
+    try:
+        client = make_client(server, str(tmp_path / "cache"))
+        issues = list(client.get_paginated("repos/apache/project/issues", per_page=100))
+        # Three pages, the next ones found through the Link header
+        assert [issue["number"] for issue in issues] == list(range(1, 251))
+        assert server.stats["requests"] == 3
+
+        # Asked again, every page is answered with 304 and served from the cache
+        assert list(client.get_paginated("repos/apache/project/issues", per_page=100)) == issues
+        assert server.stats["not_modified"] == 3
+    finally:
+        server.shutdown()
+
+
+def test_rate_limit_403_is_waited_out(tmp_path):
+    server = start_fake_server(github_issues=150, rate_limit=2, window=1.0)
+    try:
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        # Another client used up the quota of the current window
+        for _ in range(2):
+            requests.head(f"{base_url}/apache/project")
+        client = make_client(server, None)
+        issues = list(client.get_paginated("repos/apache/project/issues", per_page=100))
+        assert [issue["number"] for issue in issues] == list(range(1, 151))
+        assert server.stats["refused"] >= 1
+        assert client.session.get_stats()["by_status"][403] >= 1
+    finally:
+        server.shutdown()
@@ -0,0 +1,28 @@
+import json
+import os
+import pstats
+from instrumentation import measure_stage
+
+
+def inner_work():
+    return sum(range(1000))
+
+
+def test_nested_profiled_stages(tmp_path):
+    output_dir = str(tmp_path)
+    with measure_stage("repository", output_dir, profile=True):
+        with measure_stage("walk", output_dir, profile=True):
+            inner_work()
+    # The inner stage is in the profile of the outer one instead of replacing its profiler
+    profiles = os.listdir(os.path.join(output_dir, "profiles"))
+    assert profiles == ["repository.prof"]
+    functions = pstats.Stats(os.path.join(output_dir, "profiles", "repository.prof")).stats
+    assert any(function_name == "inner_work" for _, _, function_name in functions)
+    with open(os.path.join(output_dir, "metrics.jsonl")) as f:
+        stages = [json.loads(line) for line in f]
+    assert [(stage["stage"], stage["error"]) for stage in stages] == [("walk", None), ("repository", None)]
+
+    # Profiling works again once the outer stage is done
+    with measure_stage("bug_fixes", output_dir, profile=True):
+        inner_work()
+    assert sorted(os.listdir(os.path.join(output_dir, "profiles"))) == ["bug_fixes.prof", "repository.prof"]
@@ -0,0 +1,28 @@
+from benchmark import LOCAL_RATE_LIMITS, start_fake_server
+from http_client import HttpClient
+from jira_harvester import iter_jira_issues
+
+
+def test_concurrent_paging_with_changelogs():
+    # Page 300 fails once and arrives after the pages behind it, which must not change the order
+    server = start_fake_server(latency=0.002, jira_issues=1234, jira_fail_once=(300,))
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        runs = []
+        for workers in (8, 1):
+            session = HttpClient(rate_limits=LOCAL_RATE_LIMITS, backoff_base=0.05)
+            # The server allows at most 100 issues per page, the client has to follow its maxResults
+            runs.append(list(iter_jira_issues(base_url, "project = SYN", page_size=150, max_workers=workers,
+                                              expand="changelog", session=session)))
+            if workers == 8:
+                assert session.get_stats()["by_status"][503] == 1
+    finally:
+        server.shutdown()
+    parallel, serial = runs
+    assert [issue["key"] for issue in parallel] == [f"SYN-{number}" for number in range(1, 1235)]
+    assert parallel == serial
+    # Changelogs cut off in the search results (3 histories, 2 inline) are completed
+    for issue in parallel:
+        number = int(issue["key"].split("-")[1])
+        assert [history["id"] for history in issue["changelog"]["histories"]] == \
+            [f"{number}-{i}" for i in range(number % 4)]
@@ -0,0 +1,61 @@
+import os
+import time
+from benchmark import LOCAL_RATE_LIMITS, start_fake_server
+from http_client import HttpClient
+from link_machine import process_github_links, validate_links
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeClient:
+    def __init__(self, working):
+        self.working = working
+
+    def head(self, url, **kwargs):
+        return FakeResponse(200 if url in self.working else 404)
+
+
+def read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().split()
+
+
+def test_recovered_and_broken_links_move_between_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open("measures.csv", 'w') as f:
+        f.write("project,metric\napache_a,1\napache_b,2\napache_c,3\n")
+    # a failed before and works now, b worked before and fails now
+    with open("sources.txt", 'w') as f:
+        f.write("https://github.com/apache/b\n")
+    with open("failed.txt", 'w') as f:
+        f.write("https://github.com/apache/a\n")
+    client = FakeClient({"https://github.com/apache/a", "https://github.com/apache/c"})
+    process_github_links("measures.csv", workers=2, cache_path=os.path.join(tmp_path, "cache.sqlite"), client=client)
+    assert sorted(read("sources.txt")) == ["https://github.com/apache/a", "https://github.com/apache/c"]
+    assert read("failed.txt") == ["https://github.com/apache/b"]
+
+
+def check_all(urls, workers):
+    client = HttpClient(pool_size=workers, rate_limits=LOCAL_RATE_LIMITS)
+    start = time.perf_counter()
+    results = sorted(validate_links(urls, workers, client))
+    return results, time.perf_counter() - start
+
+
+def test_validation_throughput_scales_with_workers():
+    server = start_fake_server(latency=0.05)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    urls = [f"{base_url}/apache/project{i}" + ("-missing" if i % 8 == 0 else "") for i in range(32)]
+    try:
+        serial_results, serial_seconds = check_all(urls, 1)
+        parallel_results, parallel_seconds = check_all(urls, 16)
+    finally:
+        server.shutdown()
+    assert parallel_results == serial_results
+    assert [url for url, ok, _ in serial_results if not ok] == sorted(url for url in urls if url.endswith("-missing"))
+    # 32 requests of 50 ms take at least 1.6 s one at a time and about 0.1 s with 16 workers
+    assert serial_seconds >= 1.6
+    assert parallel_seconds * 4 < serial_seconds
@@ -0,0 +1,22 @@
+import json
+from record_index import RecordReader, build_index
+
+RECORDS = [
+    {"hash": "a1b2c3", "author": "Dev", "date": "2024-01-01 12:00:00+00:00", "modified_files": []},
+    {"key": "SYN-1", "summary": "Broken", "status": "Closed", "created": "2024-01-02", "changelog": []},
+    {"hash": "d4e5f6", "author": "Dev", "date": "2024-01-03 12:00:00+00:00", "modified_files": []},
+    {"key": "SYN-2", "summary": "Ünicode", "status": "Open", "created": "2024-01-04", "changelog": []},
+]
+
+
+def test_index_of_mixed_commit_and_issue_records(tmp_path):
+    path = str(tmp_path / "diff_analysis.jsonl")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in RECORDS)
+    build_index(path)
+    with RecordReader(path) as records:
+        assert len(records) == 4
+        assert list(records) == RECORDS
+        assert records.get("d4e5") == RECORDS[2]
+        assert records.get("SYN-2") == RECORDS[3]
+        assert [record["hash"] for record in records.iter_dates(since="2024-01-02")] == ["d4e5f6"]
@@ -0,0 +1,86 @@
+import csv
+import json
+import os
+import stat
+import sys
+from zipfile import ZipFile
+import pytest
+import refactoring_miner
+from conftest import git
+from refactoring_miner import mine_refactoring_activity, mine_refactoring_activity_sharded
+
+# Stand-in for RefactoringMiner's -a and -bc modes: the refactorings of a commit are the types
+# listed in its subject. The first -bc run fails, to exercise the retry of a shard.
+STUB_MINER = """#!{python}
+import json, os, subprocess, sys
+arguments = sys.argv[1:]
+output = arguments[arguments.index("-json") + 1]
+if arguments[0] == "-a":
+    project_dir = arguments[1]
+    roots = subprocess.run(["git", "rev-list", "--max-parents=0", "HEAD"], cwd=project_dir,
+                           capture_output=True, text=True, check=True).stdout.split()
+    revisions = ["HEAD"] + ["^" + root for root in roots]
+else:
+    project_dir, start, end = arguments[1:4]
+    revisions = [end, "^" + start]
+    try:
+        os.close(os.open(os.path.join(os.environ["STUB_MINER_STATE"], "failed_once"), os.O_CREAT | os.O_EXCL))
+        sys.exit(1)
+    except FileExistsError:
+        pass
+log = subprocess.run(["git", "log", "--format=%H%x00%s"] + revisions, cwd=project_dir,
+                     capture_output=True, text=True, check=True).stdout
+commits = []
+for line in log.splitlines():
+    sha1, subject = line.split("\\0")
+    types = [] if subject == "none" else subject.split(";")
+    commits.append({{"repository": project_dir, "sha1": sha1, "url": "",
+                    "refactorings": [{{"type": t, "description": t + " in " + sha1[:7]}} for t in types]}})
+with open(output, "w") as f:
+    json.dump({{"commits": commits}}, f, indent=2)
+"""
+
+SUBJECTS = ["initial", "Extract Method", "none", "Rename Variable;Extract Method", "Move Class", "none",
+            "Inline Method;Inline Method", "Rename Method", "none", "Extract Method;Move Class"]
+
+
+def read_outputs(output_dir):
+    with open(os.path.join(output_dir, "rminer_analysis.csv"), newline='') as f:
+        statistics = list(csv.reader(f))
+    with ZipFile(os.path.join(output_dir, "rminer_output.zip")) as zip:
+        commits = json.loads(zip.read("rminer_output.json"))["commits"]
+    return statistics, commits
+
+
+@pytest.mark.skipif(os.name == 'nt', reason="the stub miner is a POSIX executable")
+def test_sharded_mining_matches_unsharded_run(tmp_path, monkeypatch):
+    stub = tmp_path / "RefactoringMiner"
+    stub.write_text(STUB_MINER.format(python=sys.executable))
+    stub.chmod(stub.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(refactoring_miner, "miner_dir", str(stub))
+    state_dir = tmp_path / "state"
+    state_dir.mkdir()
+    monkeypatch.setenv("STUB_MINER_STATE", str(state_dir))
+
+    repository = tmp_path / "repo"
+    repository.mkdir()
+    git(repository, 'init', '-q')
+    for day, subject in enumerate(SUBJECTS, 1):
+        (repository / "Main.java").write_text(f"class Main {{ int v = {day}; }}\n")
+        git(repository, 'add', '-A')
+        git(repository, 'commit', '-q', '-m', subject, env={"GIT_COMMITTER_DATE": f"2024-01-{day:02d}T12:00:00"})
+
+    unsharded_dir, sharded_dir = tmp_path / "unsharded", tmp_path / "sharded"
+    unsharded_dir.mkdir()
+    sharded_dir.mkdir()
+    mine_refactoring_activity(str(repository), str(unsharded_dir))
+    mine_refactoring_activity_sharded(str(repository), str(sharded_dir), workers=2, shards=4, retries=1)
+
+    # One shard failed once and was mined again
+    assert (state_dir / "failed_once").exists()
+    assert not (sharded_dir / "rminer_shards").exists()
+    assert not (sharded_dir / "error_output.txt").exists()
+    statistics, commits = read_outputs(sharded_dir)
+    assert (statistics, commits) == read_outputs(unsharded_dir)
+    assert len(commits) == len(SUBJECTS) - 1
+    assert ["Total Refactorings", "9"] in statistics
@@ -0,0 +1,67 @@
+import os
+from conftest import git
+from repo_cache import evict_mirrors, get_mirror_path, get_mirror_sizes, update_mirror
+
+
+def make_source(path, files):
+    path.mkdir()
+    git(path, 'init', '-q', '-b', 'main')
+    for name, content in files.items():
+        (path / name).write_text(content)
+        git(path, 'add', '-A')
+        git(path, 'commit', '-q', '-m', f'add {name}')
+    return path
+
+
+def refs(git_dir):
+    return git(git_dir, 'for-each-ref', '--format=%(refname)').split()
+
+
+def test_mirror_update_and_evict(tmp_path):
+    cache_dir = str(tmp_path / "Repos")
+    source = make_source(tmp_path / "project", {"a.txt": "a\n", "b.txt": "b\n"})
+    git(source, 'tag', 'v1')
+    git(source, 'branch', 'feature')
+    # Like GitHub, the source also has pull request refs
+    git(source, 'update-ref', 'refs/pull/1/head', 'HEAD~1')
+
+    mirror = update_mirror(f"file://{source}", cache_dir)
+    assert mirror == get_mirror_path(f"file://{source}", cache_dir)
+    assert git(mirror, 'rev-parse', '--is-bare-repository').strip() == "true"
+    assert sorted(refs(mirror)) == ["refs/heads/feature", "refs/heads/main", "refs/tags/v1"]
+
+    # New commits are fetched, deleted branches pruned
+    (source / "c.txt").write_text("c\n")
+    git(source, 'add', '-A')
+    git(source, 'commit', '-q', '-m', 'add c.txt')
+    git(source, 'branch', '-D', 'feature')
+    update_mirror(f"file://{source}", cache_dir)
+    assert git(mirror, 'rev-parse', 'HEAD') == git(source, 'rev-parse', 'HEAD')
+    assert sorted(refs(mirror)) == ["refs/heads/main", "refs/tags/v1"]
+
+    # The least recently used mirror that is not in use goes first
+    other = make_source(tmp_path / "other", {"x.txt": "x\n"})
+    third = make_source(tmp_path / "third", {"y.txt": "y\n"})
+    other_mirror = update_mirror(f"file://{other}", cache_dir)
+    third_mirror = update_mirror(f"file://{third}", cache_dir)
+    os.utime(mirror, (1000, 1000))
+    os.utime(other_mirror, (2000, 2000))
+    os.utime(third_mirror, (3000, 3000))
+    sizes = get_mirror_sizes(cache_dir)
+    budget = sum(sizes.values()) - sizes[other_mirror]
+    assert evict_mirrors(budget, cache_dir, keep=[mirror]) == budget
+    assert os.path.exists(mirror)
+    assert not os.path.exists(other_mirror)
+    assert os.path.exists(third_mirror)
+
+
+def test_update_drops_pull_refs_of_old_full_mirrors(tmp_path):
+    cache_dir = tmp_path / "Repos"
+    cache_dir.mkdir()
+    source = make_source(tmp_path / "project", {"a.txt": "a\n", "b.txt": "b\n"})
+    git(source, 'update-ref', 'refs/pull/1/head', 'HEAD~1')
+    mirror = get_mirror_path(f"file://{source}", str(cache_dir))
+    git(cache_dir, 'clone', '--mirror', '-q', f"file://{source}", mirror)
+    assert "refs/pull/1/head" in refs(mirror)
+    update_mirror(f"file://{source}", str(cache_dir))
+    assert sorted(refs(mirror)) == ["refs/heads/main"]
@@ -0,0 +1,41 @@
+import json
+from results_db import open_results_db, ingest_links, ingest_repository
+
+
+def write_lines(path, lines):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("".join(line + "\n" for line in lines))
+
+
+def test_ingest_links_with_overlapping_files(tmp_path):
+    sources_file = tmp_path / "sources.txt"
+    failed_file = tmp_path / "failed.txt"
+    write_lines(sources_file, ["https://github.com/apache/a", "https://github.com/apache/b", "https://github.com/apache/a"])
+    write_lines(failed_file, ["https://github.com/apache/b", "https://github.com/apache/c", "https://github.com/apache/c"])
+    connection = open_results_db(str(tmp_path / "results.sqlite"))
+    try:
+        assert ingest_links(connection, str(sources_file), str(failed_file)) == 3
+        # Ingesting again replaces the links instead of adding to them
+        assert ingest_links(connection, str(sources_file), str(failed_file)) == 3
+        links = dict(connection.execute("SELECT url, ok FROM links"))
+    finally:
+        connection.close()
+    # A link in both files was fixed since it failed, sources.txt wins
+    assert links == {"https://github.com/apache/a": 1, "https://github.com/apache/b": 1, "https://github.com/apache/c": 0}
+
+
+def test_ingest_repository_skips_jira_diff_records(tmp_path):
+    output_dir = tmp_path / "Outputs" / "repo"
+    output_dir.mkdir(parents=True)
+    with open(output_dir / "diff_analysis.jsonl", 'w') as f:
+        f.write(json.dumps({"key": "REPO-1", "summary": "An issue", "status": "Closed", "changelog": []}) + "\n")
+        f.write(json.dumps({"hash": "abc", "author": "A", "date": "2020-01-01 00:00:00+00:00",
+                            "modified_files": [{"filename": "A.java", "added_lines": 2, "deleted_lines": 1}]}) + "\n")
+    connection = open_results_db(str(tmp_path / "results.sqlite"))
+    try:
+        counts = ingest_repository(connection, str(output_dir))
+        commits = connection.execute("SELECT hash, files, added_lines, deleted_lines FROM commits").fetchall()
+    finally:
+        connection.close()
+    assert counts["commits"] == 1 and counts["file_changes"] == 1
+    assert commits == [("abc", 1, 2, 1)]
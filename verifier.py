@@ -1,5 +1,6 @@
 import os
 import json
+from manifest import read_manifest
 
 def ensure_and_clear_file(file_path):
     """
@@ -13,25 +14,28 @@ def ensure_and_clear_file(file_path):
 
 def check_repo_files(base_path):
     """
-    Check for missing files in Apache repo output folders and create txt files 
-    with GitHub links for missing files.
+    Check the manifests of the repo output folders for stages that are not done and create
+    txt files with the GitHub links of those repos.
+    
+    Only one manifest.json is read per repo. Repos without a manifest (never processed, or
+    processed before manifests existed) count as missing every stage. Re-running main.py on
+    the listed links only redoes the missing stages.
     
     :param base_path: Path to the base directory containing 'Outputs' folder
     """
-    # Paths to output files
-    no_diff_path = os.path.join(base_path, 'no_diff.txt')
-    no_effort_path = os.path.join(base_path, 'no_effort.txt')
-    no_bugfix_path = os.path.join(base_path, 'no_bugfix.txt')
+    # Paths to output files, per stage of the manifest
+    missing_files = {
+        "diff": os.path.join(base_path, 'no_diff.txt'),
+        "effort": os.path.join(base_path, 'no_effort.txt'),
+        "bug_fixes": os.path.join(base_path, 'no_bugfix.txt'),
+    }
     
     # Ensure files exist and are cleared
-    ensure_and_clear_file(no_diff_path)
-    ensure_and_clear_file(no_effort_path)
-    ensure_and_clear_file(no_bugfix_path)
+    for file_path in missing_files.values():
+        ensure_and_clear_file(file_path)
     
-    # Output files to track missing files
-    no_diff_repos = []
-    no_effort_repos = []
-    no_bugfix_repos = []
+    # Repos missing each stage
+    missing_repos = {stage: [] for stage in missing_files}
     
     # Path to Outputs folder
     outputs_path = os.path.join(base_path, 'Outputs')
@@ -44,20 +48,13 @@ def check_repo_files(base_path):
         if not os.path.isdir(repo_path):
             continue
         
-        # Check for specific files
-        diff_path = os.path.join(repo_path, 'diff_analysis.json')
-        effort_path = os.path.join(repo_path, 'developers-effort.csv')
-        bugfix_path = os.path.join(repo_path, repo_folder, 'bug-fixing-commits.json')
-        
-        # Check and record missing files
-        if not os.path.exists(diff_path):
-            no_diff_repos.append(f"https://github.com/apache/{repo_folder}")
-        
-        if not os.path.exists(effort_path):
-            no_effort_repos.append(f"https://github.com/apache/{repo_folder}")
+        manifest = read_manifest(repo_path)
+        url = manifest["url"] or f"https://github.com/apache/{repo_folder}"
         
-        if not os.path.exists(bugfix_path):
-            no_bugfix_repos.append(f"https://github.com/apache/{repo_folder}")
+        # Check and record stages that are not done
+        for stage, repos in missing_repos.items():
+            if manifest["stages"].get(stage, {}).get("status") != "done":
+                repos.append(url)
     
     # Write results to files
     def write_links_to_file(file_path, repos):
@@ -65,14 +62,13 @@ def check_repo_files(base_path):
             for repo in sorted(repos):
                 f.write(f"{repo}\n")
     
-    write_links_to_file(no_diff_path, no_diff_repos)
-    write_links_to_file(no_effort_path, no_effort_repos)
-    write_links_to_file(no_bugfix_path, no_bugfix_repos)
+    for stage, file_path in missing_files.items():
+        write_links_to_file(file_path, missing_repos[stage])
     
     # Print summary
-    print(f"Repos missing diff_analysis.json: {len(no_diff_repos)}")
-    print(f"Repos missing developers-effort.csv: {len(no_effort_repos)}")
-    print(f"Repos missing bug-fixing-commits.json: {len(no_bugfix_repos)}")
+    print(f"Repos missing the diff analysis: {len(missing_repos['diff'])}")
+    print(f"Repos missing developers-effort.csv: {len(missing_repos['effort'])}")
+    print(f"Repos missing the bug-fixing commits: {len(missing_repos['bug_fixes'])}")
 
 def main():
     # Get the directory of the script